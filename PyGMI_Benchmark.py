@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+#Benchmarks of the measurements programs with simulated instruments,
+#without the user interface (see PyGMI_files/Benchmark.py), e.g.
+#   python PyGMI_Benchmark.py V_3pts_3axis_deltamode --duration 30
+import os
+import sys
+import imp
+
+#import the package without running PyGMI_files/__init__.py, which starts the user interface
+package=imp.new_module('PyGMI_files')
+package.__path__=[os.path.join(os.path.dirname(os.path.abspath(__file__)),'PyGMI_files')]
+sys.modules['PyGMI_files']=package
+from PyGMI_files import Benchmark
+
+if __name__ == "__main__":
+    sys.exit(Benchmark.main(sys.argv[1:]))
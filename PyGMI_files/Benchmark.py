@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+#Benchmarks of the measurements programs, without the user interface
+#A measurements program (the Script thread of a module of Measurements_programs)
+#is run against simulated instruments (see Simulated_instruments.py), with the
+#values of the front panel given in BENCHMARKS instead of being read from the
+#user interface, and its data is saved as by the main window. It reports:
+#   - the number of data points per second
+#   - how long the program holds the instruments lock at a time, and how much
+#     of the time it holds it
+#   - the latency of the data, from data_queue.put() to its writing in the savefile
+#   - the CPU use of the whole program, and the time spent talking to the instruments
+#The results can be saved as baselines (in Configuration/Benchmarks), to which
+#the next runs are compared, so that a change slowing down a measurements
+#program is caught. It is launched with PyGMI_Benchmark.py, e.g.
+#   python PyGMI_Benchmark.py V_3pts_3axis_deltamode --duration 30 --save-baseline
+#   python PyGMI_Benchmark.py            (all the benchmarks, compared to their baselines)
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+import argparse
+import Queue
+import Visa_pool
+import Simulated_instruments
+import Savefile
+import Instruments
+from Bus_locks import Bus_lock_manager
+from Io_statistics import statistics,Latency_histogram
+
+#folder of the baselines, one json file per benchmark
+BASELINES_FOLDER=os.path.join('Configuration','Benchmarks')
+#relative change of a result, compared to its baseline, reported as a regression
+TOLERANCE=0.2
+#time in seconds between two savings of the data, as in the main window
+SAVE_PERIOD=0.1
+
+#the benchmarks:
+#   program: module of Measurements_programs
+#   instruments: name in the main window -> driver
+#   frontpanel: values of the front panel different from FRONTPANEL_DEFAULTS
+#   duration: maximum duration in seconds (the program is stopped after it)
+BENCHMARKS={'V_3pts_3axis_deltamode':{'program':'V_3pts_3axis_deltamode',
+                                      'instruments':{'instr_1':'Keithley2182A',
+                                                     'instr_7':'Keithley6221',
+                                                     'instr_8':'Keithley6221',
+                                                     'instr_9':'Lakeshore340',
+                                                     'temp_controller':'Lakeshore340'},
+                                      'frontpanel':{'instr_on_14':False,'current1':10e-6},
+                                      'duration':20},
+            'V_3pts_3axis':{'program':'V_3pts_3axis',
+                            'instruments':{'instr_1':'Keithley2182A',
+                                           'instr_7':'Keithley6221',
+                                           'instr_9':'Lakeshore340',
+                                           'temp_controller':'Lakeshore340'},
+                            'frontpanel':{'instr_on_1':True,'instr_on_14':False,'temp_controller_on':True,'current1':10e-6},
+                            'duration':20},
+            'V_delta_buffered':{'program':'V_delta_buffered',
+                                'instruments':{'instr_8':'Keithley6221',
+                                               'temp_controller':'Lakeshore340'},
+                                'frontpanel':{'temp_controller_on':True,'current1':10e-6},
+                                'duration':20},
+            'V_SR830_buffered':{'program':'V_SR830_buffered',
+                                'instruments':{'instr_8':'SR830',
+                                               'temp_controller':'Lakeshore340'},
+                                'frontpanel':{'temp_controller_on':True,'current1':10e-6},
+                                'duration':20},
+            'V_trace_logging':{'program':'V_trace_logging',
+                               'instruments':{'instr_1':'Keithley2182A',
+                                              'temp_controller':'Lakeshore340'},
+                               'frontpanel':{'temp_controller_on':True},
+                               'duration':20},
+            'IV_3pts_ppms':{'program':'IV_3pts_ppms',
+                            'instruments':{'instr_1':'Keithley6221',
+                                           'instr_2':'Keithley2182A',
+                                           'ppms':'PPMS'},
+                            'frontpanel':{'current1':1e-6,'current2':20e-6,'current3':1e-6,'repeat_points':2},
+                            'duration':20},
+            'IV_sweep_ppms':{'program':'IV_sweep_ppms',
+                             'instruments':{'instr_1':'Keithley2420',
+                                            'ppms':'PPMS'},
+                             'frontpanel':{'current1':1e-6,'current2':20e-6,'current3':1e-6,'repeat_points':100},
+                             'duration':20}}
+
+#the values of the front panel (see Frontpanel_values.py) used by default
+FRONTPANEL_DEFAULTS={'channels_list_1':['1'],
+                     'channels_list_2':['1'],
+                     'mapping':['1'],
+                     'email_address':'',
+                     'mesure_delay':0.0,
+                     'mesure_speed':1.0,
+                     'repeat_points':1,
+                     'current1':1e-6,
+                     'current2':1e-6,
+                     'current3':1e-6,
+                     'voltage1':0.0,
+                     'voltage2':0.0,
+                     'voltage3':0.0,
+                     'IV_voltage_criterion':1e-6,
+                     'B_start':0.0,
+                     'B_stop':0.0,
+                     'B_step':0.1,
+                     'anglestart':0.0,
+                     'anglestop':0.0,
+                     'anglestep':1.0,
+                     'voltage_criterion_on':False}
+#comboboxes of the Instruments connector, e.g. 'instr_instrtype_1' for the
+#instrument main.instr_1 and the checkbox f.instr_on_1, unchecked by default
+INSTRTYPE_COMBOBOXES=['instr_instrtype_'+str(i) for i in range(1,13)]+[name+'_instrtype' for name in ['temp_controller','magnet_X','magnet_Y','magnet_Z','ppms']]
+
+class Headless_frontpanel():
+    """the values of the front panel, as Frontpanel_values without the user interface"""
+    def __init__(self,instruments,values={}):
+        for combobox in INSTRTYPE_COMBOBOXES:
+            setattr(self,combobox.replace("instrtype","on"),combobox.replace("_instrtype","") in instruments)
+        for name,value in FRONTPANEL_DEFAULTS.items()+values.items():
+            setattr(self,name,value)
+
+class Headless_main():
+    """stands for the main window: the instruments are its attributes, e.g. main.instr_1"""
+    def __init__(self,instruments):
+        self.reserved_access_to_instr=Bus_lock_manager()
+        for number,(name,driver) in enumerate(sorted(instruments.items())):
+            if driver=='PPMS':
+                instr=Simulated_instruments.open_ppms()
+            else:
+                #all the simulated instruments on the same bus, as on a GPIB board
+                instr=getattr(Instruments,driver).Connect_Instrument('SIM::'+driver+'::'+str(number+1))
+            instr.initialize()
+            setattr(self,name,instr)
+
+class Timestamped_queue(Queue.Queue):
+    """data queue recording when each item was put in it"""
+    def put(self,item,block=True,timeout=None):
+        Queue.Queue.put(self,(item,time.time()),block,timeout)
+
+class Timed_savefile_writer(Savefile.Savefile_writer):
+    """savefile writer recording the latency of each row, from data_queue.put() to its writing"""
+    def __init__(self,filename,**kwargs):
+        Savefile.Savefile_writer.__init__(self,filename,**kwargs)
+        #the times the rows were put in the data queue, in the order they are written
+        self.put_times=Queue.Queue()
+        self.latency=Latency_histogram()
+
+    def write_rows(self,rows):
+        Savefile.Savefile_writer.write_rows(self,rows)
+        now=time.time()
+        for i in range(len(rows)):
+            self.latency.add(now-self.put_times.get())
+
+class Lock_probe():
+    """the instruments lock given to the measurements program, recording how long it holds it.
+    Only the outermost reservation of each thread is timed (with lock: with lock.bus(...): ...)"""
+    def __init__(self,lock):
+        self.lock=lock
+        self.hold_time=Latency_histogram()
+        self.local=threading.local()
+
+    def enter(self):
+        depth=getattr(self.local,'depth',0)
+        if depth==0:
+            self.local.start=time.time()
+        self.local.depth=depth+1
+
+    def exit(self):
+        self.local.depth-=1
+        if self.local.depth==0:
+            self.hold_time.add(time.time()-self.local.start)
+
+    def acquire(self,blocking=True):
+        acquired=self.lock.acquire(blocking)
+        if acquired:
+            self.enter()
+        return acquired
+
+    def release(self):
+        self.exit()
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self,*args):
+        self.release()
+
+    def bus(self,*targets):
+        return Bus_access_probe(self,self.lock.bus(*targets))
+
+class Bus_access_probe():
+    def __init__(self,probe,access):
+        self.probe=probe
+        self.access=access
+
+    def acquire(self,blocking=True):
+        acquired=self.access.acquire(blocking)
+        if acquired:
+            self.probe.enter()
+        return acquired
+
+    def release(self):
+        self.probe.exit()
+        self.access.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self,*args):
+        self.release()
+
+def cpu_time():
+    """CPU time used by the process (user+system), in seconds"""
+    times=os.times()
+    return times[0]+times[1]
+
+def latency_summary(latency):
+    return {'count':latency.count,
+            'mean_ms':round(latency.mean()*1e3,3),
+            'p90_ms':round(latency.percentile(90)*1e3,3),
+            'max_ms':round(latency.max*1e3,3)}
+
+def run_benchmark(name,duration=None,latency=None,benchmarks=BENCHMARKS):
+    """run a benchmark, return its results as a dictionnary
+    latency: of the simulated instruments in seconds, their default one if None"""
+    benchmark=benchmarks[name]
+    if duration is None:
+        duration=benchmark['duration']
+    #start from fresh instruments and statistics
+    Visa_pool.close_all()
+    Simulated_instruments.reset()
+    if latency is not None:
+        Simulated_instruments.configure(latency=latency)
+    main=Headless_main(benchmark['instruments'])
+    #the initialization of the instruments is not part of the benchmark
+    statistics.reset()
+    frontpanel=Headless_frontpanel(benchmark['instruments'],benchmark.get('frontpanel',{}))
+    module=__import__('Measurements_programs.'+benchmark['program'],globals(),locals(),['Script'])
+    folder=tempfile.mkdtemp()
+    frontpanel.savefile_txt_input=os.path.join(folder,name+'.txt')
+    writer=Timed_savefile_writer(frontpanel.savefile_txt_input)
+    writer.start()
+    data_queue=Timestamped_queue()
+    stop_flag=threading.Event()
+    lock=Lock_probe(main.reserved_access_to_instr)
+    script=module.Script(main,frontpanel,data_queue,stop_flag,lock)
+    script.daemon=True
+    nb_points=0
+    start=time.time()
+    start_cpu=cpu_time()
+    script.start()
+    try:
+        running=True
+        while running:
+            running=script.isAlive()
+            if time.time()-start>duration:
+                stop_flag.set()
+                script.join()
+                running=False
+            #save the data as the main window does, every SAVE_PERIOD
+            items=[]
+            while True:
+                try:
+                    item,put_time=data_queue.get(block=False)
+                except Queue.Empty:
+                    break
+                if item[1]=='rows':
+                    #a block of rows, saved as the main window does
+                    rows=Savefile.block_rows(item[0])
+                    for row in rows:
+                        writer.put_times.put(put_time)
+                    nb_points+=len(rows)
+                    items+=[(row,False) for row in rows]
+                    continue
+                if item[1]==False:
+                    writer.put_times.put(put_time)
+                    nb_points+=1
+                items.append(item)
+            if items:
+                writer.put(items)
+            if running:
+                time.sleep(SAVE_PERIOD)
+        elapsed=time.time()-start
+        writer.close()
+        cpu=cpu_time()-start_cpu
+    finally:
+        stop_flag.set()
+        Visa_pool.close_all()
+        shutil.rmtree(folder,ignore_errors=True)
+    io_time=sum([stats.latency.total for stats in statistics.commands.values()])
+    io_calls=sum([stats.latency.count for stats in statistics.commands.values()])
+    return {'benchmark':name,
+            'program':benchmark['program'],
+            'date':time.strftime("%Y-%m-%d %H:%M:%S"),
+            'python':sys.version.split()[0],
+            'simulation':Simulated_instruments.get_settings(),
+            'duration_s':round(elapsed,3),
+            'points':nb_points,
+            'points_per_second':round(nb_points/elapsed,3),
+            'cpu_percent':round(100.0*cpu/elapsed,2),
+            'lock_hold':dict(latency_summary(lock.hold_time),busy_percent=round(100.0*lock.hold_time.total/elapsed,2)),
+            'queue_latency':latency_summary(writer.latency),
+            'io_calls':io_calls,
+            'io_percent':round(100.0*io_time/elapsed,2)}
+
+###########################
+#baselines and regressions#
+###########################
+#compared results: (key,sub-key or None,True if higher is better)
+COMPARED=[('points_per_second',None,True),
+          ('cpu_percent',None,False),
+          ('lock_hold','mean_ms',False),
+          ('queue_latency','p90_ms',False)]
+
+def baseline_file(name,folder=BASELINES_FOLDER):
+    return os.path.join(folder,name+'.json')
+
+def load_baseline(name,folder=BASELINES_FOLDER):
+    try:
+        with open(baseline_file(name,folder)) as f:
+            return json.load(f)
+    except IOError:
+        return None
+
+def save_baseline(results,folder=BASELINES_FOLDER):
+    if not(os.path.isdir(folder)):
+        os.makedirs(folder)
+    with open(baseline_file(results['benchmark'],folder),'w') as f:
+        json.dump(results,f,indent=1,sort_keys=True)
+
+def value_of(results,key,subkey):
+    return results[key] if subkey is None else results[key][subkey]
+
+def regressions(results,baseline,tolerance=TOLERANCE):
+    """the results worse than their baseline by more than 'tolerance' (relative change)"""
+    worse=[]
+    for key,subkey,higher_is_better in COMPARED:
+        value=value_of(results,key,subkey)
+        reference=value_of(baseline,key,subkey)
+        if reference==0:
+            continue
+        change=(value-reference)/float(abs(reference))
+        if (higher_is_better and change<-tolerance) or (not(higher_is_better) and change>tolerance):
+            worse.append((key if subkey is None else key+' '+subkey,reference,value,change))
+    return worse
+
+def report(results):
+    lines=[results['benchmark']+' ('+str(results['duration_s'])+' s)']
+    lines.append('   %d points, %.3f points/s, CPU %.1f %%' % (results['points'],results['points_per_second'],results['cpu_percent']))
+    hold=results['lock_hold']
+    lines.append('   lock held %d times, mean %.3f ms, 90%% %.3f ms, max %.3f ms, %.1f %% of the time' % (hold['count'],hold['mean_ms'],hold['p90_ms'],hold['max_ms'],hold['busy_percent']))
+    queue=results['queue_latency']
+    lines.append('   queue to file latency: mean %.3f ms, 90%% %.3f ms, max %.3f ms' % (queue['mean_ms'],queue['p90_ms'],queue['max_ms']))
+    lines.append('   %d instrument calls, %.1f %% of the time' % (results['io_calls'],results['io_percent']))
+    return '\n'.join(lines)
+
+def main(arguments):
+    parser=argparse.ArgumentParser(description="Benchmarks of the measurements programs with simulated instruments")
+    parser.add_argument('benchmarks',nargs='*',help="benchmarks to run, all of them by default: "+', '.join(sorted(BENCHMARKS)))
+    parser.add_argument('--duration',type=float,default=None,help="maximum duration of each benchmark in seconds")
+    parser.add_argument('--latency',type=float,default=None,help="latency of the simulated instruments in seconds")
+    parser.add_argument('--tolerance',type=float,default=TOLERANCE,help="relative change reported as a regression")
+    parser.add_argument('--save-baseline',action='store_true',help="save the results as the new baselines")
+    parser.add_argument('--baselines',default=BASELINES_FOLDER,help="folder of the baselines")
+    options=parser.parse_args(arguments)
+    nb_regressions=0
+    for name in options.benchmarks or sorted(BENCHMARKS):
+        if name not in BENCHMARKS:
+            print "unknown benchmark",name
+            return 2
+        results=run_benchmark(name,options.duration,options.latency)
+        print report(results)
+        baseline=load_baseline(name,options.baselines)
+        if options.save_baseline:
+            save_baseline(results,options.baselines)
+            print '   saved as the baseline'
+        elif baseline is None:
+            print '   no baseline to compare to (use --save-baseline)'
+        else:
+            if baseline.get('simulation')!=results['simulation']:
+                print '   the baseline was measured with other settings of the simulated instruments:',baseline.get('simulation')
+            for key,reference,value,change in regressions(results,baseline,options.tolerance):
+                print '   REGRESSION %s: %g -> %g (%+.0f %%)' % (key,reference,value,change*100)
+                nb_regressions+=1
+    return 1 if nb_regressions else 0
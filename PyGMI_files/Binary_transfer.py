@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#Binary transfer of the bulk reads of the instruments (buffers, traces)
+#A buffer of N readings read in ASCII ('+1.234567890E-06,' per value) is about
+#four times longer than in binary (4 bytes per value with REAL,32), and each
+#value has to be parsed. The drivers ask for binary transfers, decoded here
+#into numpy arrays:
+#   - IEEE 488.2 blocks (#<n><length><data>, or #0<data>) of the Keithleys
+#     (FORM:DATA REAL,32 or REAL,64)
+#   - raw IEEE floats without header of the SR830 (TRCB?), or its
+#     non-normalized format (TRCL?)
+#If a binary answer can not be decoded (instrument, interface or VISA version
+#not supporting it), the driver falls back to ASCII for good (see query_with_fallback).
+import struct
+import numpy as np
+
+#numpy type of the values of the binary formats, by struct format
+DATATYPES={'f':'f4','d':'f8','h':'i2','i':'i4'}
+
+def parse_values(raw,datatype='f',big_endian=False):
+    """values packed without header, e.g. the answer to TRCB? of the SR830"""
+    size=struct.calcsize(datatype)
+    if len(raw)%size and raw.endswith('\n'):
+        #terminator added by the interface
+        raw=raw[:-1]
+    if len(raw)%size:
+        raise ValueError("binary data of "+str(len(raw))+" bytes is not made of "+str(size)+" bytes values")
+    return np.frombuffer(raw,dtype=('>' if big_endian else '<')+DATATYPES[datatype]).astype(np.float64)
+
+def parse_block(raw,datatype='f',big_endian=False):
+    """values of an IEEE 488.2 binary block: #<number of digits of the length><length><data>,
+    or #0<data> (indefinite length, until the end of the message)"""
+    start=raw.find('#')
+    if start<0 or len(raw)<start+2 or not(raw[start+1].isdigit()):
+        raise ValueError("no IEEE 488.2 binary block in the answer: "+repr(raw[:20]))
+    nb_digits=int(raw[start+1])
+    if nb_digits==0:
+        data=raw[start+2:]
+        #the terminator of the message
+        if data.endswith('\n'):
+            data=data[:-1]
+    else:
+        length=int(raw[start+2:start+2+nb_digits])
+        data=raw[start+2+nb_digits:start+2+nb_digits+length]
+        if len(data)<length:
+            raise ValueError("binary block truncated: "+str(len(data))+" bytes instead of "+str(length))
+    return parse_values(data,datatype,big_endian)
+
+def parse_sr830_nonnormalized(raw):
+    """values sent by TRCL? by the SR830: for each value a 16 bits mantissa
+    and a 16 bits exponent, value=mantissa*2**(exponent-124)"""
+    pairs=parse_values(raw,'h').reshape(-1,2)
+    return pairs[:,0]*np.power(2.0,pairs[:,1]-124)
+
+def query_raw(io,message):
+    """answer of an instrument as raw bytes (the binary data may contain
+    the byte of the termination character)"""
+    io.write(message)
+    return io.read_raw()
+
+def query_with_fallback(driver,binary,ascii):
+    """binary() reads some values by binary transfer, ascii() reads the same values in ASCII.
+    Once a binary answer could not be decoded (format not supported by the instrument,
+    interface or VISA version), the driver (driver.binary_transfer=False) uses ASCII.
+    Other errors (e.g. a timeout) are raised, the binary transfers are kept and
+    the query is not sent again: it may have side effects (e.g. :READ? starts a sweep)"""
+    if getattr(driver,'binary_transfer',True):
+        try:
+            return binary()
+        except ValueError as e:
+            print "binary transfer failed ("+str(e)+"), falling back to ASCII transfers"
+            driver.binary_transfer=False
+            clear_io(driver)
+        except Exception:
+            clear_io(driver)
+            raise
+    return ascii()
+
+def clear_io(driver):
+    """discard what the instrument may still be sending"""
+    try:
+        driver.io.clear()
+    except Exception:
+        pass
+
+def query_real(driver,message,real_format='REAL,32',datatype='f',big_endian=False):
+    """values of a bulk read of a SCPI instrument (e.g. TRAC:DATA? of the Keithleys) as a
+    numpy array: with FORM:DATA REAL,32 (or REAL,64, datatype 'd') for the read only,
+    or in ASCII"""
+    def binary():
+        driver.io.write('FORM:DATA '+real_format+';:FORM:BORD '+('NORM' if big_endian else 'SWAP'))
+        try:
+            return parse_block(query_raw(driver.io,message),datatype,big_endian)
+        finally:
+            #the other queries of the drivers expect ASCII answers
+            driver.io.write('FORM:DATA ASC')
+    def ascii():
+        return np.array(driver.io.query_ascii_values(message),dtype=np.float64)
+    return query_with_fallback(driver,binary,ascii)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#Locks reserving the access to the instruments, one per bus
+#Two instruments on different buses (GPIB boards, COM ports, network or USB
+#instruments, PPMS DLL...) can be talked to at the same time, so each bus has
+#its own lock: a panel refreshing a Lakeshore340 on one GPIB board no longer
+#waits for a PPMS call or for a measurement on another board.
+#The lock manager also behaves like the former single lock
+#(reserved_access_to_instr): "with reserved_access_to_instr:" reserves ALL the
+#buses at once, so the code written for the single lock keeps working.
+#   with reserved_bus_access.bus(voltmeter,current_source):
+#       ...only the buses of these two instruments are reserved
+#The buses needed together must be reserved in ONE call: a thread holding
+#some buses can reserve them again, but not other buses, nor all of them
+#(two threads doing so in opposite orders would wait for each other forever),
+#this raises a RuntimeError. Reserving all the buses first and
+#then some of them is allowed.
+import time
+import threading
+import Visa_pool
+from Io_statistics import statistics
+
+def bus_of(target):
+    """bus of an instrument (a driver) or of a VISA address"""
+    if isinstance(target,basestring):
+        return Visa_pool.bus_key(target)
+    io=getattr(target,'io',None)
+    #VISA session, or serial port
+    address=getattr(io,'resource_name',None) or getattr(target,'VISA_address',None)
+    if address is not None:
+        return Visa_pool.bus_key(address)
+    port=getattr(io,'port',None)
+    if port is not None:
+        return 'COM'+str(port)
+    #instruments driven through a DLL or without address: one bus per driver
+    return target.__class__.__module__
+
+class Bus_access():
+    """reservation of one or several buses, to be used with 'with'"""
+    def __init__(self,manager,buses):
+        self.manager=manager
+        #always reserved in the same order, so that two threads reserving
+        #the same buses can not wait for each other
+        self.buses=sorted(set(buses))
+
+    def acquire(self,blocking=True):
+        return self.manager.acquire_buses(self.buses,blocking)
+
+    def release(self):
+        self.manager.release_buses(self.buses)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self,*args):
+        self.release()
+
+class Bus_lock_manager():
+    def __init__(self):
+        self.condition=threading.Condition(threading.Lock())
+        #thread reserving all the buses, and how many times it did (reentrant)
+        self.owner=None
+        self.depth=0
+        #number of threads waiting to reserve all the buses: they have priority
+        #over the new reservations of a single bus, so that they are not starved
+        self.waiting=0
+        #bus -> [thread reserving it, how many times it did]
+        self.bus_owners={}
+
+    def bus(self,*targets):
+        """reservation of the buses of some instruments (drivers or VISA addresses)"""
+        return Bus_access(self,[bus_of(target) for target in targets])
+
+    ############################################
+    #compatibility with the former single lock#
+    ############################################
+    def acquire(self,blocking=True):
+        """reserve all the buses"""
+        me=threading.current_thread()
+        with self.condition:
+            if self.owner is me:
+                self.depth+=1
+                return True
+            held=self.buses_held(me)
+            if held:
+                raise RuntimeError("all the instruments reserved while holding the bus(es) "+', '.join(held))
+            if not(blocking) and not(self.all_free(me)):
+                return False
+            start=time.time()
+            self.waiting+=1
+            while not(self.all_free(me)):
+                self.condition.wait()
+            self.waiting-=1
+            self.owner=me
+            self.depth=1
+        #time spent waiting for the lock, shown in the I/O statistics
+        statistics.record_lock_wait('all instruments',time.time()-start)
+        return True
+
+    def release(self):
+        with self.condition:
+            if self.owner is not threading.current_thread():
+                raise RuntimeError("release of instruments lock not reserved by this thread")
+            self.depth-=1
+            if self.depth==0:
+                self.owner=None
+                self.condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self,*args):
+        self.release()
+
+    def all_free(self,me):
+        return self.owner is None and not(self.bus_owners)
+
+    ##################
+    #bus reservations#
+    ##################
+    def buses_held(self,me):
+        return sorted([bus for bus,(owner,depth) in self.bus_owners.items() if owner is me])
+
+    def buses_free(self,buses,me):
+        if self.owner is not None and self.owner is not me:
+            return False
+        if self.waiting and self.owner is not me and not(self.buses_held(me)):
+            #let the threads waiting for all the buses go first
+            return False
+        return not([bus for bus in buses if bus in self.bus_owners and self.bus_owners[bus][0] is not me])
+
+    def acquire_buses(self,buses,blocking=True):
+        me=threading.current_thread()
+        with self.condition:
+            held=self.buses_held(me)
+            if held and self.owner is not me and [bus for bus in buses if bus not in held]:
+                raise RuntimeError("bus(es) "+', '.join([bus for bus in buses if bus not in held])+" reserved while holding "+', '.join(held))
+            if not(blocking) and not(self.buses_free(buses,me)):
+                return False
+            start=time.time()
+            while not(self.buses_free(buses,me)):
+                self.condition.wait()
+            for bus in buses:
+                if bus in self.bus_owners:
+                    self.bus_owners[bus][1]+=1
+                else:
+                    self.bus_owners[bus]=[me,1]
+        statistics.record_lock_wait(' + '.join(buses),time.time()-start)
+        return True
+
+    def release_buses(self,buses):
+        with self.condition:
+            for bus in buses:
+                self.bus_owners[bus][1]-=1
+                if self.bus_owners[bus][1]==0:
+                    del self.bus_owners[bus]
+            self.condition.notify_all()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#Columnar storage for the Master dataset of the main window (self.measdata in Main.py)
+#Each column of the header is stored as a float64 column of a single preallocated
+#NumPy array. When the array is full, its capacity is doubled, so that appending
+#N rows costs O(N) on average instead of reallocating at every row.
+import numpy as np
+
+class Column_store():
+    def __init__(self,header=[],capacity=1024):
+        self.header=list(header)
+        self.nb_rows=0
+        #incremented each time rows are appended, so that the plot windows can
+        #tell whether there is new data without comparing the data itself
+        self.version=0
+        #Fortran order: each column is contiguous in memory, so that a column view
+        #can be handed to pyqtgraph or numpy without any copy
+        self._data=np.empty((max(int(capacity),1),len(self.header)),dtype=np.float64,order='F')
+
+    @classmethod
+    def from_columns(cls,header,columns):
+        """build a store from a list of columns, e.g. [[1,3,2],[3,5,7]]"""
+        store=cls(header,capacity=max([len(col) for col in columns]+[1]))
+        if len(columns) and len(columns[0]):
+            store.append_rows(np.array(columns,dtype=np.float64).T)
+        return store
+
+    ###########################
+    #list-like index semantics#
+    ###########################
+    #measdata[i] is the i-th column, len(measdata) is the number of columns,
+    #exactly as with the former list of lists
+    def __len__(self):
+        return self._data.shape[1]
+
+    def __getitem__(self,i):
+        return self.column(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.column(i)
+
+    def column(self,i):
+        """zero-copy view of the i-th column, limited to the rows filled so far"""
+        return self._data[:self.nb_rows,i]
+
+    def column_by_name(self,name):
+        return self.column(self.header.index(name))
+
+    def as_array(self):
+        """zero-copy view of the whole dataset, shape (nb_rows,nb_columns)"""
+        return self._data[:self.nb_rows]
+
+    def capacity(self):
+        return self._data.shape[0]
+
+    ##############
+    #data storage#
+    ##############
+    def _reserve(self,nb_rows):
+        """make sure there is room for nb_rows more rows, doubling the capacity if needed"""
+        needed=self.nb_rows+nb_rows
+        capacity=self._data.shape[0]
+        if needed>capacity:
+            while capacity<needed:
+                capacity*=2
+            new_data=np.empty((capacity,self._data.shape[1]),dtype=np.float64,order='F')
+            new_data[:self.nb_rows]=self._data[:self.nb_rows]
+            self._data=new_data
+
+    def append_row(self,row):
+        """append one row of data (a list with one value per column)"""
+        self._reserve(1)
+        try:
+            self._data[self.nb_rows,:]=row
+        except (ValueError,TypeError):
+            #some values are not numbers (or the row is too short/long),
+            #store what can be converted and NaN for the rest
+            self._data[self.nb_rows,:]=self._to_floats(row)
+        self.nb_rows+=1
+        self.version+=1
+
+    def append_rows(self,rows):
+        """append a block of rows, either a list of rows or a 2D array"""
+        nb=len(rows)
+        if nb==0:
+            return
+        try:
+            block=np.asarray(rows,dtype=np.float64).reshape(nb,len(self))
+        except (ValueError,TypeError):
+            block=np.array([self._to_floats(row) for row in rows],dtype=np.float64).reshape(nb,len(self))
+        self._reserve(nb)
+        self._data[self.nb_rows:self.nb_rows+nb,:]=block
+        self.nb_rows+=nb
+        self.version+=1
+
+    def _to_floats(self,row):
+        values=[np.nan]*len(self)
+        for i in range(min(len(row),len(self))):
+            try:
+                values[i]=float(row[i])
+            except (ValueError,TypeError):
+                pass
+        return values
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#Acquisition primitive for the current-reversal measurements (+I,-I,-I,+I,
+#2nd order scheme correcting for the thermoelectric effect)
+#At each polarity step, instead of setting the current, sleeping a fixed time
+#and blocking on ':READ?':
+# - the current is set and the source is asked '*OPC?' in the same message,
+#   so that the step continues as soon as the current is applied
+# - the voltmeter is triggered (':INIT'), it integrates on its own
+# - meanwhile the other instruments (temperature, field...) are read
+# - '*OPC?;:FETC?' waits for the end of the integration and brings the reading
+#   back in one exchange
+#   reversal=Current_reversal(reserved_bus_access,I_source,voltmeter)
+#   Vp,Vm,others=reversal.measure(I,readers=[(temp_controller,lambda:temp_controller.query_temp('A'))])
+import time
+
+#+I,-I,-I,+I
+POLARITIES=(1,-1,-1,1)
+
+class Current_reversal():
+    def __init__(self,bus_access,source,voltmeter,settling_time=0.0):
+        """bus_access: the lock manager reserving the instruments (Bus_locks)
+        source: current source with set_current_source_amplitude_and_wait (e.g. Keithley6221)
+        voltmeter: voltmeter with trigger_reading and fetch_reading (e.g. Keithley2182A)
+        settling_time: extra time (s) between the current change and the trigger of the voltmeter"""
+        self.bus_access=bus_access
+        self.source=source
+        self.voltmeter=voltmeter
+        self.settling_time=settling_time
+
+    def measure(self,I,readers=[],polarities=POLARITIES,switch_off=True):
+        """Returns Vp,Vm,values: the means of the voltages measured with +I and -I,
+        and the values returned by the readers.
+        readers: list of (instrument,function without argument), read while the
+        voltmeter integrates, one reader per polarity step (the first ones first)"""
+        values=[None]*len(readers)
+        Vp=[]
+        Vm=[]
+        #the buses of all the instruments involved are reserved together
+        #(in a consistent order, see Bus_locks)
+        with self.bus_access.bus(self.source,self.voltmeter,*[instrument for instrument,function in readers]):
+            for step,polarity in enumerate(polarities):
+                self.source.set_current_source_amplitude_and_wait(polarity*I)
+                if self.settling_time:
+                    time.sleep(self.settling_time)
+                self.voltmeter.trigger_reading()
+                #the other instruments are read during the integration
+                for index in range(step,len(readers),len(polarities)):
+                    values[index]=readers[index][1]()
+                if polarity>0:
+                    Vp.append(self.voltmeter.fetch_reading())
+                else:
+                    Vm.append(self.voltmeter.fetch_reading())
+            if switch_off:
+                self.source.set_current_source_amplitude(0)
+        return mean(Vp),mean(Vm),values
+
+def mean(values):
+    return sum(values)/float(len(values)) if values else 0.0
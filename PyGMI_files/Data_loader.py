@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#Reload measurements files saved by PyGMI into column stores, so that they can
+#be displayed in the plot windows next to the data of the current run.
+#Text files are memory-mapped and parsed by chunks of several MB, each block
+#of numbers being converted to an array in a single NumPy call.
+#A file may contain several blocks of data, each one starting with its own
+#header line (when a measurements program sends a new header or a 'newfile').
+import os
+import re
+import json
+import mmap
+import numpy as np
+from Column_store import Column_store
+#HDF5 savefiles are optional
+try:
+    import h5py
+except ImportError:
+    h5py=None
+
+#a header line is a line that does not start with a number (nor with nan or inf)
+HEADER_LINE=re.compile(r'^(?![ \t]*[-+]?(?:\d|\.\d|nan|inf))[^\r\n]*\S[^\r\n]*\r?$',re.M|re.I)
+
+def load_measurements_file(filename,chunk_size=8*1024*1024):
+    """load a measurements file, return a list of Column_store, one per block of data.
+    The header of each block is in the 'header' attribute of its Column_store."""
+    extension=os.path.splitext(unicode(filename))[1].lower()
+    if extension=='.npz':
+        return load_npz_file(filename)
+    elif extension in ['.h5','.hdf5']:
+        return load_hdf5_file(filename)
+    return load_text_file(filename,chunk_size)
+
+def load_text_file(filename,chunk_size=8*1024*1024):
+    blocks=[]
+    with open(filename,'rb') as f:
+        if os.fstat(f.fileno()).st_size==0:
+            return blocks
+        data=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        try:
+            start=0
+            size=len(data)
+            while start<size:
+                #cut the file at the end of a line
+                end=data.find('\n',min(start+chunk_size,size)-1)
+                end=size if end==-1 else end+1
+                parse_text_chunk(data[start:end],blocks)
+                start=end
+        finally:
+            data.close()
+    return blocks
+
+def parse_text_chunk(text,blocks):
+    """parse a chunk of complete lines, appending the rows to the last block of
+    the list 'blocks', or starting new blocks when header lines are found"""
+    position=0
+    for match in HEADER_LINE.finditer(text):
+        parse_numbers(text[position:match.start()],blocks)
+        header=match.group(0).rstrip('\r').split('\t')
+        blocks.append(Column_store(header))
+        position=match.end()+1
+    parse_numbers(text[position:],blocks)
+
+def parse_numbers(text,blocks):
+    """parse a block of lines containing only numbers"""
+    nb_lines=text.count('\n')
+    if text.strip()=='':
+        return
+    if not(text.endswith('\n')):
+        nb_lines+=1
+    if not(blocks):
+        #data without a header
+        first_line=text.strip().split('\n')[0]
+        blocks.append(Column_store(['column '+str(i) for i in range(len(first_line.split('\t')))]))
+    store=blocks[-1]
+    #the whole block is converted at once, all whitespaces being separators
+    values=np.fromstring(text,dtype=np.float64,sep=' ')
+    if values.size==nb_lines*len(store):
+        store.append_rows(values.reshape(nb_lines,len(store)))
+    else:
+        #some lines are incomplete or contain something else than numbers,
+        #parse them one by one, NaN replacing what could not be read
+        store.append_rows([line.split('\t') for line in text.splitlines() if line.strip()!=''])
+
+def load_npz_file(filename):
+    """load a .npz savefile written by Savefile.Npz_savefile"""
+    blocks=[]
+    archive=np.load(filename)
+    try:
+        names=archive.files
+        block_names=sorted([name[:-len('_header')] for name in names if name.endswith('_header')])
+        for block in block_names:
+            header=[name.decode('utf8') for name in archive[block+'_header']]
+            store=Column_store(header)
+            for chunk in sorted([name for name in names if name.startswith(block+'_chunk')]):
+                store.append_rows(structured_to_rows(archive[chunk],len(header)))
+            blocks.append(store)
+    finally:
+        archive.close()
+    return blocks
+
+def load_hdf5_file(filename):
+    """load an HDF5 savefile written by Savefile.Hdf5_savefile"""
+    if h5py is None:
+        raise ImportError("h5py is required to load HDF5 files")
+    blocks=[]
+    with h5py.File(filename,'r') as f:
+        for block in sorted([name for name in f.keys() if name.startswith('block')]):
+            header=json.loads(f[block].attrs['header'])
+            store=Column_store(header)
+            if 'data' in f[block]:
+                store.append_rows(structured_to_rows(f[block]['data'][...],len(header)))
+            blocks.append(store)
+    return blocks
+
+def structured_to_rows(array,nb_col):
+    """convert a structured array with fields 'c0','c1',... to a 2D float array"""
+    rows=np.empty((len(array),nb_col),dtype=np.float64)
+    for i in range(nb_col):
+        try:
+            rows[:,i]=array['c'+str(i)]
+        except (ValueError,TypeError):
+            #column of strings
+            rows[:,i]=np.nan
+    return rows
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#Min/max decimation of the curves displayed in the plot windows
+#A screen cannot show more than one vertical line per pixel, so for each
+#bucket of consecutive points only the lowest and the highest ones are kept:
+#the curve looks exactly the same but has at most 2 points per pixel (plus the
+#lowest and highest points of the partial buckets at both ends).
+#The buckets are computed incrementally: at each refresh only the points
+#appended since the previous refresh are processed. When there are more
+#buckets than pixels in the width of the plot, pairs of buckets are merged,
+#which keeps the cost of a refresh bounded however long the run gets.
+import numpy as np
+
+def minmax_indices(y,bucket_size):
+    """indices of the min and max of each complete bucket of y (NaN are ignored)"""
+    nb_buckets=len(y)//bucket_size
+    segments=y[:nb_buckets*bucket_size].reshape(nb_buckets,bucket_size)
+    nans=np.isnan(segments)
+    offsets=np.arange(nb_buckets)*bucket_size
+    imin=np.argmin(np.where(nans,np.inf,segments),axis=1)+offsets
+    imax=np.argmax(np.where(nans,-np.inf,segments),axis=1)+offsets
+    return imin,imax
+
+def interleave(imin,imax):
+    """indices of the min and max of each bucket, in the order of the data"""
+    return np.sort(np.column_stack((imin,imax)),axis=1).ravel()
+
+def extrema(y,idx):
+    """indices of the min and max of the points of indices idx, a partial bucket"""
+    if len(idx)<=2:
+        return idx
+    imin,imax=minmax_indices(y[idx],len(idx))
+    return idx[interleave(imin,imax)]
+
+def decimate_selection(x,y,idx,nb_pixels):
+    """direct (not incremental) decimation of the points of indices idx"""
+    idx=Minmax_decimator(nb_pixels).decimate_indices(y,idx)
+    return x[idx],y[idx]
+
+class Minmax_decimator():
+    def __init__(self,nb_pixels=1000):
+        self.nb_pixels=nb_pixels
+        self.reset()
+
+    def reset(self,key=None):
+        self.key=key
+        self.bucket_size=1
+        #index of the min and max of each complete bucket
+        self.imin=np.zeros(0,dtype=np.intp)
+        self.imax=np.zeros(0,dtype=np.intp)
+        #number of points covered by the complete buckets
+        self.nb_done=0
+        #whether x was increasing so far, which allows fast selection of the visible range
+        self.x_sorted=True
+        self.x_checked=0
+
+    def update(self,x,y,key=None):
+        """process the points appended since the last update.
+        key identifies the data (e.g. dataset and column indices), when it changes
+        or when there are less points than before, everything is recomputed"""
+        n=min(len(x),len(y))
+        if key!=self.key or n<self.nb_done or n<self.x_checked:
+            self.reset(key)
+        #monotony of x, checked on the new points only
+        if self.x_sorted and n>self.x_checked:
+            start=max(self.x_checked-1,0)
+            self.x_sorted=bool(np.all(np.diff(x[start:n])>=0))
+            self.x_checked=n
+        #complete buckets among the new points
+        imin,imax=minmax_indices(y[self.nb_done:n],self.bucket_size)
+        self.imin=np.concatenate((self.imin,imin+self.nb_done))
+        self.imax=np.concatenate((self.imax,imax+self.nb_done))
+        self.nb_done+=len(imin)*self.bucket_size
+        #more buckets than pixels: merge them by pairs
+        while len(self.imin)>self.nb_pixels:
+            self.merge_pairs(y)
+
+    def merge_pairs(self,y):
+        if len(self.imin)%2:
+            #the last bucket has no pair, it goes back to the incomplete points
+            self.imin=self.imin[:-1]
+            self.imax=self.imax[:-1]
+            self.nb_done-=self.bucket_size
+        imin=self.imin.reshape(-1,2)
+        imax=self.imax.reshape(-1,2)
+        #NaN comparisons are False, so a NaN extremum is replaced by the other one
+        with np.errstate(invalid='ignore'):
+            self.imin=np.where(y[imin[:,1]]<y[imin[:,0]],imin[:,1],imin[:,0])
+            self.imax=np.where(y[imax[:,1]]>y[imax[:,0]],imax[:,1],imax[:,0])
+        self.imin=np.where(np.isnan(y[imin[:,0]]),imin[:,1],self.imin)
+        self.imax=np.where(np.isnan(y[imax[:,0]]),imax[:,1],self.imax)
+        self.bucket_size*=2
+
+    def indices(self,y,n,start=0,stop=None):
+        """indices of the points to display among the n first points,
+        restricted to the range [start,stop[ if given"""
+        if stop is None or stop>n:
+            stop=n
+        start=max(start,0)
+        if stop-start<=2*self.nb_pixels:
+            #few enough points to display them all
+            return np.arange(start,stop)
+        first=-(-start//self.bucket_size)
+        last=min(stop//self.bucket_size,len(self.imin))
+        if last-first>=self.nb_pixels//2:
+            #enough precomputed buckets in the range (at least a point per pixel), the points on the edges of the
+            #range and after the last complete bucket are decimated directly
+            head=np.arange(start,min(first*self.bucket_size,stop))
+            tail=np.arange(max(last*self.bucket_size,start),stop)
+            return np.concatenate((extrema(y,head),
+                                   interleave(self.imin[first:last],self.imax[first:last]),
+                                   extrema(y,tail)))
+        #zoomed in on a range narrower than the precomputed buckets, decimate it directly
+        return self.decimate_indices(y,np.arange(start,stop))
+
+    def decimate_indices(self,y,idx):
+        if len(idx)>2*self.nb_pixels:
+            bucket_size=-(-len(idx)//self.nb_pixels)
+            imin,imax=minmax_indices(y[idx],bucket_size)
+            done=len(imin)*bucket_size
+            idx=np.concatenate((idx[interleave(imin,imax)],extrema(y,idx[done:])))
+        return idx
+
+    def decimate(self,x,y,start=0,stop=None):
+        """x and y of the points to display (call update first)"""
+        idx=self.indices(y,min(len(x),len(y)),start,stop)
+        return x[idx],y[idx]
+
+    def visible_range(self,x,xmin,xmax):
+        """range of indices [start,stop[ of the points with xmin<=x<=xmax when x is sorted,
+        None otherwise"""
+        if self.x_sorted:
+            return np.searchsorted(x,xmin,'left'),np.searchsorted(x,xmax,'right')
+        return None
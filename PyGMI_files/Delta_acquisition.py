@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#Buffered delta mode acquisition with a Keithley6221 current source and a
+#Keithley2182A nanovoltmeter connected to it (RS-232 and Trigger Link cables)
+#The current reversals and the voltage measurements are done by the
+#instruments themselves at their own rate, the readings piling up in the
+#buffer of the 6221. The buffer is armed for N points, then only the new
+#readings are fetched (TRAC:DATA:SEL?), in chunks, and sent to the data queue
+#as numpy blocks (block,'rows').
+#The buffer is not polled at a fixed period: the rate at which the readings
+#arrive is measured, and the next poll is planned when a chunk of readings is
+#expected to be ready (waiting longer and longer while the first readings
+#are not there).
+#When no new reading arrives, the 6221 is asked whether the delta mode is still
+#armed: it is not after a compliance abort (SOUR:DELT:CAB ON), and the
+#acquisition then stops with an error instead of waiting forever. So it does
+#if no reading arrives for max_stall seconds.
+#   acquisition=Delta_acquisition(reserved_bus_access,instr.instr_8,I=1e-6,nb_points=1000)
+#   for block in acquisition.chunks(stop_flag):
+#       ...block[:,0] time (s), block[:,1] delta voltage (V)
+import time
+import numpy as np
+
+#readings that the buffer of the 6221 can store
+BUFFER_SIZE=65536
+#shortest and longest time between two polls of the buffer (s)
+MIN_POLL=0.01
+MAX_POLL=0.5
+#longest time without new reading before giving up (s)
+MAX_STALL=30.0
+
+class Delta_acquisition():
+    def __init__(self,bus_access,source,I,nb_points=None,delay=2e-3,chunk_size=100,min_poll=MIN_POLL,max_poll=MAX_POLL,max_stall=MAX_STALL):
+        """bus_access: the lock manager reserving the instruments (Bus_locks)
+        source: Keithley6221 driver, the 2182A being connected to it
+        I: amplitude of the current (A), alternated between +I and -I
+        nb_points: number of delta readings, None to measure until stopped
+        (the buffer is re-armed each time it is full)
+        delay: delay (s) between a current change and the voltage measurement
+        chunk_size: number of readings fetched at once, when they arrive fast enough
+        max_stall: longest time (s) without new reading before giving up"""
+        self.bus_access=bus_access
+        self.source=source
+        self.I=I
+        self.nb_points=nb_points
+        self.delay=delay
+        self.chunk_size=chunk_size
+        self.min_poll=min_poll
+        self.max_poll=max_poll
+        self.max_stall=max_stall
+        #time (time.time()) of the start of the acquisition, origin of the times of the readings
+        self.start_time=None
+
+    def arm(self,count):
+        """arm the buffer for 'count' delta readings and start them"""
+        with self.bus_access.bus(self.source):
+            self.source.setup_delta_Tlink(I=self.I,count=count,I_delay=self.delay)
+            self.source.set_data_elements('READ,TST')
+            self.source.start_delta()
+
+    def stop(self):
+        with self.bus_access.bus(self.source):
+            self.source.unarm_delta()
+
+    def next_poll(self,fetched,count,elapsed,previous):
+        """time to wait before the next poll of the buffer"""
+        if fetched==0 or elapsed<=0:
+            #no reading yet: wait longer and longer
+            wait=previous*2
+        else:
+            #time for the next chunk to arrive, at the measured rate
+            wait=min(self.chunk_size,count-fetched)/(fetched/elapsed)
+        return min(max(wait,self.min_poll),self.max_poll)
+
+    def chunks(self,stop_flag=None):
+        """generator of the new readings as numpy arrays, one row per reading:
+        time (s, since the start of the acquisition), delta voltage (V)"""
+        self.start_time=time.time()
+        done=0
+        try:
+            while self.nb_points is None or done<self.nb_points:
+                if stop_flag is not None and stop_flag.isSet():
+                    break
+                count=BUFFER_SIZE if self.nb_points is None else min(BUFFER_SIZE,self.nb_points-done)
+                self.arm(count)
+                #the timestamps of the 6221 start again at each arming
+                run_start=time.time()
+                offset=run_start-self.start_time
+                fetched=0
+                wait=self.min_poll/2.0
+                #time of the last new reading
+                last_new=run_start
+                while fetched<count:
+                    if stop_flag is not None and stop_flag.isSet():
+                        break
+                    wait=self.next_poll(fetched,count,time.time()-run_start,wait)
+                    time.sleep(wait)
+                    with self.bus_access.bus(self.source):
+                        available=min(self.source.query_buffer_points(),count)
+                        if available>fetched:
+                            data=self.source.query_delta_readings_selected(fetched,available-fetched)
+                        else:
+                            armed=self.source.query_delta_armed()
+                    if available>fetched:
+                        #READ,TST: reading and timestamp of each delta reading
+                        data=data.reshape(-1,2)
+                        fetched=available
+                        last_new=time.time()
+                        yield np.column_stack((data[:,1]+offset,data[:,0]))
+                    elif not(armed):
+                        raise RuntimeError("delta mode of the 6221 stopped after "+str(fetched)+" of "+str(count)+" readings (compliance abort?)")
+                    elif time.time()-last_new>self.max_stall:
+                        raise RuntimeError("no new delta reading from the 6221 for "+str(self.max_stall)+" s")
+                done+=fetched
+        finally:
+            #also when the consumer stops iterating
+            self.stop()
+
+    def stream(self,data_queue,stop_flag=None,columns=None):
+        """send the readings to the data queue as they arrive, one block of rows
+        per chunk. columns: function returning the rows of a chunk, by default
+        time (s), delta voltage (V)"""
+        nb=0
+        for block in self.chunks(stop_flag):
+            if columns is not None:
+                block=columns(block)
+            data_queue.put((block,'rows'))
+            nb+=len(block)
+        return nb
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#Live derived columns, e.g. R=V/I, dR/dT or moving averages, computed from the
+#data sent by the measurements programs, without editing the programs.
+#A derived column is defined by a name and an expression over the columns of
+#the header, written between braces, e.g. "R = {Vp (V)}/{I (A)}".
+#The expressions are evaluated by NumPy on whole blocks of rows, between the
+#data queue and the Master dataset: only the rows received since the previous
+#refresh are computed, with just the few previous rows that functions like
+#deriv() or moving_average() need (the lookback).
+import re
+import numpy as np
+from Column_store import Column_store
+
+PLACEHOLDER=re.compile(r'\{([^{}]*)\}')
+
+class Derived_column():
+    def __init__(self,name,expression):
+        self.name=name
+        self.expression=expression
+        #number of previous rows needed to compute a new row,
+        #known after the first evaluation
+        self.lookback=0
+        self.header=None
+        self.code=None
+        self.error_reported=False
+
+    def bind(self,header):
+        """compile the expression for a given header, the column names
+        are replaced by the columns of the array being processed"""
+        self.header=list(header)
+        self.code=None
+        def column(match):
+            return '_columns['+str(self.header.index(match.group(1)))+']'
+        try:
+            self.code=compile(PLACEHOLDER.sub(column,self.expression),'<derived column '+self.name+'>','eval')
+        except (ValueError,SyntaxError) as e:
+            #ValueError: a column name is not in the header
+            self.report_error(e)
+
+    def report_error(self,error):
+        if not(self.error_reported):
+            print "Derived column "+self.name+" can not be computed ("+str(error)+"), it is set to NaN"
+            self.error_reported=True
+
+class Derived_columns():
+    def __init__(self,definitions=[]):
+        """definitions: list of (name,expression)"""
+        self.columns=[]
+        #number of previous rows needed by the current evaluation
+        self.needed=0
+        #number of columns coming from the measurements program, for each extended header
+        self.source_width={}
+        #functions available in the expressions
+        self.namespace={'np':np,'pi':np.pi,'abs':np.abs,'sqrt':np.sqrt,'exp':np.exp,'log':np.log,'log10':np.log10,
+                        'sin':np.sin,'cos':np.cos,'tan':np.tan,'arctan2':np.arctan2,
+                        'deriv':self.deriv,'moving_average':self.moving_average,'previous':self.previous}
+        for name,expression in definitions:
+            self.add(name,expression)
+
+    def add(self,name,expression):
+        """add a derived column, replacing the one with the same name if any"""
+        self.remove(name)
+        self.columns.append(Derived_column(name,expression))
+
+    def remove(self,name):
+        self.columns=[column for column in self.columns if column.name!=name]
+
+    def clear(self):
+        self.columns=[]
+
+    def names(self):
+        return [column.name for column in self.columns]
+
+    def extend_header(self,header):
+        """header of the data followed by the names of the derived columns
+        (a derived column with the name of a column of the data is ignored)"""
+        extended=list(header)+[name for name in self.names() if name not in header]
+        self.source_width[tuple(extended)]=self.source_width.get(tuple(header),len(header))
+        return extended
+
+    def nb_source(self,header):
+        """number of columns of the header that come from the measurements program"""
+        return self.source_width.get(tuple(header),len(header))
+
+    ###############################
+    #functions for the expressions#
+    ###############################
+    #they return one value per row, NaN when the previous rows are missing,
+    #and add the number of previous rows they need to self.needed: nested calls
+    #need the sum, e.g. deriv(moving_average(y,3),x) needs 2+1 previous rows
+    #(calls side by side are counted twice, which only costs a few more rows)
+    def deriv(self,y,x):
+        """derivative dy/dx between each row and the previous one"""
+        self.needed+=1
+        result=np.empty(len(y))
+        result[:1]=np.nan
+        result[1:]=np.diff(y)/np.diff(x)
+        return result
+
+    def moving_average(self,y,n):
+        """average of each row and of the n-1 previous ones"""
+        n=int(n)
+        self.needed+=max(n-1,0)
+        result=np.empty(len(y))
+        result[:n-1]=np.nan
+        if len(y)>=n:
+            sums=np.cumsum(np.concatenate(([0.],y)))
+            result[n-1:]=(sums[n:]-sums[:-n])/n
+        return result
+
+    def previous(self,y):
+        """value of the previous row"""
+        self.needed+=1
+        result=np.empty(len(y))
+        result[:1]=np.nan
+        result[1:]=y[:-1]
+        return result
+
+    ############
+    #evaluation#
+    ############
+    def evaluate(self,window,header,first,start_column=0):
+        """compute the derived columns of the array 'window' (one column per
+        entry of header) from index 'start_column', in place, for the rows from index 'first'"""
+        columns=[window[:,i] for i in range(window.shape[1])]
+        for column in self.columns:
+            if column.name not in header[start_column:]:
+                continue
+            index=header.index(column.name,start_column)
+            if column.header!=header:
+                column.bind(header)
+            if column.code is None:
+                window[first:,index]=np.nan
+                continue
+            self.needed=0
+            try:
+                with np.errstate(all='ignore'):
+                    values=eval(column.code,self.namespace,{'_columns':columns})
+                window[first:,index]=np.asarray(values,dtype=np.float64)[first:] if np.ndim(values) else values
+                column.lookback=max(column.lookback,self.needed)
+            except Exception as e:
+                column.report_error(e)
+                window[first:,index]=np.nan
+
+    def lookback(self):
+        return max([column.lookback for column in self.columns]+[0])
+
+    def append_rows(self,store,rows):
+        """append the rows received from the measurements program to the store,
+        with the derived columns computed.
+        Return the derived values of these rows (one row per row received)"""
+        header=store.header
+        nb_source=self.nb_source(header)
+        #no derived column in the header: also after a clear, the derived columns
+        #of the current header are still there (and saved, as NaN)
+        if nb_source==len(header) or len(rows)==0:
+            store.append_rows(rows)
+            return None
+        nb=len(rows)
+        block=np.empty((nb,len(header)),dtype=np.float64)
+        #columns whose definition was removed since the header was sent stay NaN
+        block[:,nb_source:]=np.nan
+        try:
+            block[:,:nb_source]=np.asarray(rows,dtype=np.float64).reshape(nb,nb_source)
+        except (ValueError,TypeError):
+            block[:,:nb_source]=np.array([store._to_floats(row) for row in rows],dtype=np.float64)[:,:nb_source]
+        #the previous rows needed by the expressions are put in front of the new ones
+        lookback=min(self.lookback(),store.nb_rows)
+        window=np.concatenate((store.as_array()[store.nb_rows-lookback:],block))
+        self.evaluate(window,header,lookback,nb_source)
+        block=window[lookback:]
+        store.append_rows(block)
+        return block[:,nb_source:]
+
+    def extend_store(self,store):
+        """copy of the store with the derived columns added since it was
+        created, computed once over all its rows"""
+        header=self.extend_header(store.header)
+        if header==store.header:
+            return store
+        new_store=Column_store(header,capacity=store.capacity())
+        window=np.empty((store.nb_rows,len(header)),dtype=np.float64)
+        window[:,:len(store.header)]=store.as_array()
+        self.evaluate(window,header,0,len(store.header))
+        new_store.append_rows(window)
+        return new_store
+
+if __name__ == "__main__":
+    #check that the rows give the same derived values whether they are
+    #received in blocks or all at once, with nested functions
+    header=['T','V']
+    rows=[[t,np.sin(t)] for t in np.linspace(1,2,30)]
+    results=[]
+    for block_size in [len(rows),1,3,7]:
+        derived=Derived_columns([('dV/dT','deriv(moving_average({V},3),{T})'),('previous dV/dT','previous({dV/dT})')])
+        store=Column_store(derived.extend_header(header))
+        for start in range(0,len(rows),block_size):
+            derived.append_rows(store,rows[start:start+block_size])
+        results.append(store.as_array()[:,len(header):])
+    for block_size,result in zip([1,3,7],results[1:]):
+        same=np.allclose(result,results[0],equal_nan=True)
+        print "blocks of",block_size,"rows:","same values" if same else "DIFFERENT values"
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
-import visa,time
+import time
 from random import randrange
+from .. import Simulated_instruments
 #print randrange(10)
 
 class Connect_Instrument():
@@ -72,3 +73,12 @@ class Connect_Instrument():
             self.status='HOLDING at the programmed current/field'
         return self.status
 
+    #the simulated instruments (VISA addresses SIM::..., see Simulated_instruments.py)
+    #are configured through this virtual instrument
+    def configure_simulated_instruments(self,target=None,latency=None,noise=None,error_rate=None):
+        """target: None for all the simulated instruments, a model (e.g. 'SR830') or an address
+        latency: time in s to answer a query, noise: relative noise, error_rate: probability of a timeout"""
+        Simulated_instruments.configure(target,latency,noise,error_rate)
+
+    def query_simulated_instruments_settings(self,target=None):
+        return Simulated_instruments.get_settings(target)
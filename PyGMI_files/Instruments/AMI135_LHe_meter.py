@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
-import visa,time
+import time
+from .. import Visa_pool
 # Retry decorator with return
 def retry_with(tries=2,ans_type=int,default_ans=-1,wait=1):
     '''Retries a function or method until it returns an answer of the right type
@@ -52,7 +53,7 @@ def retry(tries=2,wait=1):
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB1::1"):
         #part to be run at instrument initialization, the following commands are mandatory
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         self.VISA_address=VISA_address
         print self.query_unit_Id()
 
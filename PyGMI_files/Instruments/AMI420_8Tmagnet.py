@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
-import visa,time
+import time
+from .. import Visa_pool
 
 # Retry decorator with return
 def retry_with(tries=2,ans_type=int,default_ans=-1,wait=15):
@@ -64,7 +65,7 @@ def retry(tries=2,wait=1):
 
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB1::22"):
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         print self.query_unit_Id()
         self.last_known_field_value_in_T=0.0
         print "last known persistent field value in magnet",self.last_known_field_value_in_T,"T"
@@ -1,14 +1,33 @@
 # -*- coding: utf-8 -*-
-import visa
+import re
+import time
+from .. import Visa_pool
+from .. import Read_cache
+
+#readings of the inputs are not updated faster than that by the controller (s),
+#an older snapshot is read again
+SNAPSHOT_MAX_AGE=0.1
+#names of the inputs accepted by the controller
+INPUTS={'0':'A','1':'B','CHA':'A','CHB':'B','A':'A','B':'B'}
+
+def reading_value(text):
+    """value of a reading, possibly followed by its unit (e.g. '4.2000K' or '35.2%'),
+    nan when there is none (e.g. '-.-' for a sensor out of range)"""
+    number=re.match(r'\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?',text)
+    if number is None:
+        return float('nan')
+    return float(number.group(0))
 
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB::12"):
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         print self.io.query("*IDN?")
         #the encoding of the python script file is utf8 but the Qt interface is unicode, so conversion is needed
         self.channels_names=[]
         for txt in ['A','B']:
             self.channels_names.append(unicode(txt,encoding='utf-8'))
+        #last snapshot of the controller, shared by all the threads using it
+        self.snapshot_cache=Read_cache.Cached_reading(SNAPSHOT_MAX_AGE)
 
     def initialize(self,combobox=None):
         if combobox is not None:
@@ -16,11 +35,30 @@ class Connect_Instrument():
             combobox.clear()
             combobox.addItems(self.channels_names)      
 
+    @Read_cache.published
     def query_temp(self,channel):
         #reports the current temperature reading on any of the input channels
         #channel can be 0,1/CHA,CHB/A,B
+        channel=str(channel).upper()
+        if channel in INPUTS:
+            #from the snapshot shared with the other threads, if recent enough
+            return self.snapshot()[INPUTS[channel]]
         return float(self.io.query("INP? "+channel))
 
+    def snapshot(self,max_age=None):
+        """temperatures of the inputs A and B, setpoint and heater output (%) of the loop 1,
+        read in a single message and time-stamped:
+        {'time':time.time(),'A':T_A,'B':T_B,'setpoint':setpoint,'heater':heater}
+        A snapshot younger than max_age (s, by default self.snapshot_cache.max_age) is reused"""
+        return self.snapshot_cache.get(self.read_snapshot,max_age)
+
+    def read_snapshot(self):
+        """read a new snapshot (see snapshot)"""
+        answer=self.io.query("INP? A;INP? B;LOOP 1:SETPT?;LOOP 1:HTRREAD?").split(';')
+        values=dict(zip(['A','B','setpoint','heater'],map(reading_value,answer)))
+        values['time']=time.time()
+        return values
+
     def query_resistance(self,channel):
         #The INPUT:SENPR query reports the reading on a selected input channel. For diode
         #and thermocouple sensors, the reading is in Volts while resistor sensors are reported in Ohms
@@ -38,6 +76,7 @@ class Connect_Instrument():
     def set_unit(self,channel,unit):
         if unit in ['K', 'C', 'F', 'V', 'O'] and channel in ['0','1','CHA','CHB','A','B']:
             self.io.write('INP '+channel+':UNIT '+unit)
+            self.snapshot_cache.clear()
         else:
             raise ValueError
 
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
-import visa
+from .. import Visa_pool
+from .. import Binary_transfer
 import time
+import numpy as np
 
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB1::17"):
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         print self.io.query("*IDN?")
         sens_list_utf8=['10 mV','100 mV','1 V','10 V','100 V']
         self.sens_list_num=[0.01,0.1,1,10,100]
@@ -12,6 +14,8 @@ class Connect_Instrument():
         self.sensitivity=[]
         for txt in sens_list_utf8:
             self.sensitivity.append(unicode(txt,encoding='utf-8'))
+        #trace buffer reads by binary transfer (REAL,32), until it fails once (see Binary_transfer)
+        self.binary_transfer=True
 
     def initialize(self):
         """commands executed when the instrument is initialized"""
@@ -73,6 +77,89 @@ class Connect_Instrument():
             self.io.write(txt)
         time.sleep(1) #init needs at least one second to complete
         
+    def setup_trace(self,points=1024,external_trigger=True,NPLC=None,verbose=False):
+        """trace buffer mode: the readings, triggered by the trigger link cable (or taken one after
+        the other), are stored in the buffer of the instrument with their timestamps, and
+        collected in bulk with fetch_trace"""
+        print "configuring Keithley2182A for storing the readings in its trace buffer"
+        lnanoV=[':syst:pres', # 2182 - System preset defaults.
+                ':CONF:VOLT',
+                ':INIT:CONT OFF',
+                ':trig:sour '+('ext' if external_trigger else 'imm'),
+                ':trig:coun inf',
+                ':SAMP:COUN 1',
+                ':TRAC:CLE',
+                ':TRAC:POIN '+str(points), # 2 to 1024 readings
+                ':TRAC:FEED SENS',
+                ':TRAC:TST:FORM ABS', # timestamps relative to the first reading of the buffer
+                ':FORM:ELEM READ,TST',
+                ':TRAC:FEED:CONT NEXT'] # store the readings until the buffer is full
+        if NPLC is not None:
+            lnanoV.append(':SENS:VOLT:NPLC '+str(NPLC))
+        lnanoV.append(':INIT')
+        for txt in lnanoV:
+            if verbose:
+                print txt
+            self.io.write(txt)
+        self.trace_points=points
+        #readings of the buffer already returned, and time of the start of the buffer since setup_trace
+        self.trace_fetched=0
+        self.trace_start=time.time()
+        self.trace_offset=0.0
+        #time (time.time()) when the current buffer was started
+        self.trace_buffer_start=self.trace_start
+        #interval between two readings (s), measured by the instrument
+        self.trace_period=None
+        #readings lost while the buffer was full: (time of the first missing reading, duration)
+        self.trace_gaps=[]
+
+    def trace_fill_time(self):
+        """time (s) taken to fill the buffer, None until the interval between two readings is known"""
+        if self.trace_period is None:
+            return None
+        return self.trace_points*self.trace_period
+
+    def fetch_trace(self,min_new=None):
+        """Returns without waiting the readings stored since the last call, as a numpy array
+with one row per reading: timestamp (s since setup_trace, from the instrument), reading (V).
+The 2182A can not send part of its buffer: it sends all the readings stored (by binary
+transfer), so it is read only when at least min_new readings are new (an eighth of the
+buffer by default), or when it is full.
+Once full, the buffer is cleared and restarted. The timestamps go on from the last one of
+the instrument, the readings taken until the restart are lost: a row (time of the first
+missing reading, NaN) marks the gap, which is also added to self.trace_gaps."""
+        if min_new is None:
+            min_new=max(self.trace_points//8,1)
+        available=int(self.io.query(':TRAC:POIN:ACT?'))
+        new=available-self.trace_fetched
+        if new<=0 or (new<min_new and available<self.trace_points):
+            return np.zeros((0,2))
+        data=Binary_transfer.query_real(self,':TRAC:DATA?').reshape(-1,2)
+        #with the readings stored since the query of their number
+        available=len(data)
+        timestamps=data[:,1]
+        if available>1:
+            self.trace_period=(timestamps[-1]-timestamps[0])/(available-1)
+        readings=np.column_stack((timestamps[self.trace_fetched:]+self.trace_offset,data[self.trace_fetched:,0]))
+        self.trace_fetched=available
+        if available>=self.trace_points:
+            #the buffer is full and stopped storing: restart it
+            self.io.write(':TRAC:CLE;:TRAC:FEED:CONT NEXT')
+            restart=time.time()
+            period=self.trace_period if self.trace_period is not None else 0.0
+            #first missing reading, and time until the restart, which only the computer can tell
+            missing=self.trace_offset+timestamps[-1]+period
+            gap=max(restart-self.trace_buffer_start-timestamps[-1]-period,0.0)
+            self.trace_gaps.append((missing,gap))
+            readings=np.vstack((readings,[[missing,np.nan]]))
+            self.trace_offset=missing+gap
+            self.trace_buffer_start=restart
+            self.trace_fetched=0
+        return readings
+
+    def stop_trace(self):
+        self.io.write(':ABOR;:TRAC:FEED:CONT NEV')
+
     def setup_sensitivity_combobox(self,comboBox):
         comboBox.clear()        
         comboBox.addItems(self.sensitivity)                
@@ -100,6 +187,17 @@ averaging to default settings."""
     def query_voltage(self):
         return float(self.io.query(":READ?"))
     
+    def trigger_reading(self):
+        """Takes the trigger model out of idle for one reading (single shot set-up,
+:INIT:CONT OFF), without waiting for it: the bus is free while the voltmeter integrates.
+The reading is then collected with fetch_reading."""
+        self.io.write(':INIT')
+
+    def fetch_reading(self):
+        """Waits for the end of the reading triggered by trigger_reading (*OPC?)
+and returns it (:FETCh?), in one exchange"""
+        return float(self.io.query('*OPC?;:FETCh?').split(';')[-1])
+
     def query_latest_reading(self):
         """This command does not trigger a measurement. The command simply requests the last
 available reading. Note that this command can repeatedly return the same reading."""
@@ -1,11 +1,20 @@
 # -*- coding: utf-8 -*-
-import visa
+from .. import Visa_pool
+from .. import Binary_transfer
 import time
+import numpy as np
+
+#points of a list sweep, and readings that the buffer of the SourceMeter can store
+MAX_LIST_POINTS=100
+MAX_SWEEP_POINTS=2500
 
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB1::17"):
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         print self.io.query("*IDN?")
+        #sweep readings read by binary transfer (REAL,32), until it fails once (see Binary_transfer)
+        self.binary_transfer=True
+        self.sweep_points=1
 
     def query_unit_Id(self):
         return self.io.query("*IDN?")
@@ -191,8 +200,84 @@ class Connect_Instrument():
         self.io.write(":SYSTem:RSEN 1") #to allow 4 wire measurements (it's 2 wires by default)
         self.io.write(":format:elements volt") #to configure what data elements are returned, by default it's  (VOLTage, CURRent,RESistance, TIME, and STATus). We just want volt.
 
+    def query_data_elements(self):
+        """data elements of each reading, e.g. ['VOLT']"""
+        return self.io.query(':format:elements?').strip().split(',')
+
     def set_integration_rate(self,NPLC):
         self.io.write(':SENS:VOLT:NPLC '+str(NPLC))
         
     def query_voltage(self):
         return float(self.io.query(":READ?"))
+
+    #sweeps: the currents are loaded in the SourceMeter, which runs a
+    #source-delay-measure cycle for each of them when triggered, the readings
+    #being stored and then sent back all at once
+    def setup_current_sweep(self,currents,source_delay=0.0):
+        """load a current sweep: a list sweep (up to 100 points, any currents) or a linear
+        staircase sweep (up to 2500 evenly spaced currents), source_delay (s) being the delay
+        between the setting of each current and its measurement"""
+        currents=np.asarray(currents,dtype=np.float64)
+        nb=len(currents)
+        if nb==0 or nb>MAX_SWEEP_POINTS:
+            raise ValueError("a sweep has from 1 to "+str(MAX_SWEEP_POINTS)+" points, not "+str(nb))
+        if nb<=MAX_LIST_POINTS:
+            self.io.write(':SOUR:LIST:CURR '+','.join([str(current) for current in currents]))
+            self.io.write(':SOUR:CURR:MODE LIST')
+        else:
+            steps=np.diff(currents)
+            if not(np.allclose(steps,steps[0],rtol=1e-6,atol=0)):
+                raise ValueError("the currents of a sweep of more than "+str(MAX_LIST_POINTS)+" points must be evenly spaced")
+            self.io.write(':SOUR:CURR:STAR '+str(currents[0]))
+            self.io.write(':SOUR:CURR:STOP '+str(currents[-1]))
+            self.io.write(':SOUR:SWE:SPAC LIN')
+            self.io.write(':SOUR:SWE:RANG BEST') #a single source range, fitting all the currents
+            self.io.write(':SOUR:SWE:POIN '+str(nb))
+            self.io.write(':SOUR:CURR:MODE SWE')
+        self.io.write(':SOUR:DEL '+str(source_delay))
+        self.io.write(':TRIG:COUN '+str(nb)) #one trigger per point
+        self.sweep_points=nb
+
+    def run_sweep(self,duration=None):
+        """run the sweep loaded with setup_current_sweep and return all its readings in one read,
+        as a numpy array with one row per point (the elements set with :format:elements).
+        duration: expected duration (s) of the sweep, the timeout is extended accordingly"""
+        timeout=self.io.timeout
+        if duration is not None:
+            self.io.timeout=max(timeout,(duration+2)*1000)
+        try:
+            #the sweep is run once (not with :READ?, which a fallback to ASCII
+            #would send again), *OPC? answering when it is done
+            self.io.query(':INIT;*OPC?')
+        finally:
+            self.io.timeout=timeout
+        #only the stored readings are read again if the binary transfer fails
+        readings=Binary_transfer.query_real(self,':FETC?')
+        return readings.reshape(self.sweep_points,-1)
+
+    def end_sweep(self):
+        """back to a fixed current and single shot readings"""
+        self.io.write(':SOUR:CURR:MODE FIX')
+        self.io.write(':TRIG:COUN 1')
+        self.sweep_points=1
+
+    def measure_current_sweep(self,currents,source_delay=0.0,point_duration=None):
+        """readings for each of the currents (the sweeps being split to fit in the buffer,
+        or in lists of 100 points if the currents are not evenly spaced),
+        point_duration: expected duration (s) of the measurement of a point"""
+        currents=np.asarray(currents,dtype=np.float64)
+        if len(currents)==0:
+            #no sweep, no reading (one column per data element)
+            return np.empty((0,len(self.query_data_elements())))
+        steps=np.diff(currents)
+        if len(steps) and np.allclose(steps,steps[0],rtol=1e-6,atol=0):
+            size=MAX_SWEEP_POINTS
+        else:
+            size=MAX_LIST_POINTS
+        readings=[]
+        for start in range(0,len(currents),size):
+            part=currents[start:start+size]
+            self.setup_current_sweep(part,source_delay)
+            readings.append(self.run_sweep(None if point_duration is None else len(part)*point_duration))
+        self.end_sweep()
+        return np.concatenate(readings)
@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
-import visa
+from .. import Visa_pool
+from .. import Binary_transfer
+from .. import Read_cache
 import time
 import numpy as np
 
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB1::17"):
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         print self.io.query("*IDN?")
+        #buffer reads by binary transfer (REAL,32), until it fails once (see Binary_transfer)
+        self.binary_transfer=True
     
     def initialize(self):
         """commands executed when the instrument is initialized"""
@@ -18,15 +22,19 @@ class Connect_Instrument():
     def query_unit_Id(self):
         return self.io.query("*IDN?")
 
+    @Read_cache.invalidating
     def reset(self):
         self.io.write('*RST')
         
+    @Read_cache.invalidating
     def output_ON(self):
         self.io.write('OUTP ON')
     
+    @Read_cache.invalidating
     def output_OFF(self):
         self.io.write('OUTP OFF')
 
+    @Read_cache.published
     def query_output_ON(self):
         if self.io.query('OUTP?')=='1':
             return True
@@ -42,15 +50,24 @@ class Connect_Instrument():
     def current_source_range_auto(self):
         self.io.write('CURRent:RANGe:AUTO ON')
 
+    @Read_cache.invalidating
     def set_current_source_amplitude(self,amp):
         self.io.write('CURR '+str(amp))
 
+    @Read_cache.invalidating
+    def set_current_source_amplitude_and_wait(self,amp):
+        """returns once the new current is applied (*OPC? sent in the same message)"""
+        self.io.query('CURR '+str(amp)+';*OPC?')
+
+    @Read_cache.published
     def query_current_source_amplitude(self):
         return float(self.io.query('curr?'))
         
+    @Read_cache.invalidating
     def set_voltage_compliance(self,voltage):
         self.io.write('CURRent:COMPliance '+str(voltage))#despite the command name 'CURRent', it really does set the voltage compliance
 
+    @Read_cache.published
     def query_voltage_compliance(self):
         return float(self.io.query('curr:comp?'))
 
@@ -63,6 +80,13 @@ class Connect_Instrument():
     def arm_delta(self):
         self.io.write('SOUR:DELT:ARM')
 
+    def query_delta_armed(self):
+        """False once the delta mode is disarmed, e.g. by a compliance abort"""
+        if self.io.query('SOUR:DELT:ARM?')=='1':
+            return True
+        else:
+            return False
+
     def set_delta_delay(self,secs):
         self.io.write('SOUR:DELT:DELay '+str(secs)) #Sets Delta delay to X secs. 
 
@@ -129,21 +153,27 @@ corrupt or stale will occur."""
         self.io.write('INIT:IMM') # Starts Delta measurements.
     
     def query_delta_readings(self,nb_of_pts=None,waitime=10e-3):
-        if nb_of_pts is None:
-            return self.io.query_ascii_values('TRAC:DATA?')
-        else:
-            while int(self.io.query('TRAC:POIN:ACT?'))!=nb_of_pts:
-                time.sleep(waitime)
-            return self.io.query_ascii_values('TRAC:DATA?')
+        return self.query_delta_readings_as_numpy(nb_of_pts,waitime).tolist()
 
     def query_delta_readings_as_numpy(self,nb_of_pts=None,waitime=10e-3):
-        if nb_of_pts is None:
-            return self.io.query_ascii_values('TRAC:DATA?', container=np.array)
-        else:
+        if nb_of_pts is not None:
             while int(self.io.query('TRAC:POIN:ACT?'))!=nb_of_pts:
                 time.sleep(waitime)
-            return self.io.query_ascii_values('TRAC:DATA?', container=np.array)
+        return Binary_transfer.query_real(self,'TRAC:DATA?')
     
+    def set_data_elements(self,elements='READ,TST'):
+        """data elements of each reading returned by TRAC:DATA?, e.g. 'READ,TST' (reading, timestamp)"""
+        self.io.write('FORM:ELEM '+elements)
+
+    def query_buffer_points(self):
+        """number of readings stored in the buffer"""
+        return int(self.io.query('TRAC:POIN:ACT?'))
+
+    def query_delta_readings_selected(self,start,count):
+        """'count' readings of the buffer from the reading 'start' (the first one is 0), as a numpy array,
+        so that the readings already fetched are not transferred again"""
+        return Binary_transfer.query_real(self,'TRAC:DATA:SEL? '+str(start)+','+str(count))
+
     def unarm_delta(self):
         self.io.write('SOUR:SWE:ABOR')
             
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import visa
+from .. import Visa_pool
 import re
 import numpy as np
 import time
@@ -61,7 +61,7 @@ LRlockout = {0:'Front panel unlocked',1:'Front panel locked'}
     
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB1::18::INSTR"):
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
 
     def initialize(self):
         return 1      
@@ -1,14 +1,24 @@
 # -*- coding: utf-8 -*-
-import visa
+import time
+from .. import Visa_pool
+from .. import Read_cache
+
+#readings of the inputs are not updated faster than that by the controller (s),
+#an older snapshot is read again
+SNAPSHOT_MAX_AGE=0.1
 
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB1::12"):
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         print self.query_unit_Id()
         #the encoding of the python script file is utf8 but the Qt interface is unicode, so conversion is needed
         self.channels_names=[]
         for txt in ['A','B','C','D']:
             self.channels_names.append(unicode(txt,encoding='utf-8'))
+        #last snapshot of the controller, shared by all the threads using it
+        self.snapshot_cache=Read_cache.Cached_reading(SNAPSHOT_MAX_AGE)
+        #KRDG? 0 reads all the inputs at once, otherwise they are read one by one in the same message
+        self.read_all_inputs=True
 
     def initialize(self,combobox=None):
         if combobox is not None:
@@ -20,10 +30,50 @@ class Connect_Instrument():
     def query_unit_Id(self):
         return self.io.query("*IDN?")
 
+    @Read_cache.published
     def query_temp(self,channel):
         #reports the current temperature reading on any of the input channels
         #channel can be A,B,C,D
+        channel=str(channel).upper()
+        if channel in ['A','B','C','D']:
+            #from the snapshot shared with the other threads, if recent enough
+            return self.snapshot()[channel]
         return float(self.io.query("KRDG? "+channel))
+
+    def snapshot(self,max_age=None):
+        """temperatures of the inputs A,B,C,D, setpoint and heater output (%) of the loop 1,
+        read in a single message and time-stamped:
+        {'time':time.time(),'A':T_A,'B':T_B,'C':T_C,'D':T_D,'setpoint':setpoint,'heater':heater}
+        A snapshot younger than max_age (s, by default self.snapshot_cache.max_age) is reused"""
+        return self.snapshot_cache.get(self.read_snapshot,max_age)
+
+    def read_snapshot(self):
+        """read a new snapshot (see snapshot)"""
+        if self.read_all_inputs:
+            #a timeout is raised as for any other query
+            answer=self.io.query("KRDG? 0;SETP? 1;HTR?").split(';')
+            try:
+                temperatures=answer[0].split(',')
+                if len(answer)!=3 or len(temperatures)!=4:
+                    raise ValueError("unexpected answer "+repr(answer))
+                values=dict(zip(['A','B','C','D'],map(float,temperatures)))
+            except ValueError as e:
+                #firmware without KRDG? 0: the command is rejected, its answer is missing or malformed
+                print "KRDG? 0 failed ("+str(e)+"), reading the inputs one by one"
+                self.read_all_inputs=False
+                try:
+                    self.io.clear()
+                except Exception:
+                    pass
+                return self.read_snapshot()
+        else:
+            answer=self.io.query("KRDG? A;KRDG? B;KRDG? C;KRDG? D;SETP? 1;HTR?").split(';')
+            values=dict(zip(['A','B','C','D'],map(float,answer[:4])))
+            answer=answer[3:]
+        values['setpoint']=float(answer[1])
+        values['heater']=float(answer[2])
+        values['time']=time.time()
+        return values
     
     def query_Status_Byte(self):
         return bin(int(self.io.query("*STB?")))[2:]
@@ -61,6 +111,7 @@ class Connect_Instrument():
     def set_heater_range(self,value):
         """Valid entries: 0 - 5."""
         self.io.write("RANGE "+str(value))
+        self.snapshot_cache.clear()
 #50 Ohm, 1A:
         #{'off':0,'5mW':1,'50mW':2,'500mW':3,'5W':4,'50W':5}
 
@@ -69,7 +120,8 @@ class Connect_Instrument():
         """Configures the control loop setpoint.
         <loop> Specifies which loop to configure.
         <temperature> The value for the setpoint (in whatever units the setpoint is using)."""
-        self.io.write("SETP "+str(loop)+', '+str(temperature))   
+        self.io.write("SETP "+str(loop)+', '+str(temperature))
+        self.snapshot_cache.clear()
     
     def query_PID(self,loop):
         return map(float,self.io.query('PID? '+str(loop)).split(','))
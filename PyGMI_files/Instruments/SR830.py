@@ -1,13 +1,19 @@
 # -*- coding: utf-8 -*-
-import visa
+from .. import Visa_pool
+from .. import Binary_transfer
+from .. import Read_cache
+import numpy as np
+import math
 
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB::17"):
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         #The OUTX command sets the output interface to RS232 (i=0) or GPIB (i=1)
         if VISA_address.count("GPIB"):
             self.io.write("OUTX 1")
         print self.io.query("*IDN?")
+        #buffer reads by binary transfer (TRCB?/TRCL?), until it fails once (see Binary_transfer)
+        self.binary_transfer=True
 
         self.sensitivity_dict={'2 nV/fA':0,'50 μV/pA':13,
                      '5 nV/fA':1,'100 μV/pA':14,
@@ -71,6 +77,7 @@ class Connect_Instrument():
 
 #commands below works for SR830, todo: check if they are the same for SR844
 
+    @Read_cache.invalidating
     def set_ref_mode(self,i):
         """set the reference source. The parameter i selects internal (i=1) or external (i=0)"""
         conv={'Internal':1,'External':0,1:1,0:0}
@@ -90,26 +97,32 @@ class Connect_Instrument():
         return float(self.io.query('AUXV?1'))
 
 
+    @Read_cache.invalidating
     def set_frequency(self,f):
         """set the reference frequency"""
         self.io.write("FREQ"+str(f))
 
+    @Read_cache.published
     def query_frequency(self):
         """query the reference frequency"""
         return float(self.io.query("FREQ?"))
 
+    @Read_cache.invalidating
     def set_amplitude(self,value):
         if type(value)==float:
             self.io.write('SLVL'+str(value))
         else:
             raise TypeError
 
+    @Read_cache.published
     def query_amplitude(self):
         return float(self.io.query('SLVL?'))
         
+    @Read_cache.published
     def query_phase(self):
         return float(self.io.query('PHAS?'))
     
+    @Read_cache.invalidating
     def set_phase(self,value):
         if value>=-360.0 and value <=729.99:
             self.io.write('PHAS'+str(value))
@@ -126,6 +139,7 @@ class Connect_Instrument():
         """query the X and Y of signal at the exact same instant"""
         return self.io.ask_for_values("SNAP?1,2")
         
+    @Read_cache.invalidating
     def set_harmonic(self,i=1):
         """set the i-th harmonic to measure"""
         self.io.write("HARM"+str(i))
@@ -134,26 +148,31 @@ class Connect_Instrument():
     def query_sensitivity(self):
         return int(self.io.query("SENS?"))
     
+    @Read_cache.invalidating
     def set_sensitivity(self,value=12):
         self.io.write('SENS'+str(value))
     
     def query_time_cste(self):
         return int(self.io.query("OFLT?"))
     
+    @Read_cache.invalidating
     def set_time_cste(self,value=10):
         self.io.write('OFLT'+str(value))
         
     def query_filter_slop(self):
         return int(self.io.query("OFSL?"))     
 
+    @Read_cache.invalidating
     def set_filter_slop(self,value=3):
         self.io.write('OFSL'+str(value))
         
+    @Read_cache.invalidating
     def set_ch1_display(self,x):
         ch1={'X':'0','R':'1','X Noise':'2','Aux In 1':'3','Aux In 2':'4'}
         if x in ch1:
             self.io.write('DDEF1,'+ch1[x]+',0')
             
+    @Read_cache.invalidating
     def set_ch2_display(self,y):
         ch2={'Y':'0','theta':'1','Y Noise':'2','Aux In 3':'3','Aux In 4':'4'}
         if y in ch2:
@@ -165,7 +184,57 @@ class Connect_Instrument():
     def query_ch2_display(self):
         return int(self.io.ask_for_values("DDEF?2")[0])
         
+    @Read_cache.published
     def query_ch1_ch2(self,x,y):
         """query the ch1 and ch2 of signal at the same instant"""
         conv={'X':'1','Y':'2','R':'3','theta':'4','Aux In 1':'5','Aux In 2':'6','Aux In 3':'7','Aux In 4':'8','Reference Frequency':'9','CH1 display':'10','CH2 display':'11'}
         return self.io.ask_for_values("SNAP?"+conv[x]+','+conv[y])
+
+    #data buffer: the CH1 and CH2 displays stored at a sample rate of 62.5 mHz*2**i (i=0 to 13, up to 512 Hz)
+    def set_sample_rate(self,rate=512.0):
+        """set the sample rate of the data buffer to the closest available rate (Hz), and return it"""
+        i=min(max(int(round(math.log(rate/0.0625,2))),0),13)
+        self.io.write("SRAT"+str(i))
+        return 0.0625*2**i
+
+    def set_buffer_mode(self,loop=False):
+        """single shot (stops when the buffer is full) or loop (the oldest points are overwritten)"""
+        self.io.write("SEND"+('1' if loop else '0'))
+
+    def start_buffer(self):
+        """start or resume the storage of the points"""
+        self.io.write("STRT")
+
+    def pause_buffer(self):
+        self.io.write("PAUS")
+
+    def reset_buffer(self):
+        """pause the storage and clear the buffer"""
+        self.io.write("REST")
+
+    def query_buffer_points(self):
+        """number of points stored in the data buffer"""
+        return int(self.io.query("SPTS?"))
+
+    def query_buffer(self,channel=1,start=0,count=None,nonnormalized=False):
+        """'count' points (all the points by default) of the data buffer of CH1 (channel=1) or CH2 (channel=2),
+        from the point 'start' (the first one is 0), as a numpy array.
+        The points are read by binary transfer: IEEE floats (TRCB?), or in the non-normalized format (TRCL?)
+        which the SR830 sends faster, or in ASCII (TRCA?) if the binary transfer fails"""
+        if count is None:
+            count=self.query_buffer_points()-start
+        if count<=0:
+            return np.array([])
+        indices=str(channel)+','+str(start)+','+str(count)
+        def binary():
+            if nonnormalized:
+                values=Binary_transfer.parse_sr830_nonnormalized(Binary_transfer.query_raw(self.io,"TRCL? "+indices))
+            else:
+                values=Binary_transfer.parse_values(Binary_transfer.query_raw(self.io,"TRCB? "+indices))
+            if len(values)!=count:
+                raise ValueError(str(len(values))+" points received instead of "+str(count))
+            return values
+        def ascii():
+            #each value is followed by a comma
+            return np.array([float(value) for value in self.io.query("TRCA? "+indices).split(',') if value.strip()!=''])
+        return Binary_transfer.query_with_fallback(self,binary,ascii)
@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
-import visa
+from .. import Visa_pool
 import time
 import numpy as np
 
 class Connect_Instrument():
     def __init__(self,VISA_address='USB0::0x0699::0x03A6::c019476::0', factory_settings=True):
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         self.my_instr_name='Tektronix_TDS2024C'
         if factory_settings:        
             #start from a known state (there are so many options to check otherwise)
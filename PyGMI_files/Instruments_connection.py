@@ -1,6 +1,11 @@
-from PyQt4.QtGui import QWidget,QApplication,QFileDialog,QTableWidgetItem
+from PyQt4.QtGui import QWidget,QApplication,QFileDialog,QTableWidgetItem,QCheckBox
+from PyQt4.QtCore import QTimer
 import Instruments_connection_Ui
-import os,re,visa
+import os,re
+import Visa_pool
+import Simulated_instruments
+import Instruments_discovery
+import Instruments_initialization
 import Instruments
 import Instruments_panels
 
@@ -39,8 +44,31 @@ class Instruments_connection(QWidget):
         self.setWindowTitle(title)
         self.parent=parent
         self.connected_instr={}
+        #VISA addresses of the instruments initialized, whose sessions are held by their drivers
+        self.connected_addresses=[]
+        #probe the resources in the background, one thread per bus
+        #(set to False to probe them one after the other, freezing the interface meanwhile)
+        self.async_discovery=True
+        self.discovery=None
+        self.discovery_timer=QTimer()
+        self.discovery_timer.timeout.connect(self.show_discovered_instr)
+        #the instruments are initialized in the background, one thread per bus,
+        #and given up after init_timeout seconds
+        self.init_timeout=Instruments_initialization.INIT_TIMEOUT
+        self.init_scheduler=None
+        self.init_timer=QTimer()
+        self.init_timer.timeout.connect(self.check_init_progress)
+        #list the simulated instruments (addresses SIM::...) with the VISA resources
+        self.simulated_box=QCheckBox("List simulated instruments",self)
+        self.simulated_box.setChecked(Simulated_instruments.listed)
+        self.simulated_box.toggled.connect(self.list_simulated_instruments)
+        self.ui.gridLayout.addWidget(self.simulated_box,2,1,1,1)
         self.load_Instr_drivers_list()
                 
+    def list_simulated_instruments(self,state):
+        Simulated_instruments.listed=state
+        self.refresh_instr_list()
+
     def set_up_instr_access_lock(self,lock):
         self.reserved_access_to_instr=lock
         
@@ -66,50 +94,115 @@ class Instruments_connection(QWidget):
         return ccbb
         
     def init_instr(self):
+        if self.init_scheduler is not None and not(self.init_scheduler.is_done()):
+            print "The instruments are already being initialized"
+            return
         self.saveInstrconf("./Configuration/Instruments/CurrentInstruments.cfg")
         self.connected_instr={}
         f=self.ui
         self.shortcut_var=[]
+        #the sessions of the previous drivers are given back to the pool,
+        #the new drivers at the same addresses get them back without reopening them
+        for address in self.connected_addresses:
+            Visa_pool.release(address)
+        self.connected_addresses=[]
         
         self.parent.ui.instr_mdi.closeAllSubWindows()
-        with self.reserved_access_to_instr:
-            for instr in self.list_of_checked_instruments():
-                cbb=eval("f."+instr)#get the pointer to the combobox
-                add=eval("f."+instr.replace("instrtype","visa_address")+".text()")#get the visa address
-                instr_type=cbb.currentText()
-                varname=instr.replace("_instrtype","")#instr_instrtype_1 -> instr_1 / magnet_Z_instrtype -> magnet_Z
-                self.shortcut_var.append(varname)
-                #TODO: use less exec and give a dictionnary of connected instruments to be passed to the measurement programs
-                #the macro mechanism will need to be updated too, as instruments won't reside in "main" anymore
-                #self.connected_instr[varname]=eval("self.Instruments."+instr_type+".Connect_Instrument('"+add+"'")
-                #self.connected_instr[varname].initialize()
-                exec("self.parent."+varname+"=Instruments."+instr_type+".Connect_Instrument('"+add+"')")
-                exec("self.parent."+varname+".initialize()")
+        tasks=[]
+        for instr in self.list_of_checked_instruments():
+            cbb=eval("f."+instr)#get the pointer to the combobox
+            add=eval("f."+instr.replace("instrtype","visa_address")+".text()")#get the visa address
+            instr_type=str(cbb.currentText())
+            varname=instr.replace("_instrtype","")#instr_instrtype_1 -> instr_1 / magnet_Z_instrtype -> magnet_Z
+            self.shortcut_var.append(varname)
+            self.connected_addresses.append(str(add))
+            #TODO: give the dictionnary of connected instruments to the measurement programs
+            #the macro mechanism will need to be updated too, as instruments won't reside in "main" anymore
+            tasks.append(Instruments_initialization.Init_task(varname,instr_type,str(add),getattr(Instruments,instr_type).Connect_Instrument))
+        #the bus of each instrument is reserved during its initialization, as a
+        #measurements program may be using the other instruments of that bus
+        self.init_scheduler=Instruments_initialization.Init_scheduler(tasks,
+                                                                      lock=self.reserved_access_to_instr,
+                                                                      exclusive=self.parent.measurements_thread.isAlive(),
+                                                                      timeout=self.init_timeout)
+        self.init_scheduler.start()
+        self.init_timer.start(100)
+
+    def check_init_progress(self):
+        """called periodically by a timer during the initialization of the instruments:
+        the panel of each instrument is opened as soon as it is ready"""
+        self.init_scheduler.check_timeouts()
+        for task in self.init_scheduler.updates():
+            if task.state=='ready':
+                print task.name+" ("+task.instr_type+") ready in %.1f s" % task.duration
+                setattr(self.parent,task.name,task.instr)
+                self.connected_instr[task.name]=task.instr
                 #if there is a panel for that type of instrument, open it in the mdi area
-                if instr_type in Instruments_panels.__all__:
-                    #print "creating new instrument panel"
-                    sentence="newpanel=Instruments_panels."+instr_type+".Panel(self,instr=self.parent."+varname+",lock=self.reserved_access_to_instr,title='"+varname+" - "+instr_type+"')"
-                    #print sentence
-                    exec(sentence)
-                    self.parent.ui.instr_mdi.addSubWindow(newpanel) 
+                if task.instr_type in Instruments_panels.__all__:
+                    newpanel=getattr(Instruments_panels,task.instr_type).Panel(self,instr=task.instr,lock=self.reserved_access_to_instr.bus(task.instr),title=task.name+" - "+task.instr_type)
+                    self.parent.ui.instr_mdi.addSubWindow(newpanel).show()
+            elif task.state=='failed':
+                print task.name+" ("+task.instr_type+") at "+task.address+" could not be initialized:"
+                print task.error
+            else:
+                print task.name+" ("+task.instr_type+") at "+task.address+" did not finish its initialization within %d s" % self.init_timeout
+        self.parent.statusBar().showMessage("Instruments initialization: "+self.init_scheduler.report())
+        if self.init_scheduler.is_done():
+            self.init_timer.stop()
                     
                                                            
     def refresh_instr_list(self):
+        if self.async_discovery:
+            self.start_discovery()
+            return
         with self.reserved_access_to_instr:
-            l=visa.ResourceManager().list_resources()
+            l=Visa_pool.list_resources()
         self.ui.instr_table.setRowCount(len(l))
         for i in range(len(l)):
             if not('ASRL' in l[i] or 'COM' in l[i]):#COM ports don't respond to visa *IDN?, which raises an error, so don't ask them
                 with self.reserved_access_to_instr:
                     try:
-                        a=visa.ResourceManager().open_resource(l[i])
-                        a.timeout=1500
-                        self.ui.instr_table.setItem(i,0,QTableWidgetItem(a.query('*IDN?')))
-                        a.timeout=5000
+                        with Visa_pool.session(l[i]) as a:
+                            #the session may be shared with a driver, restore its timeout afterwards
+                            timeout=a.timeout
+                            a.timeout=1500
+                            try:
+                                self.ui.instr_table.setItem(i,0,QTableWidgetItem(a.query('*IDN?')))
+                            finally:
+                                a.timeout=timeout
                     except:
                         self.ui.instr_table.setItem(i,0,QTableWidgetItem('Instruments did not respond to *IDN?'))
             self.ui.instr_table.setItem(i,1,QTableWidgetItem(l[i]))
 
+    def start_discovery(self):
+        """list the resources and start probing them in the background,
+        the table is filled as the answers arrive"""
+        if self.discovery is not None and not(self.discovery.is_done()):
+            #a discovery is already running
+            return
+        with self.reserved_access_to_instr:
+            l=Visa_pool.list_resources()
+        self.ui.instr_table.setRowCount(len(l))
+        self.discovery_rows={}
+        to_probe=[]
+        for i in range(len(l)):
+            self.ui.instr_table.setItem(i,1,QTableWidgetItem(l[i]))
+            if not('ASRL' in l[i] or 'COM' in l[i]):#COM ports don't respond to visa *IDN?, which raises an error, so don't ask them
+                self.ui.instr_table.setItem(i,0,QTableWidgetItem('Waiting for *IDN? answer...'))
+                self.discovery_rows[l[i]]=i
+                to_probe.append(l[i])
+        self.discovery=Instruments_discovery.Discovery(to_probe,lock=self.reserved_access_to_instr,busy_addresses=self.connected_addresses)
+        self.discovery.start()
+        self.discovery_timer.start(100)
+
+    def show_discovered_instr(self):
+        """called periodically by a timer to show the answers received"""
+        done=self.discovery.is_done()
+        for address,idn in self.discovery.answers():
+            self.ui.instr_table.setItem(self.discovery_rows[address],0,QTableWidgetItem(idn))
+        if done:
+            self.discovery_timer.stop()
+
     def saveInstrconf(self,fileName=None):
         if fileName==None:
             #the static method calls the native file system
@@ -170,24 +263,24 @@ class Instruments_connection(QWidget):
 
     def write2inst(self):
         address = self.ui.testinst.text()
-        io = visa.ResourceManager().open_resource(address)
         command = self.ui.testcommand.text()
-        with self.reserved_access_to_instr:
-            io.write(command)
+        with self.reserved_access_to_instr.bus(str(address)):
+            with Visa_pool.session(address) as io:
+                io.write(command)
         
     def ask2inst(self):
         address = self.ui.testinst.text()
-        io = visa.ResourceManager().open_resource(address)
         command = self.ui.testcommand.text()
-        with self.reserved_access_to_instr:
-            answer = io.query(command)
+        with self.reserved_access_to_instr.bus(str(address)):
+            with Visa_pool.session(address) as io:
+                answer = io.query(command)
         self.ui.testanswer.setPlainText(answer)
 
     def readinst(self):
         address = self.ui.testinst.text()
-        io = visa.ResourceManager().open_resource(address)
-        with self.reserved_access_to_instr:
-            answer = io.read_raw()
+        with self.reserved_access_to_instr.bus(str(address)):
+            with Visa_pool.session(address) as io:
+                answer = io.read_raw()
         self.ui.testanswer.setPlainText(answer)
         
 
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#Asynchronous discovery of the instruments connected to the computer
+#Each VISA resource is asked for its identification (*IDN?). Resources on
+#different buses (GPIB boards, network or USB instruments...) are probed at the
+#same time, one thread per bus, while the resources of a same bus are probed
+#one after the other. The answers are put in a queue as they arrive, so that
+#the user interface can show them without waiting for the slowest instrument,
+#and are kept in a cache for IDN_TTL seconds.
+import time
+import threading
+import Queue
+import Visa_pool
+
+#time in seconds during which an identification stays valid in the cache
+IDN_TTL=300
+#answer shown for the resources that did not answer
+NO_ANSWER='Instruments did not respond to *IDN?'
+
+class Idn_cache():
+    def __init__(self,ttl=IDN_TTL):
+        self.ttl=ttl
+        self.idn={}
+        self.lock=threading.Lock()
+
+    def get(self,address):
+        """identification of the instrument at that address, None if unknown or too old"""
+        with self.lock:
+            if address in self.idn:
+                idn,date=self.idn[address]
+                if time.time()-date<self.ttl:
+                    return idn
+                del self.idn[address]
+        return None
+
+    def put(self,address,idn):
+        with self.lock:
+            self.idn[address]=(idn,time.time())
+
+    def clear(self):
+        with self.lock:
+            self.idn={}
+
+#the cache shared by the whole program
+idn_cache=Idn_cache()
+
+class Discovery():
+    def __init__(self,resources,lock=None,busy_addresses=[],timeout=1500,cache=idn_cache):
+        """resources: list of VISA addresses to probe
+        lock: lock protecting the access to the instruments. With per-bus locks
+        (Bus_locks.Bus_lock_manager) the bus of each resource is reserved while
+        it is probed, otherwise the lock is only taken for the instruments
+        already in use, whose addresses are in busy_addresses
+        timeout: in milliseconds, for each *IDN? request"""
+        self.lock=lock
+        self.busy_addresses=[str(address) for address in busy_addresses]
+        self.timeout=timeout
+        self.cache=cache
+        #(address,identification) as they arrive
+        self.results=Queue.Queue()
+        #the resources, grouped by bus
+        self.buses={}
+        for address in resources:
+            self.buses.setdefault(Visa_pool.bus_key(address),[]).append(address)
+        self.workers=[]
+
+    def start(self):
+        for bus,addresses in self.buses.items():
+            worker=threading.Thread(target=self.probe_bus,args=(addresses,),name='discovery '+bus)
+            worker.daemon=True
+            self.workers.append(worker)
+            worker.start()
+
+    def is_done(self):
+        return not([worker for worker in self.workers if worker.isAlive()]) and self.results.empty()
+
+    def answers(self):
+        """the (address,identification) received since the last call"""
+        answers=[]
+        while True:
+            try:
+                answers.append(self.results.get(block=False))
+            except Queue.Empty:
+                return answers
+
+    def probe_bus(self,addresses):
+        for address in addresses:
+            idn=self.cache.get(address)
+            if idn is None:
+                idn=self.probe(address)
+                if idn!=NO_ANSWER:
+                    self.cache.put(address,idn)
+            self.results.put((address,idn))
+
+    def probe(self,address):
+        try:
+            if hasattr(self.lock,'bus'):
+                with self.lock.bus(str(address)):
+                    return self.query_idn(address)
+            if self.lock is not None and str(address) in self.busy_addresses:
+                #the instrument is used by a driver, wait for it to be free
+                with self.lock:
+                    return self.query_idn(address)
+            return self.query_idn(address)
+        except Exception:
+            return NO_ANSWER
+
+    def query_idn(self,address):
+        with Visa_pool.session(address) as io:
+            #the session may be shared with a driver, restore its timeout afterwards
+            timeout=io.timeout
+            io.timeout=self.timeout
+            try:
+                return io.query('*IDN?').strip()
+            finally:
+                io.timeout=timeout
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#Initialization of the instruments checked in the Instruments connector
+#Connecting to an instrument and initializing it can take seconds (some
+#drivers reset the instrument or wait for it to settle). The instruments on
+#different buses are initialized at the same time, one thread per bus, the
+#instruments of a same bus one after the other. The user interface polls the
+#scheduler to open the panel of each instrument as soon as it is ready, to
+#report the progress, and to give up on the instruments that take too long.
+import time
+import threading
+import traceback
+import Queue
+import Visa_pool
+
+#time in seconds after which an instrument that is still initializing is given up
+INIT_TIMEOUT=30
+
+class Init_task():
+    def __init__(self,name,instr_type,address,driver):
+        """name: name of the instrument in the main window, e.g. 'instr_1'
+        driver: class to build the instrument, e.g. Instruments.SR830.Connect_Instrument"""
+        self.name=name
+        self.instr_type=instr_type
+        self.address=address
+        self.driver=driver
+        #'waiting','initializing','ready','failed' or 'timed out'
+        self.state='waiting'
+        self.instr=None
+        self.error=None
+        self.started=None
+        self.duration=None
+
+class Init_scheduler():
+    def __init__(self,tasks,lock=None,exclusive=False,timeout=INIT_TIMEOUT):
+        """tasks: list of Init_task
+        lock: with per-bus locks (Bus_locks.Bus_lock_manager), the bus of each
+        instrument is reserved during its initialization
+        exclusive: otherwise, initialize the instruments one at a time while holding
+        'lock' (e.g. while a measurements program is using the instruments)"""
+        self.tasks=tasks
+        self.lock=lock
+        self.exclusive=exclusive
+        self.timeout=timeout
+        #tasks whose state changed to 'ready','failed' or 'timed out', in that order
+        self.finished=Queue.Queue()
+        self.state_lock=threading.Lock()
+        self.workers=[]
+
+    def start(self):
+        if self.exclusive and not(hasattr(self.lock,'bus')):
+            buses={'all':self.tasks}
+        else:
+            buses={}
+            for task in self.tasks:
+                buses.setdefault(Visa_pool.bus_key(task.address),[]).append(task)
+        for bus,tasks in buses.items():
+            worker=threading.Thread(target=self.run_bus,args=(tasks,),name='initialization '+bus)
+            worker.daemon=True
+            self.workers.append(worker)
+            worker.start()
+
+    def run_bus(self,tasks):
+        for task in tasks:
+            if hasattr(self.lock,'bus'):
+                with self.lock.bus(task.address):
+                    self.run_task(task)
+            elif self.exclusive and self.lock is not None:
+                with self.lock:
+                    self.run_task(task)
+            else:
+                self.run_task(task)
+
+    def run_task(self,task):
+        with self.state_lock:
+            task.state='initializing'
+            task.started=time.time()
+        instr=None
+        error=None
+        try:
+            instr=task.driver(task.address)
+            instr.initialize()
+        except Exception:
+            error=traceback.format_exc()
+        with self.state_lock:
+            if task.state=='timed out':
+                #the user interface gave up on it already
+                print task.name+" answered after its initialization timed out, it is ignored"
+                return
+            task.duration=time.time()-task.started
+            task.instr=instr
+            task.error=error
+            task.state='ready' if error is None else 'failed'
+        self.finished.put(task)
+
+    def check_timeouts(self):
+        """give up on the instruments initializing for more than 'timeout' seconds"""
+        now=time.time()
+        with self.state_lock:
+            for task in self.tasks:
+                if task.state=='initializing' and now-task.started>self.timeout:
+                    task.state='timed out'
+                    task.duration=now-task.started
+                    self.finished.put(task)
+
+    def updates(self):
+        """the tasks finished since the last call"""
+        tasks=[]
+        while True:
+            try:
+                tasks.append(self.finished.get(block=False))
+            except Queue.Empty:
+                return tasks
+
+    def is_done(self):
+        with self.state_lock:
+            return not([task for task in self.tasks if task.state in ['waiting','initializing']])
+
+    def report(self):
+        """short summary of the progress, e.g. '2/4 ready, 1 initializing, 1 failed'"""
+        with self.state_lock:
+            states=[task.state for task in self.tasks]
+        report=str(states.count('ready'))+"/"+str(len(states))+" ready"
+        for state in ['initializing','waiting','failed','timed out']:
+            if states.count(state):
+                report+=", "+str(states.count(state))+" "+state
+        return report
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from PyQt4.QtGui import QWidget
+from PyQt4.QtGui import QWidget,QLabel,QDoubleSpinBox
 import AAA_Test_instruments_Ui
 
 class Panel(QWidget):
@@ -17,5 +17,20 @@ class Panel(QWidget):
         self.setWindowTitle(title)
         self.reserved_access_to_instr=lock
         self.temp_controller=instr
-    
-    
+        #settings of all the simulated instruments (VISA addresses SIM::...)
+        settings=self.temp_controller.query_simulated_instruments_settings()
+        self.simulation_boxes={}
+        for column,(name,label,scale,maximum) in enumerate([('latency','Sim. latency (ms)',1e-3,10000),
+                                                            ('noise','Sim. noise (ppm)',1e-6,1e6),
+                                                            ('error_rate','Sim. error rate (%)',1e-2,100)]):
+            box=QDoubleSpinBox(self)
+            box.setDecimals(3)
+            box.setMaximum(maximum)
+            box.setValue(settings[name]/scale)
+            box.valueChanged.connect(lambda value,name=name,scale=scale:self.configure_simulation(name,value*scale))
+            self.ui.gridLayout.addWidget(QLabel(label,self),7,column,1,1)
+            self.ui.gridLayout.addWidget(box,8,column,1,1)
+            self.simulation_boxes[name]=box
+
+    def configure_simulation(self,name,value):
+        self.temp_controller.configure_simulated_instruments(**{name:value})
@@ -3,6 +3,7 @@ from PyQt4.QtGui import QWidget,QApplication
 from PyQt4.QtCore import QTimer
 #import the interface design generated by Qt designer
 import Keithley6221_Ui
+from .. import Read_cache
 
 
 class Panel(QWidget):
@@ -20,6 +21,8 @@ class Panel(QWidget):
         self.setWindowTitle(title)
         self.reserved_access_to_instr=lock
         self.instr=instr
+        #refresh scheduler of the main window (parent is the Instruments connector)
+        self.refresh_scheduler=getattr(getattr(parent,'parent',None),'refresh_scheduler',None)
         self.monitor_timer = QTimer()
         #The timer would not wait for the completion of the task otherwise
         self.monitor_timer.setSingleShot(True)
@@ -32,15 +35,24 @@ class Panel(QWidget):
     def monitor(self,state=1):
         if state!=1:
             self.monitor_timer.stop()
+            if self.refresh_scheduler is not None:self.refresh_scheduler.unsubscribe(self.refresh_display)
+        elif self.refresh_scheduler is not None:
+            self.refresh_display()
+            self.refresh_scheduler.subscribe(self.refresh_display,lambda:self.ui.refresh_rate.value()*1000,self,unicode(self.windowTitle()))
         elif state and not(self.monitor_timer.isActive()):
-            with self.reserved_access_to_instr:
-                I=self.instr.query_current_source_amplitude()
-                Vcomp=self.instr.query_voltage_compliance()
-                outstate=self.instr.query_output_ON()
-            self.ui.I_disp.setText(str(I*1e6)+u' μA')
-            self.ui.V_disp.setText(str(Vcomp)+' V')
-            self.ui.outputON.setChecked(outstate)
+            self.refresh_display()
             self.monitor_timer.start(self.ui.refresh_rate.value()*1000)
+
+    def refresh_display(self):
+        #values read during the last refresh period (e.g. by the measurements program) are not read again
+        age=self.ui.refresh_rate.value()
+        lock=self.reserved_access_to_instr
+        I=Read_cache.read(self.instr,'query_current_source_amplitude',max_age=age,lock=lock)
+        Vcomp=Read_cache.read(self.instr,'query_voltage_compliance',max_age=age,lock=lock)
+        outstate=Read_cache.read(self.instr,'query_output_ON',max_age=age,lock=lock)
+        self.ui.I_disp.setText(str(I*1e6)+u' μA')
+        self.ui.V_disp.setText(str(Vcomp)+' V')
+        self.ui.outputON.setChecked(outstate)
         
     
     def update_timer_timeout(self,secs):
@@ -2,6 +2,7 @@ from PyQt4.QtGui import QWidget,QApplication
 from PyQt4.QtCore import QTimer
 #import the interface design generated by Qt designer
 import Lakeshore340_Ui
+from .. import Read_cache
 
 
 class Panel(QWidget):
@@ -19,6 +20,8 @@ class Panel(QWidget):
         self.setWindowTitle(title)
         self.reserved_access_to_instr=lock
         self.temp_controller=instr
+        #refresh scheduler of the main window (parent is the Instruments connector)
+        self.refresh_scheduler=getattr(getattr(parent,'parent',None),'refresh_scheduler',None)
         
         self.check_T_timer = QTimer()
         self.check_T_timer.setSingleShot(True)#The timer would not wait for the completion of the task otherwise
@@ -27,16 +30,21 @@ class Panel(QWidget):
         if self.ui.checkTbox.isChecked():self.autocheckT()
     
     def checkT(self):
-        with self.reserved_access_to_instr:
-            T=self.temp_controller.query_temp(self.ui.temp_controller_channel.currentText())
+        #a temperature read during the last refresh period (e.g. by the measurements program) is not read again
+        T=Read_cache.read(self.temp_controller,'query_temp',(self.ui.temp_controller_channel.currentText(),),
+                          max_age=self.ui.refresh_rate.value(),lock=self.reserved_access_to_instr)
         self.ui.T_display.setText(str(T)+" K")
     
     def autocheckT(self,state=1):
         if state:
             self.checkT()
-            self.check_T_timer.start(self.ui.refresh_rate.value()*1000)#The value must be converted to milliseconds
+            if self.refresh_scheduler is not None:
+                self.refresh_scheduler.subscribe(self.checkT,lambda:self.ui.refresh_rate.value()*1000,self,unicode(self.windowTitle()))
+            else:
+                self.check_T_timer.start(self.ui.refresh_rate.value()*1000)#The value must be converted to milliseconds
         else:
             self.check_T_timer.stop()
+            if self.refresh_scheduler is not None:self.refresh_scheduler.unsubscribe(self.checkT)
     
     def update_timer_timeout(self,secs):
        self.check_T_timer.setInterval(int(secs*1000))
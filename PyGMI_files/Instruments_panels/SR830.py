@@ -2,6 +2,7 @@ from PyQt4.QtGui import QWidget,QApplication
 from PyQt4.QtCore import QTimer
 #import the interface design generated by Qt designer
 import SR830_Ui
+from .. import Read_cache
 
 
 class Panel(QWidget):
@@ -19,6 +20,8 @@ class Panel(QWidget):
         self.setWindowTitle(title)
         self.reserved_access_to_instr=lock
         self.instr=instr
+        #refresh scheduler of the main window (parent is the Instruments connector)
+        self.refresh_scheduler=getattr(getattr(parent,'parent',None),'refresh_scheduler',None)
         self.monitor_timer = QTimer()
         self.channel=self.ui.channel.currentIndex()
         #The timer would not wait for the completion of the task otherwise
@@ -48,18 +51,27 @@ class Panel(QWidget):
     def monitor(self,state=1):
         if state!=1:
             self.monitor_timer.stop()
+            if self.refresh_scheduler is not None:self.refresh_scheduler.unsubscribe(self.refresh_display)
             self.firsttime=0
+        elif self.refresh_scheduler is not None:
+            self.refresh_display()
+            self.refresh_scheduler.subscribe(self.refresh_display,lambda:self.ui.refresh_rate.value()*1000,self,unicode(self.windowTitle()))
         elif state and not(self.monitor_timer.isActive()):
-            self.firsttime+=1
-            if self.firsttime==1:self.update_boxes()
-            with self.reserved_access_to_instr:
-                x,y=self.instr.query_ch1_ch2(self.ch1,self.ch2)
-                self.ui.x_disp.setText(str(x))
-                self.ui.y_disp.setText(str(y))
-                self.ui.f_disp.setText(str(self.instr.query_frequency())+' Hz')
-                self.ui.a_disp.setText(str(self.instr.query_amplitude())+' V')
-                self.ui.ph_disp.setText(str(self.instr.query_phase())+' deg')
+            self.refresh_display()
             self.monitor_timer.start(self.ui.refresh_rate.value()*1000)
+
+    def refresh_display(self):
+        self.firsttime+=1
+        if self.firsttime==1:self.update_boxes()
+        #values read during the last refresh period (e.g. by the measurements program) are not read again
+        age=self.ui.refresh_rate.value()
+        lock=self.reserved_access_to_instr
+        x,y=Read_cache.read(self.instr,'query_ch1_ch2',(self.ch1,self.ch2),max_age=age,lock=lock)
+        self.ui.x_disp.setText(str(x))
+        self.ui.y_disp.setText(str(y))
+        self.ui.f_disp.setText(str(Read_cache.read(self.instr,'query_frequency',max_age=age,lock=lock))+' Hz')
+        self.ui.a_disp.setText(str(Read_cache.read(self.instr,'query_amplitude',max_age=age,lock=lock))+' V')
+        self.ui.ph_disp.setText(str(Read_cache.read(self.instr,'query_phase',max_age=age,lock=lock))+' deg')
         
     
     def update_timer_timeout(self,secs):
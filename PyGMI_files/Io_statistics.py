@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#Statistics of the communications with the instruments
+#The VISA sessions handed to the drivers by Visa_pool are wrapped in an
+#Instrumented_io, which behaves exactly as the session but records, for each
+#instrument and each command, the number of calls, the distribution of their
+#durations, the timeouts, the errors and the number of bytes exchanged.
+#The time spent waiting for the locks reserving the instruments is recorded
+#too. This shows where the time of a measurements program goes.
+import csv
+import math
+import time
+import threading
+
+class Latency_histogram():
+    """durations in seconds, in logarithmic bins (BINS_PER_DECADE per decade from 10 us)"""
+    MIN_TIME=1e-5
+    BINS_PER_DECADE=10
+    NB_BINS=70
+    def __init__(self):
+        self.bins=[0]*self.NB_BINS
+        self.count=0
+        self.total=0
+        self.max=0
+
+    def add(self,duration):
+        if duration>self.MIN_TIME:
+            index=min(int(math.log10(duration/self.MIN_TIME)*self.BINS_PER_DECADE),self.NB_BINS-1)
+        else:
+            index=0
+        self.bins[index]+=1
+        self.count+=1
+        self.total+=duration
+        self.max=max(self.max,duration)
+
+    def mean(self):
+        return self.total/self.count if self.count else 0
+
+    def percentile(self,p):
+        """upper edge of the bin containing the p-th percentile (p in %)"""
+        if self.count==0:
+            return 0
+        threshold=self.count*p/100.0
+        cumulated=0
+        for index,nb in enumerate(self.bins):
+            cumulated+=nb
+            if cumulated>=threshold:
+                return min(self.MIN_TIME*10**((index+1.0)/self.BINS_PER_DECADE),self.max)
+        return self.max
+
+class Command_statistics():
+    def __init__(self):
+        self.latency=Latency_histogram()
+        self.timeouts=0
+        self.errors=0
+        self.bytes_out=0
+        self.bytes_in=0
+
+class Io_statistics():
+    COLUMNS=["Instrument","Command","Count","Mean (ms)","Median (ms)","90% (ms)","99% (ms)","Max (ms)","Timeouts","Errors","Bytes sent","Bytes received"]
+    def __init__(self):
+        self.enabled=True
+        self.lock=threading.Lock()
+        #(instrument,command) -> Command_statistics
+        self.commands={}
+        #name of the lock (bus) -> Latency_histogram of the waiting times
+        self.lock_waits={}
+
+    def record(self,instrument,command,duration,bytes_out=0,bytes_in=0,timeout=False,error=False):
+        with self.lock:
+            stats=self.commands.get((instrument,command))
+            if stats is None:
+                stats=self.commands[(instrument,command)]=Command_statistics()
+            stats.latency.add(duration)
+            stats.bytes_out+=bytes_out
+            stats.bytes_in+=bytes_in
+            if timeout:
+                stats.timeouts+=1
+            elif error:
+                stats.errors+=1
+
+    def record_lock_wait(self,name,duration):
+        with self.lock:
+            if name not in self.lock_waits:
+                self.lock_waits[name]=Latency_histogram()
+            self.lock_waits[name].add(duration)
+
+    def reset(self):
+        with self.lock:
+            self.commands={}
+            self.lock_waits={}
+
+    def rows(self):
+        """one row per instrument and command, then one per lock, in the order of COLUMNS"""
+        rows=[]
+        with self.lock:
+            for (instrument,command),stats in sorted(self.commands.items()):
+                rows.append([instrument,command]+self.latency_columns(stats.latency)+[stats.timeouts,stats.errors,stats.bytes_out,stats.bytes_in])
+            for name,latency in sorted(self.lock_waits.items()):
+                rows.append(["lock wait",name]+self.latency_columns(latency)+["","","",""])
+        return rows
+
+    def latency_columns(self,latency):
+        return [latency.count]+[round(value*1e3,3) for value in [latency.mean(),latency.percentile(50),latency.percentile(90),latency.percentile(99),latency.max]]
+
+    def export_csv(self,filename):
+        with open(filename,'wb') as f:
+            writer=csv.writer(f)
+            writer.writerow(self.COLUMNS)
+            writer.writerows(self.rows())
+
+#the statistics of the whole program
+statistics=Io_statistics()
+
+def command_name(message):
+    """command part of a message, without its parameters, e.g. ':SOUR:CURR 1e-6' -> ':SOUR:CURR'"""
+    message=message.strip()
+    if message=='':
+        return '(empty)'
+    return message.split(None,1)[0]
+
+def is_timeout(error):
+    return 'TMO' in str(error) or 'imeout' in error.__class__.__name__
+
+class Instrumented_io():
+    """transparent wrapper of a VISA session recording the statistics of its calls"""
+    def __init__(self,io,name=None,statistics=statistics):
+        #the attributes of the wrapper are set this way, any other attribute
+        #(e.g. io.timeout=5000) is set on the session itself
+        self.__dict__['io']=io
+        self.__dict__['name']=str(name if name is not None else getattr(io,'resource_name','instrument'))
+        self.__dict__['statistics']=statistics
+        #the replies read with read() are counted with the last command written
+        self.__dict__['last_command']='(read)'
+
+    def __getattr__(self,attribute):
+        return getattr(self.io,attribute)
+
+    def __setattr__(self,attribute,value):
+        setattr(self.io,attribute,value)
+
+    def call(self,command,function,args,kwargs,bytes_out=0):
+        if not(self.statistics.enabled):
+            return function(*args,**kwargs)
+        start=time.time()
+        try:
+            answer=function(*args,**kwargs)
+        except Exception as e:
+            self.statistics.record(self.name,command,time.time()-start,bytes_out,0,timeout=is_timeout(e),error=True)
+            raise
+        bytes_in=len(answer) if isinstance(answer,basestring) else 0
+        self.statistics.record(self.name,command,time.time()-start,bytes_out,bytes_in)
+        return answer
+
+    def write(self,message,*args,**kwargs):
+        self.__dict__['last_command']=command_name(message)
+        return self.call(self.last_command,self.io.write,(message,)+args,kwargs,len(message))
+
+    def write_raw(self,message,*args,**kwargs):
+        self.__dict__['last_command']=command_name(message)
+        return self.call(self.last_command,self.io.write_raw,(message,)+args,kwargs,len(message))
+
+    def query(self,message,*args,**kwargs):
+        return self.call(command_name(message),self.io.query,(message,)+args,kwargs,len(message))
+
+    def ask(self,message,*args,**kwargs):
+        return self.call(command_name(message),self.io.ask,(message,)+args,kwargs,len(message))
+
+    def query_ascii_values(self,message,*args,**kwargs):
+        return self.call(command_name(message),self.io.query_ascii_values,(message,)+args,kwargs,len(message))
+
+    def query_binary_values(self,message,*args,**kwargs):
+        return self.call(command_name(message),self.io.query_binary_values,(message,)+args,kwargs,len(message))
+
+    def read(self,*args,**kwargs):
+        return self.call(self.last_command+' (read)',self.io.read,args,kwargs)
+
+    def read_raw(self,*args,**kwargs):
+        return self.call(self.last_command+' (read)',self.io.read_raw,args,kwargs)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#Window showing live the statistics of the communications with the instruments
+#(see Io_statistics.py) and the cost of the periodic refreshes of the user
+#interface (see Refresh_scheduler.py), which can be exported as CSV files.
+from PyQt4.QtGui import QWidget,QApplication,QTableWidget,QTableWidgetItem,QPushButton,QGridLayout,QFileDialog
+from PyQt4.QtCore import QTimer
+from Io_statistics import statistics
+
+REFRESH_COLUMNS=["Refresh","Calls","Skipped (hidden)","Mean (ms)","Max (ms)"]
+
+class Io_statistics_panel(QWidget):
+    def __init__(self,parent=None,title='I/O statistics'):
+        QWidget.__init__(self)
+        self.setWindowTitle(title)
+        self.parent=parent
+        self.resize(900,500)
+        layout=QGridLayout(self)
+        self.table=QTableWidget(0,len(statistics.COLUMNS),self)
+        self.table.setHorizontalHeaderLabels(statistics.COLUMNS)
+        layout.addWidget(self.table,0,0,1,3)
+        self.refresh_table=QTableWidget(0,len(REFRESH_COLUMNS),self)
+        self.refresh_table.setHorizontalHeaderLabels(REFRESH_COLUMNS)
+        self.refresh_table.setMaximumHeight(150)
+        layout.addWidget(self.refresh_table,1,0,1,3)
+        self.export_button=QPushButton("Export CSV",self)
+        self.export_button.clicked.connect(lambda:self.export_csv())
+        layout.addWidget(self.export_button,2,0,1,1)
+        self.reset_button=QPushButton("Reset",self)
+        self.reset_button.clicked.connect(self.reset)
+        layout.addWidget(self.reset_button,2,1,1,1)
+        #refreshed every second with the other windows, or by its own timer
+        self.scheduler=getattr(parent,"refresh_scheduler",None)
+        if self.scheduler is not None:
+            self.scheduler.subscribe(self.update_tables,1000,self,"I/O statistics")
+        else:
+            self.update_timer=QTimer()
+            self.update_timer.timeout.connect(self.update_tables)
+            self.update_timer.start(1000)
+        self.update_tables()
+
+    def closeEvent(self,event):
+        if self.scheduler is not None:
+            self.scheduler.unsubscribe(self.update_tables)
+        QWidget.closeEvent(self,event)
+
+    def fill(self,table,rows):
+        table.setRowCount(len(rows))
+        for i,row in enumerate(rows):
+            for j,value in enumerate(row):
+                table.setItem(i,j,QTableWidgetItem(unicode(value)))
+
+    def update_tables(self):
+        self.fill(self.table,statistics.rows())
+        if self.scheduler is not None:
+            self.fill(self.refresh_table,[[name,calls,skipped,round(mean*1e3,3),round(maximum*1e3,3)] for name,calls,skipped,mean,maximum in self.scheduler.report()])
+
+    def reset(self):
+        statistics.reset()
+        self.update_tables()
+
+    def export_csv(self,fileName=None):
+        if fileName==None:
+            fileName=QFileDialog.getSaveFileName(self,"Export I/O statistics",directory="./measurements data",filter="CSV file (*.csv)")
+        if fileName!="":
+            statistics.export_csv(unicode(fileName))
+
+if __name__ == "__main__":
+    import sys
+    app = QApplication(sys.argv)
+    window = Io_statistics_panel()
+    window.show()
+    sys.exit(app.exec_())
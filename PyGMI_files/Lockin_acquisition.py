@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#Buffered acquisition with a SR830 lock-in amplifier
+#Instead of one SNAP? per point, the SR830 stores its CH1 and CH2 displays in
+#its data buffer at a fixed sample rate (up to 512 Hz), and the new points
+#are read in bulk (binary transfer, see SR830.query_buffer), once per chunk.
+#The buffer holds 16383 points: it is used in single shot mode and, when it
+#is nearly full, emptied and restarted (a gap of a few ms in the data).
+#   acquisition=Lockin_acquisition(reserved_bus_access,instr.instr_8,rate=512.0)
+#   for block in acquisition.chunks(stop_flag):
+#       ...block[:,0] time (s), block[:,1] CH1, block[:,2] CH2
+import time
+import numpy as np
+
+#points that the buffer of the SR830 can store
+BUFFER_SIZE=16383
+#shortest and longest time between two reads of the buffer (s)
+MIN_POLL=0.05
+MAX_POLL=1.0
+
+class Lockin_acquisition():
+    def __init__(self,bus_access,lockin,rate=512.0,chunk_size=256,min_poll=MIN_POLL,max_poll=MAX_POLL):
+        """bus_access: the lock manager reserving the instruments (Bus_locks)
+        lockin: SR830 driver, CH1 and CH2 displays set beforehand (e.g. R and theta)
+        rate: sample rate (Hz), the closest available one is used (see self.rate)
+        chunk_size: number of points read at once"""
+        self.bus_access=bus_access
+        self.lockin=lockin
+        self.requested_rate=rate
+        self.rate=None
+        self.chunk_size=chunk_size
+        self.min_poll=min_poll
+        self.max_poll=max_poll
+        #time (time.time()) of the start of the acquisition, origin of the times of the points
+        self.start_time=None
+
+    def start(self):
+        """clear the buffer and start storing the points"""
+        with self.bus_access.bus(self.lockin):
+            self.lockin.reset_buffer()
+            self.lockin.start_buffer()
+        return time.time()
+
+    def stop(self):
+        with self.bus_access.bus(self.lockin):
+            self.lockin.pause_buffer()
+
+    def chunks(self,stop_flag=None):
+        """generator of the new points as numpy arrays, one row per point:
+        time (s, since the start of the acquisition), CH1, CH2"""
+        with self.bus_access.bus(self.lockin):
+            self.rate=self.lockin.set_sample_rate(self.requested_rate)
+            self.lockin.set_buffer_mode(loop=False)
+        #the buffer is emptied before it fills up, even if a read is late
+        limit=BUFFER_SIZE-int(self.rate*self.max_poll*2)
+        #time between two reads, for chunk_size points
+        wait=min(max(self.chunk_size/self.rate,self.min_poll),self.max_poll)
+        self.start_time=self.start()
+        run_start=self.start_time
+        fetched=0
+        try:
+            while stop_flag is None or not(stop_flag.isSet()):
+                time.sleep(wait)
+                with self.bus_access.bus(self.lockin):
+                    available=self.lockin.query_buffer_points()
+                    restart=available>=limit
+                    if restart:
+                        self.lockin.pause_buffer()
+                        available=self.lockin.query_buffer_points()
+                    if available>fetched:
+                        ch1=self.lockin.query_buffer(1,fetched,available-fetched)
+                        ch2=self.lockin.query_buffer(2,fetched,available-fetched)
+                if available>fetched:
+                    #the time of each point is given by its index and the sample rate
+                    t=run_start-self.start_time+np.arange(fetched,available)/self.rate
+                    yield np.column_stack((t,ch1,ch2))
+                    fetched=available
+                if restart:
+                    run_start=self.start()
+                    fetched=0
+        finally:
+            #also when the consumer stops iterating
+            self.stop()
+
+    def stream(self,data_queue,stop_flag=None,columns=None):
+        """send the points to the data queue as they arrive, one block of rows
+        per chunk. columns: function returning the rows of a chunk, by default
+        time (s), CH1, CH2"""
+        nb=0
+        for block in self.chunks(stop_flag):
+            if columns is not None:
+                block=columns(block)
+            data_queue.put((block,'rows'))
+            nb+=len(block)
+        return nb
@@ -62,11 +62,9 @@ class Macro_editor(QWidget):
         # second called at startup by main program
         self.valid_list_of_commands = self.get_list_of_commands()
 
-        self.macro_timer = QTimer()
-        #Use a single shot timer in between commands
-        #otherwise it may fire again before the task is completed
-        self.macro_timer.setSingleShot(True)
-        self.macro_timer.timeout.connect(self.next_command)
+        #the commands are run by the refresh scheduler of the main window, as single shots
+        #in between commands, otherwise it may fire again before the task is completed
+        self.macro_scheduler = self.main.refresh_scheduler
                        
 
 
@@ -96,6 +94,8 @@ class Macro_editor(QWidget):
             WaitForTPPMSStableCommand(),
             WaitForHPPMSStableCommand(),
             SetSaveFileCommand(),
+            AddDerivedColumnCommand(),
+            ClearDerivedColumnsCommand(),
             StartMeasureCommand(),
             StopMeasureCommand(),
             EmailCommand(),
@@ -138,7 +138,7 @@ class Macro_editor(QWidget):
             self.cur_mac_max=len(self.current_macro)
             #single shot timer
             print "Starting Macro"
-            self.macro_timer.start(0)
+            self.macro_scheduler.call_later(0,self.next_command,'macro')
     
     def next_command(self):
         if self.current_line<self.cur_mac_max:
@@ -157,13 +157,13 @@ class Macro_editor(QWidget):
                     break #break the for loop
             #go to line N+next_move of the current macro, after wait_time milliseconds
             self.current_line+=next_move
-            self.macro_timer.start(wait_time)
+            self.macro_scheduler.call_later(wait_time,self.next_command,'macro')
         else:
             #end of macro reached
             self.stop_macro()
             
     def stop_macro(self):
-        self.macro_timer.stop()
+        self.macro_scheduler.unsubscribe(self.next_command)
         self.macro_isActive=False
         #TODO : signal/slot !!!
         if self.main.measurements_thread.isAlive(): 
@@ -655,6 +655,37 @@ class SetSaveFileCommand():
         self.wait_time=500                                     
                     
         
+class AddDerivedColumnCommand():
+    def __init__(self):
+        #the columns of the data are written between braces, e.g. Add derived column R = {V}/{I}
+        self.regexp_str="Add derived column ([^=]*[^= ]) *= *(.+)"
+        self.label="Add derived column NAME = EXPRESSION"
+        self.regexp_str="^ *"+self.regexp_str+" *$" #so that the same string with heading and trailing whitespaces also matches
+        self.regexp=QRegExp(self.regexp_str)
+    
+    def run(self,main):
+        values=self.regexp.capturedTexts()
+        main.add_derived_column(unicode(values[1]).encode('utf8'),unicode(values[2]).strip().encode('utf8'))
+        #go to next line of macro
+        self.next_move=1
+        self.wait_time=0
+
+
+class ClearDerivedColumnsCommand():
+    def __init__(self):
+        self.regexp_str="Clear derived columns"
+        self.label="Clear derived columns"
+        self.regexp_str="^ *"+self.regexp_str+" *$" #so that the same string with heading and trailing whitespaces also matches
+        self.regexp=QRegExp(self.regexp_str)
+    
+    def run(self,main):
+        #the derived columns are no longer added from the next header on
+        main.derived_columns.clear()
+        #go to next line of macro
+        self.next_move=1
+        self.wait_time=0
+
+
 class StartMeasureCommand():
     def __init__(self):
         #type name_of_program() to start it
@@ -2,12 +2,13 @@
 #Libraries Imports
 #Time measurements
 import time
+import os
 #Multithreading
 import threading
 import Queue
 #User interface
     ##PyQt4
-from PyQt4.QtGui import QMainWindow,QFileDialog
+from PyQt4.QtGui import QMainWindow,QFileDialog,QPushButton,QLabel
 from PyQt4.QtCore import QTimer,SIGNAL
     ##Main user interface
 import GUI_compiled
@@ -16,6 +17,20 @@ from Plot2DDataWidget import Plot2DDataWidget
 from Config_menu import Config_menu
     ##Retriever of all values of the front panel
 from Frontpanel_values import Frontpanel_values
+    ##Columnar storage of the Master dataset
+from Column_store import Column_store
+    ##Savefiles of the measurements data
+import Savefile
+    ##Reloading of previous measurements files
+import Data_loader
+    ##Live derived columns (R=V/I, dR/dT, moving averages...)
+from Derived_columns import Derived_columns
+    ##Locks reserving the access to the instruments, one per bus
+from Bus_locks import Bus_lock_manager
+    ##Statistics of the communications with the instruments
+from Io_statistics_panel import Io_statistics_panel
+    ##Shared timer for the periodic refreshes of the plots, panels and macros
+from Refresh_scheduler import Refresh_scheduler
 #User written Measurements Programs
 import Measurements_programs
 for module in Measurements_programs.__all__:
@@ -32,9 +47,21 @@ class start_GUI(QMainWindow):
         # Now we have to feed the GUI building method of this object (self.ui)
         # with a Qt Mainwindow, but the widgets will actually be built as children
         # of this object (self.ui)
-        self.measdata=[[1,3,2],[3,5,7]]
         self.current_header=["index","prime numbers"]
+        self.measdata=Column_store.from_columns(self.current_header,[[1,3,2],[3,5,7]])
+        #datasets reloaded from previous measurements files, that can be selected in the plot windows
+        self.datasets={}
+        #columns computed live from the data of the measurements programs,
+        #e.g. Derived_columns([("R","{V}/{I}")]), see also the macro command "Add derived column"
+        self.derived_columns=Derived_columns()
         self.ui.setupUi(self)
+        # a single scheduler refreshes the plot windows, the instruments panels
+        # and runs the macro commands, coalesced into one frame every 50 ms
+        self.refresh_scheduler=Refresh_scheduler(frame_interval=50)
+        # the state of the savefile writer is shown in a permanent widget of the status bar,
+        # so that it does not overwrite the other messages (e.g. instruments initialization)
+        self.savefile_status=QLabel()
+        self.statusBar().addPermanentWidget(self.savefile_status)
         # initialize a QTimer for periodic data transfer with the measuring thread
         self.save_data_timer = QTimer()
         self.save_data_timer.setSingleShot(True)
@@ -42,9 +69,19 @@ class start_GUI(QMainWindow):
         # initialize a Queue to retrieve data from the measuring thread
         self.data_queue=Queue.Queue()
         self.measurements_thread_stop_flag=threading.Event()
+        #the savefile writer thread writes all the rows received at once
+        #(set to False to write the rows one by one as they are received)
+        self.drain_mode=True
+        #force the savefile onto the disk every N rows and/or T seconds (0 to disable)
+        self.fsync_rows=0
+        self.fsync_secs=0
+        #compress the binary savefiles (.npz, .h5 or .hdf5 extension in the savefile name)
+        self.savefile_compression=False
         self.measurements_thread=threading.Thread()
-        # initialize a Lock to reserve access to the instruments
-        self.reserved_access_to_instr=threading.Lock()
+        # initialize a Lock to reserve access to the instruments: one lock per bus,
+        # "with self.reserved_access_to_instr:" reserves all of them, as the former single lock,
+        # "with self.reserved_access_to_instr.bus(instr1,instr2):" only the buses of these instruments
+        self.reserved_access_to_instr=Bus_lock_manager()
         #initiate a flag to wait for a parameter to settle
         self.waiting=False
         #give the reference "self" (the main thread) to the Macro Editor
@@ -63,6 +100,17 @@ class start_GUI(QMainWindow):
         self.ui.Plot2D_2.parent=self
         self.ui.Plot2D_3.parent=self
         self.ui.Plot2D_4.parent=self
+        #the fixed plot windows now have access to the refresh scheduler
+        for plot in [self.ui.Plot2D_1,self.ui.Plot2D_2,self.ui.Plot2D_3,self.ui.Plot2D_4]:
+            plot.autoupdate(plot.ui.auto_upd.isChecked())
+        #button to reload a previous measurements file next to the plot windows buttons
+        self.load_data_button=QPushButton("Load data file",self.ui.groupBox_4)
+        self.load_data_button.clicked.connect(lambda:self.load_data_file())
+        self.ui.gridLayout_7.addWidget(self.load_data_button,3,0,1,1)
+        #button to show the statistics of the communications with the instruments
+        self.io_statistics_button=QPushButton("I/O statistics",self.ui.groupBox_4)
+        self.io_statistics_button.clicked.connect(self.create_io_statistics_panel)
+        self.ui.gridLayout_7.addWidget(self.io_statistics_button,3,1,1,1)
         #give the reference "self" (the main thread) to the Instruments connector
         self.ui.instr_IO.parent=self
         self.ui.instr_IO.set_up_instr_access_lock(self.reserved_access_to_instr)
@@ -107,6 +155,27 @@ class start_GUI(QMainWindow):
         self.plotwindows.append(newwindow)
         newwindow.show()
         
+    def create_io_statistics_panel(self):
+        newwindow=Io_statistics_panel(self)
+        #a reference to the window must be kept, otherwise the new window is immediately garbage collected !
+        self.plotwindows.append(newwindow)
+        newwindow.show()
+
+    def load_data_file(self,fileName=None):
+        """reload a previous measurements file as one or several named datasets
+        (one per block of data in the file) that can be selected in the plot windows"""
+        if fileName==None:
+            fileName = QFileDialog.getOpenFileName(self,"Load data file",directory= "./measurements data")
+        if fileName!="":
+            blocks=Data_loader.load_measurements_file(fileName)
+            name=os.path.basename(unicode(fileName))
+            for i in range(len(blocks)):
+                if len(blocks)>1:
+                    self.datasets[name+" - block "+str(i+1)]=blocks[i]
+                else:
+                    self.datasets[name]=blocks[i]
+            print "Loaded "+str(len(blocks))+" block(s) of data from "+name
+
     def loaddefaultconfig(self):
         window = Config_menu(self,config_dict=self.mainconf)
         window.update_values()
@@ -120,44 +189,80 @@ class start_GUI(QMainWindow):
     def save_data(self):
         """function called periodically by a timer to check if some data
         was put by the measurements thread in the "queue" (buffer),
-        and, if so, update the Master dataset "self.measdata" and save
-        it to the disk"""
-        while not(self.data_queue.empty()):
-            #NB:Queues are thread-safe: they won't be accessed by several threads at the same time
-            #the lock mechanism is automatically included within them
-            #block=False: means do not block execution until some data is put in the queue
-            data,note=self.data_queue.get(block=False)
-            #the measuring thread may send three different types of
+        and, if so, update the Master dataset "self.measdata" and send
+        it to the savefile writer thread"""
+        #drain everything available in the queue in one go
+        items=[]
+        while True:
+            try:
+                #NB:Queues are thread-safe: they won't be accessed by several threads at the same time
+                #the lock mechanism is automatically included within them
+                #block=False: means do not block execution until some data is put in the queue
+                items.append(self.data_queue.get(block=False))
+            except Queue.Empty:
+                break
+        #consecutive rows of data are stored as a single block
+        rows=[]
+        #what is sent to the savefile: the same items, with the derived columns added
+        saved_items=[]
+        for data,note in items:
+            #the measuring thread may send four different types of
             #information through the Queue, "note" indicates which type it is
-            if note=='newfile':
-                #close previous file and open a new one
-                self.savefile.close()
-                try:
-                    #write buffer to disk every 256 bytes of data (0.25 Ko)
-                    self.savefile=open(data,'a',256)
-                except:
-                    try:
-                        #save data even if the savefile could not be created (the name of which was provided by the user)
-                        self.savefile=open("Unsaved-data-"+time.strftime("%a-%d-%b-%Y-%H-%M-%S-UTC", time.gmtime())+".txt",'a',256)
-                    except:
-                        self.savefile=open("Savefile_of_last_resort",'a',256)
-            elif note==True:
+            if note=='newfile' or note==True:
+                saved_items+=self.store_rows(rows)
+                rows=[]
+            if note==True:
                 #if note==True, "data" is actually a header for the incoming data
                 ######initialize data storage######
-                self.current_header=data
-                #set-up empty data lists
-                self.measdata=[ [] for i in range(len(data))]
-                #######Store header to file#######
-                self.savefile.write("\t".join(data)+'\n')
-            else:
+                self.current_header=self.derived_columns.extend_header(data)
+                #set-up an empty column store, one float64 column per header entry
+                self.measdata=Column_store(self.current_header)
+                saved_items.append((self.current_header,True))
+            elif note=='rows':
+                #a block of rows at once, e.g. a buffer read from an instrument
+                rows+=Savefile.block_rows(data)
+            elif note!='newfile':
                 #good data incoming (hopefully)
-                #######Store data to file#########                
-                self.savefile.write('\t'.join(map(str,data))+'\n')
-                #######Update Master data list####
-                for i in range(len(data)):
-                    self.measdata[i].append(data[i])
+                rows.append(data)
+            else:
+                saved_items.append((data,note))
             self.data_queue.task_done()
+        #######Update Master dataset######
+        saved_items+=self.store_rows(rows)
+        #######Store data to file#########
+        #the writer thread takes care of the header, the data and of the 'newfile' requests
+        if saved_items:
+            self.savefile_writer.put(saved_items)
+        self.show_savefile_status()
         self.save_data_timer.start(100)
+
+    def store_rows(self,rows):
+        """append a block of rows to the Master dataset, computing the derived columns,
+        return the items to send to the savefile"""
+        derived=self.derived_columns.append_rows(self.measdata,rows)
+        if derived is None:
+            return [(row,False) for row in rows]
+        return [(list(row)+values,False) for row,values in zip(rows,derived.tolist())]
+
+    def add_derived_column(self,name,expression):
+        """add a derived column to the data being measured, computed once over
+        the rows already received, then live"""
+        self.derived_columns.add(name,expression)
+        self.measdata=self.derived_columns.extend_store(self.measdata)
+        if self.measdata.header!=self.current_header:
+            self.current_header=self.measdata.header
+            #the savefile gets the new header, from which the new column is saved
+            if self.measurements_thread.isAlive():
+                self.savefile_writer.put([(self.current_header,True)])
+
+    def show_savefile_status(self):
+        """report the state of the savefile writer thread in the status bar"""
+        writer=self.savefile_writer
+        text=("Savefile: %d rows written, %d rows waiting, last write %.1f ms (max %.1f ms)"
+              % (writer.rows_written,writer.backlog(),writer.last_write_latency*1e3,writer.max_write_latency*1e3))
+        #called every 100 ms, the label is only redrawn when the numbers change
+        if text!=unicode(self.savefile_status.text()):
+            self.savefile_status.setText(text)
            
     def switch_measurements_state(self):
         if self.measurements_thread.isAlive():
@@ -175,8 +280,14 @@ class start_GUI(QMainWindow):
         ######initialize savefile######
         #it could be done in 'save_data' function, but then you mustn't access 
         #self.frontpanel, because the measurement thread has started, so just do it before starting the measurement thread 
-        #256 is the buffer size in bytes, 'a' is for 'append', in order to ensure never to erase any file
-        self.savefile=open(self.frontpanel_values.savefile_txt_input,'a',256)
+        #the savefile is owned by a separate thread, so that a slow disk does not freeze the frontpanel
+        #it is opened in 'append' mode, in order to ensure never to erase any file
+        self.savefile_writer=Savefile.Savefile_writer(self.frontpanel_values.savefile_txt_input,
+                                                      flush_every_row=not(self.drain_mode),
+                                                      fsync_rows=self.fsync_rows,
+                                                      fsync_secs=self.fsync_secs,
+                                                      compression=self.savefile_compression)
+        self.savefile_writer.start()
         #initiate a thread to run the measurements without freezing the frontpanel
         #print "launching meas prog"
         self.measurements_thread=meas_thread_class(self,
@@ -221,7 +332,9 @@ class start_GUI(QMainWindow):
             self.save_data()
             #previous line will relaunch the timer so stop it again
             self.save_data_timer.stop()
-            self.savefile.close()
+            #wait for the writer thread to write the remaining data and close the savefile
+            self.savefile_writer.close()
+            self.show_savefile_status()
         #change the text on the button
         self.ui.pushButton.setText("Start\nMeasurements")
    
@@ -3,6 +3,8 @@ import threading
 #Time measurement
 import time
 import numpy as np
+#Current reversal measurements
+from .. import Current_reversal
 
 ######create a separate thread to run the measurements without freezing the front panel######
 class Script(threading.Thread):
@@ -64,7 +66,10 @@ class Script(threading.Thread):
 #        rate = 100
 #        approach = 'Linear'
 #        mode = 'Persistent'
+        #after each current step, the filters of the voltmeter settle during one integration
+        #time before it is triggered, the field and the temperature are measured while it integrates
         filterwaitime=0.0167*f.mesure_speed
+        reversal=Current_reversal.Current_reversal(reserved_bus_access,I_source,voltmeter,settling_time=filterwaitime)
         #######################################################
         #MAIN LOOP         
         for I in np.arange(f.current1,f.current2,f.current3):
@@ -78,48 +83,9 @@ class Script(threading.Thread):
                     break
 #                Vp=0
 #                Vm=0
-                VpR=0
-                VmR=0
-                with reserved_bus_access:
-                    Herror, Hexp, status = ppms.get_field()
-                    #2nd order scheme to correct for the thermoelectric effect 
-                    #+I
-#                    voltmeter.switch_channel(1)
-#                    I_source.set_current_source_amplitude(I)
-#                    time.sleep(filterwaitime)
-#                    Vp+=voltmeter.query_voltage()/2.0
-#                    #-I
-#                    I_source.set_current_source_amplitude(-I)
-#                    time.sleep(filterwaitime)
-#                    Vm+=voltmeter.query_voltage()/2.0
-#                    I_source.set_current_source_amplitude(-I)
-#                    time.sleep(filterwaitime)
-#                    Vm+=voltmeter.query_voltage()/2.0
-#                    #+I
-#                    I_source.set_current_source_amplitude(I)
-#                    time.sleep(filterwaitime)
-#                    Vp+=voltmeter.query_voltage()/2.0
-#                    I_source.set_current_source_amplitude(0)
-                    #2nd order scheme to correct for the thermoelectric effect 
-                    #+I
-#                    voltmeter.switch_channel(2)
-                    I_source.set_current_source_amplitude(I)
-                    time.sleep(filterwaitime)
-                    VpR+=voltmeter.query_voltage()/2.0
-                    #-I
-                    I_source.set_current_source_amplitude(-I)
-                    time.sleep(filterwaitime)
-                    VmR+=voltmeter.query_voltage()/2.0
-                    I_source.set_current_source_amplitude(-I)
-                    time.sleep(filterwaitime)
-                    VmR+=voltmeter.query_voltage()/2.0
-                    #+I
-                    I_source.set_current_source_amplitude(I)
-                    time.sleep(filterwaitime)
-                    VpR+=voltmeter.query_voltage()/2.0
-                    I_source.set_current_source_amplitude(0)
-                    
-                    T = ppms.get_temperature()[1]
+                #2nd order scheme to correct for the thermoelectric effect (+I,-I,-I,+I)
+                VpR,VmR,((Herror,Hexp,status),T)=reversal.measure(I,readers=[(ppms,ppms.get_field),
+                                                                             (ppms,lambda:ppms.get_temperature()[1])])
 #                T = (T0+T1)/2.0
 #                TR = (T1+T2)/2.0
 #                H=(H0+H1)/2.0
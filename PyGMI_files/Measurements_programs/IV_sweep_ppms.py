@@ -0,0 +1,94 @@
+#Multithreading
+import threading
+#Time measurement
+import time
+import numpy as np
+#Current reversal measurements (+I,-I,-I,+I)
+from .. import Current_reversal
+
+######create a separate thread to run the measurements without freezing the front panel######
+class Script(threading.Thread):
+    def __init__(self,mainapp,frontpanel,data_queue,stop_flag,Instr_bus_lock,**kwargs):
+        #nothing to modify here
+        threading.Thread.__init__(self,**kwargs)
+        self.mainapp=mainapp
+        self.frontpanel=frontpanel
+        self.data_queue=data_queue
+        self.stop_flag=stop_flag
+        self.Instr_bus_lock=Instr_bus_lock
+
+    def run(self):
+        #this is the part that will be run in a separate thread
+        #######################################################
+        #SHORTCUTS
+        instr=self.mainapp                         #a shortcut to the main app, especially the instruments
+        f=self.frontpanel                          #a shortcut to frontpanel values
+        reserved_bus_access=self.Instr_bus_lock     #a lock that reserves the access to instruments
+        #data_queue=self.data_queue                #a shortcut to a FIFO queue to send the data to the main thread
+        #######################################################
+        #SAVEFILE HEADER - add column names to this list in the same order as you will send the results of the measurements to the main thread
+        #the IV curves are sent at once, as blocks of rows (one row per current): "self.data_queue.put((block,'rows'))"
+        header=['Time (s)','Time since Epoch']
+        header+=["Temperature (K)"]
+        header+=["VpR","VmR","(VpR-VmR)/2"]
+        header+=["I (A)"]
+        header+=["H (Oe)"]
+
+        #######################################################
+        #ORIGIN OF TIME FOR THE EXPERIMENT
+        start_time=time.clock()
+        #######################################################
+        #SEND THE HEADER OF THE SAVEFILE BACK TO THE MAIN THREAD, WHICH WILL TAKE CARE OF THE REST
+        self.data_queue.put((header,True))
+
+        #######################################################
+        #INSTRUMENTS NAMES SHORTCUTS FOR EASIER READING OF THE CODE BELOW
+        sourcemeter = instr.instr_1
+        ppms = instr.ppms
+
+        #Instruments set-up
+        with reserved_bus_access.bus(sourcemeter):
+            #source current, measure the voltage only (4 wires)
+            sourcemeter.setup_voltage_measurements()
+            sourcemeter.set_integration_rate(f.mesure_speed)
+            sourcemeter.output_ON()
+
+        currents=np.arange(f.current1,f.current2,f.current3)
+        #source-delay-measure: the delay lets the filters settle after each current step
+        source_delay=0.0167*f.mesure_speed
+        point_duration=source_delay+f.mesure_speed/50.0
+        #######################################################
+        #MAIN LOOP
+        for i in range(f.repeat_points):
+            if self.stop_flag.isSet():
+                break
+            with reserved_bus_access.bus(ppms):
+                Herror, Hexp, status = ppms.get_field()
+            #the whole IV curve is swept by the SourceMeter, each current being reversed
+            #in place (I1,-I1,-I1,I1,I2,-I2...): the 2nd order scheme correcting for the
+            #thermoelectric effect (+I,-I,-I,+I) combines readings adjacent in time, so
+            #that a drift during the curve cancels as it does with single points
+            #(list sweeps of 100 points, i.e. 25 currents per sweep)
+            with reserved_bus_access.bus(sourcemeter):
+                V=sourcemeter.measure_current_sweep(np.repeat(currents,4)*np.tile(Current_reversal.POLARITIES,len(currents)),source_delay,point_duration)[:,0]
+                sourcemeter.set_current_source_amplitude(0)
+            with reserved_bus_access.bus(ppms):
+                T = ppms.get_temperature()[1]
+            if len(V)==0:
+                #no current to sweep (e.g. current1>=current2): nothing to send
+                time.sleep(f.mesure_delay)
+                continue
+            V=V.reshape(-1,4)
+            VpR=(V[:,0]+V[:,3])/2.0
+            VmR=(V[:,1]+V[:,2])/2.0
+            VR=(VpR-VmR)/2.0
+
+            ######Compile the latest data######
+            nb=len(currents)
+            t=time.clock()-start_time
+            epochtime=time.time()
+            block=np.column_stack([np.repeat(t,nb),np.repeat(epochtime,nb),np.repeat(T,nb),VpR,VmR,VR,currents,np.repeat(Hexp,nb)])
+            #######Send the IV curve to the main process for display and storage, as one chunk######
+            self.data_queue.put((block,'rows'))
+            #######Wait mesure_delay secs before taking next measurements
+            time.sleep(f.mesure_delay)
@@ -2,6 +2,8 @@
 import threading
 #Time measurement
 import time
+#Current reversal measurements
+from .. import Current_reversal
 
 ######create a separate thread to run the measurements without freezing the front panel######
 class Script(threading.Thread):
@@ -21,6 +23,7 @@ class Script(threading.Thread):
         instr=self.mainapp                         #a shortcut to the main app, especially the instruments
         f=self.frontpanel                          #a shortcut to frontpanel values
         reserved_bus_access=self.Instr_bus_lock     #a lock that reserves the access to instruments
+                                                    #(to all of them, or only to the buses of some: reserved_bus_access.bus(instr1,instr2))
         #data_queue=self.data_queue                #a shortcut to a FIFO queue to send the data to the main thread
         #######################################################
         #SAVEFILE HEADER - add column names to this list in the same order as you will send the results of the measurements to the main thread
@@ -39,7 +42,7 @@ class Script(threading.Thread):
         
         if f.instr_on_14:
             header+=["LHe level (%)"]
-            with reserved_bus_access:        
+            with reserved_bus_access.bus(instr.instr_14):
                 instr.instr_14.set_unit_to_percent()
         #print header
 
@@ -61,64 +64,48 @@ class Script(threading.Thread):
         #Instruments set-up
         
         for voltmeter in active_voltmeters:
-            with reserved_bus_access:
+            with reserved_bus_access.bus(voltmeter):
                 voltmeter.setup_single_shot()
                 voltmeter.set_integration_rate(f.mesure_speed)
         
         I=f.current1
+        #2nd order scheme to correct for the thermoelectric effect (+I,-I,-I,+I),
+        #for each voltmeter and its current source: after each current step, the filters
+        #of the voltmeter settle (at least 50 ms, or one integration time) before it is triggered
+        filterwaitime=max(0.05,0.0167*f.mesure_speed)
+        reversals=[[i,Current_reversal.Current_reversal(reserved_bus_access,I_source,voltmeter,settling_time=filterwaitime)]
+                   for i,voltmeter,I_source in [[0,instr.instr_1,instr.instr_7]]]#,[1,instr.instr_2,instr.instr_8]]]
         #######################################################
         #MAIN LOOP         
         while True: #loop and measure indefinitely, until the main process tells to stop 
             #Check if the main process is telling to stop
             if self.stop_flag.isSet():
                 break
-            with reserved_bus_access:
-                #Measure T,H
-                T_VTI=temp_controllerVTI.query_temp('A')
-                
-            
-            with reserved_bus_access:
-                T=temp_controller.query_temp('A')/2.0
-
-
-                            
             #repeat the measurements a number of times, given by 'repeat_points'
             #and calculate the average
             nb_active_V=len(active_voltmeters)
-            #T=0
+            T=0
+            T_VTI=0
             Vp=[0 for j in range(nb_active_V)]
             Vm=[0 for j in range(nb_active_V)]
             V=[0 for j in range(nb_active_V)]
 
-            for i,voltmeter,I_source in [[0,instr.instr_1,instr.instr_7]]:#,[1,instr.instr_2,instr.instr_8]]:
+            for i,reversal in reversals:
                 #Check if the main process is telling to stop
                 if self.stop_flag.isSet():
                     break
 
-                with reserved_bus_access:
-                    #2nd order scheme to correct for the thermoelectric effect 
-                    #+I
-                    I_source.set_current_source_amplitude(I)
-                    time.sleep(0.05)
-                    Vp[i]+=voltmeter.query_voltage()/2.0
-                    #-I
-                    I_source.set_current_source_amplitude(-I)
-                    time.sleep(0.05)
-                    Vm[i]+=voltmeter.query_voltage()/2.0
-                    I_source.set_current_source_amplitude(-I)
-                    time.sleep(0.05)
-                    Vm[i]+=voltmeter.query_voltage()/2.0
-                    #+I
-                    I_source.set_current_source_amplitude(I)
-                    time.sleep(0.05)
-                    Vp[i]+=voltmeter.query_voltage()/2.0
-                    I_source.set_current_source_amplitude(0)
-                T+=temp_controller.query_temp('A')/2.0
+                #the temperatures are measured while the voltmeter integrates,
+                #only the buses of these instruments are reserved
+                Vp[i],Vm[i],(T1,T_VTI,T2)=reversal.measure(I,readers=[(temp_controller,lambda:temp_controller.query_temp('A')),
+                                                                     (temp_controllerVTI,lambda:temp_controllerVTI.query_temp('A')),
+                                                                     (temp_controller,lambda:temp_controller.query_temp('A'))])
+                T=(T1+T2)/2.0
                 V[i]=(Vp[i]-Vm[i])/2.0
                 
             if f.instr_on_14:
                 try:
-                    with reserved_bus_access:
+                    with reserved_bus_access.bus(instr.instr_14):
                         LHe=float(instr.instr_14.query_LHe_level()[:-1])
                 except:
                     LHe=-1
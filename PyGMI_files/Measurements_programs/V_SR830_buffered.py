@@ -0,0 +1,78 @@
+#Multithreading
+import threading
+#Time measurement
+import time
+import numpy as np
+#Buffered lock-in acquisition
+from .. import Lockin_acquisition
+
+#sample rate of the lock-in (Hz), from 62.5 mHz to 512 Hz
+SAMPLE_RATE=64.0
+
+######create a separate thread to run the measurements without freezing the front panel######
+class Script(threading.Thread):
+    def __init__(self,mainapp,frontpanel,data_queue,stop_flag,Instr_bus_lock,**kwargs):
+        #nothing to modify here
+        threading.Thread.__init__(self,**kwargs)
+        self.mainapp=mainapp
+        self.frontpanel=frontpanel
+        self.data_queue=data_queue
+        self.stop_flag=stop_flag
+        self.Instr_bus_lock=Instr_bus_lock
+
+    def run(self):
+        #this is the part that will be run in a separate thread
+        #######################################################
+        #SHORTCUTS
+        instr=self.mainapp                         #a shortcut to the main app, especially the instruments
+        f=self.frontpanel                          #a shortcut to frontpanel values
+        reserved_bus_access=self.Instr_bus_lock     #a lock that reserves the access to instruments
+                                                    #(to all of them, or only to the buses of some: reserved_bus_access.bus(instr1,instr2))
+        #data_queue=self.data_queue                #a shortcut to a FIFO queue to send the data to the main thread
+        #######################################################
+        #SAVEFILE HEADER - add column names to this list in the same order as you will send the results of the measurements to the main thread
+        #the points of the lock-in are sent by blocks of rows (one row per point): "self.data_queue.put((block,'rows'))"
+        header=['Time (s)','Time since Epoch']
+        header+=["V2 (V)","Theta (deg)"]
+        header+=["I (A)"]
+        if f.temp_controller_on:header+=["T sample (K)"]
+
+        #######################################################
+        #ORIGIN OF TIME FOR THE EXPERIMENT
+        #(the time of each point is given by its index in the buffer of the SR830)
+        start_epoch=time.time()
+        #######################################################
+        #SEND THE HEADER OF THE SAVEFILE BACK TO THE MAIN THREAD, WHICH WILL TAKE CARE OF THE REST
+        self.data_queue.put((header,True))
+
+        #######################################################
+        #INSTRUMENTS NAMES SHORTCUTS FOR EASIER READING OF THE CODE BELOW
+        SRS=instr.instr_8
+        temp_controller=instr.temp_controller
+
+        #Instruments set-up
+        I=f.current1
+        with reserved_bus_access.bus(SRS):
+            SRS.set_amplitude(min([1.0,I*1e3])) #Imax=1mA, corresponds to 1V output on SRS
+            SRS.set_ch1_display('R')
+            SRS.set_ch2_display('theta')
+
+        #the SR830 stores R and theta in its buffer, until stopped,
+        #the buffer being read by chunks as it fills
+        acquisition=Lockin_acquisition.Lockin_acquisition(reserved_bus_access,SRS,rate=SAMPLE_RATE)
+
+        def compile_rows(block):
+            """rows of the savefile for a chunk of points of the lock-in (time, R, theta)"""
+            nb=len(block)
+            epochtime=block[:,0]+acquisition.start_time
+            columns=[epochtime-start_epoch,epochtime,block[:,1],block[:,2],np.repeat(I,nb)]
+            if f.temp_controller_on:
+                #one temperature per chunk
+                with reserved_bus_access.bus(temp_controller):
+                    T=temp_controller.query_temp('A')
+                columns.append(np.repeat(T,nb))
+            return np.column_stack(columns)
+
+        #######################################################
+        #MAIN LOOP: send the readings to the main process for display and storage, until stopped
+        acquisition.stream(self.data_queue,self.stop_flag,columns=compile_rows)
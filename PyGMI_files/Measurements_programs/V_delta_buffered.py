@@ -0,0 +1,73 @@
+#Multithreading
+import threading
+#Time measurement
+import time
+import numpy as np
+#Buffered delta mode acquisition
+from .. import Delta_acquisition
+
+######create a separate thread to run the measurements without freezing the front panel######
+class Script(threading.Thread):
+    def __init__(self,mainapp,frontpanel,data_queue,stop_flag,Instr_bus_lock,**kwargs):
+        #nothing to modify here
+        threading.Thread.__init__(self,**kwargs)
+        self.mainapp=mainapp
+        self.frontpanel=frontpanel
+        self.data_queue=data_queue
+        self.stop_flag=stop_flag
+        self.Instr_bus_lock=Instr_bus_lock
+
+    def run(self):
+        #this is the part that will be run in a separate thread
+        #######################################################
+        #SHORTCUTS
+        instr=self.mainapp                         #a shortcut to the main app, especially the instruments
+        f=self.frontpanel                          #a shortcut to frontpanel values
+        reserved_bus_access=self.Instr_bus_lock     #a lock that reserves the access to instruments
+                                                    #(to all of them, or only to the buses of some: reserved_bus_access.bus(instr1,instr2))
+        #data_queue=self.data_queue                #a shortcut to a FIFO queue to send the data to the main thread
+        #######################################################
+        #SAVEFILE HEADER - add column names to this list in the same order as you will send the results of the measurements to the main thread
+        #the delta readings are sent by blocks of rows (one row per reading): "self.data_queue.put((block,'rows'))"
+        header=['Time (s)','Time since Epoch']
+        header+=["V delta (V)"]
+        header+=["I (A)"]
+        if f.temp_controller_on:header+=["T sample (K)"]
+
+        #######################################################
+        #ORIGIN OF TIME FOR THE EXPERIMENT
+        #(the time of each reading is given by the 6221)
+        start_epoch=time.time()
+        #######################################################
+        #SEND THE HEADER OF THE SAVEFILE BACK TO THE MAIN THREAD, WHICH WILL TAKE CARE OF THE REST
+        self.data_queue.put((header,True))
+
+        #######################################################
+        #INSTRUMENTS NAMES SHORTCUTS FOR EASIER READING OF THE CODE BELOW
+        deltasource=instr.instr_8
+        temp_controller=instr.temp_controller
+
+        #Instruments set-up
+        I=f.current1
+        with reserved_bus_access.bus(deltasource):
+            deltasource.set_integration_rate_delta(f.mesure_speed)
+
+        #the 6221 and the 2182A measure on their own, until stopped,
+        #the buffer being read by chunks as it fills
+        acquisition=Delta_acquisition.Delta_acquisition(reserved_bus_access,deltasource,I)
+
+        def compile_rows(block):
+            """rows of the savefile for a chunk of delta readings (time, voltage)"""
+            nb=len(block)
+            epochtime=block[:,0]+acquisition.start_time
+            columns=[epochtime-start_epoch,epochtime,block[:,1],np.repeat(I,nb)]
+            if f.temp_controller_on:
+                #one temperature per chunk
+                with reserved_bus_access.bus(temp_controller):
+                    T=temp_controller.query_temp('A')
+                columns.append(np.repeat(T,nb))
+            return np.column_stack(columns)
+
+        #######################################################
+        #MAIN LOOP: send the readings to the main process for display and storage, until stopped
+        acquisition.stream(self.data_queue,self.stop_flag,columns=compile_rows)
@@ -0,0 +1,90 @@
+#Multithreading
+import threading
+#Time measurement
+import time
+import numpy as np
+
+######create a separate thread to run the measurements without freezing the front panel######
+class Script(threading.Thread):
+    def __init__(self,mainapp,frontpanel,data_queue,stop_flag,Instr_bus_lock,**kwargs):
+        #nothing to modify here
+        threading.Thread.__init__(self,**kwargs)
+        self.mainapp=mainapp
+        self.frontpanel=frontpanel
+        self.data_queue=data_queue
+        self.stop_flag=stop_flag
+        self.Instr_bus_lock=Instr_bus_lock
+
+    def run(self):
+        #this is the part that will be run in a separate thread
+        #######################################################
+        #SHORTCUTS
+        instr=self.mainapp                         #a shortcut to the main app, especially the instruments
+        f=self.frontpanel                          #a shortcut to frontpanel values
+        reserved_bus_access=self.Instr_bus_lock     #a lock that reserves the access to instruments
+                                                    #(to all of them, or only to the buses of some: reserved_bus_access.bus(instr1,instr2))
+        #data_queue=self.data_queue                #a shortcut to a FIFO queue to send the data to the main thread
+        #######################################################
+        #SAVEFILE HEADER - add column names to this list in the same order as you will send the results of the measurements to the main thread
+        #the readings of the trace buffer are sent by blocks of rows (one row per reading): "self.data_queue.put((block,'rows'))"
+        header=['Time (s)','Time since Epoch']
+        header+=["V (V)"]
+        if f.temp_controller_on:header+=["T sample (K)"]
+
+        #######################################################
+        #INSTRUMENTS NAMES SHORTCUTS FOR EASIER READING OF THE CODE BELOW
+        voltmeter=instr.instr_1
+        temp_controller=instr.temp_controller
+
+        #Instruments set-up
+        #the voltmeter takes its readings on its own (one after the other, or at each
+        #trigger of the trigger link cable with external_trigger=True) and stores them
+        #(readings lost while its buffer was full are marked by a row with a NaN voltage)
+        with reserved_bus_access.bus(voltmeter):
+            voltmeter.setup_trace(external_trigger=False,NPLC=f.mesure_speed)
+        #######################################################
+        #ORIGIN OF TIME FOR THE EXPERIMENT
+        #(the time of each reading is given by the 2182A)
+        start_epoch=voltmeter.trace_start
+        #######################################################
+        #SEND THE HEADER OF THE SAVEFILE BACK TO THE MAIN THREAD, WHICH WILL TAKE CARE OF THE REST
+        self.data_queue.put((header,True))
+
+        def send(block):
+            """send the readings of a block to the main process for display and storage"""
+            nb=len(block)
+            if nb==0:
+                return
+            ######Compile the latest data######
+            columns=[block[:,0],block[:,0]+start_epoch,block[:,1]]
+            if f.temp_controller_on:
+                #one temperature per block
+                with reserved_bus_access.bus(temp_controller):
+                    T=temp_controller.query_temp('A')
+                columns.append(np.repeat(T,nb))
+            self.data_queue.put((np.column_stack(columns),'rows'))
+
+        #######################################################
+        #MAIN LOOP
+        try:
+            while True: #loop and measure indefinitely, until the main process tells to stop
+                #Check if the main process is telling to stop
+                if self.stop_flag.isSet():
+                    break
+                #######Wait mesure_delay secs (at least 0.2 s) while the readings pile up,
+                #but less than half the time to fill the buffer, which would overflow otherwise
+                wait=max(f.mesure_delay,0.2)
+                fill_time=voltmeter.trace_fill_time()
+                if fill_time is not None:
+                    wait=min(wait,fill_time/2.0)
+                time.sleep(wait)
+                with reserved_bus_access.bus(voltmeter):
+                    block=voltmeter.fetch_trace()
+                send(block)
+            #the last readings, however few
+            with reserved_bus_access.bus(voltmeter):
+                block=voltmeter.fetch_trace(min_new=1)
+            send(block)
+        finally:
+            with reserved_bus_access.bus(voltmeter):
+                voltmeter.stop_trace()
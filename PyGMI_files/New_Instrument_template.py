@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
-import visa
+from .. import Visa_pool
 
 class Connect_Instrument():
     def __init__(self,VISA_address="GPIB1::22"):
         #part to be run at instrument initialization, the following commands are mandatory
-        self.io = visa.ResourceManager().open_resource(VISA_address)
+        self.io = Visa_pool.open_resource(VISA_address)
         self.VISA_address=VISA_address
         print self.query_unit_Id()
 
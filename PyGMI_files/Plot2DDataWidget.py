@@ -1,6 +1,9 @@
-from PyQt4.QtGui import QWidget,QApplication,QColorDialog,QColor
+from PyQt4.QtGui import QWidget,QApplication,QColorDialog,QColor,QComboBox,QLabel,QCheckBox,QListWidget,QAbstractItemView
 from PyQt4.QtCore import QTimer
+import numpy as np
+import pyqtgraph as pg
 import Plot2DDataWidget_Ui
+from Decimation import Minmax_decimator,decimate_selection
 
 
 class Plot2DDataWidget(QWidget):
@@ -23,11 +26,45 @@ class Plot2DDataWidget(QWidget):
         self.curve.setSymbolBrush(pointcolor)
         self.curve.setSymbol('o')
         self.curve.setSymbolSize(SymbolSize)
+        #additional Y columns plotted against the same X, one curve per column
+        self.extra_y_indices=[]
+        self.extra_curves={}
+        self.overlay_label=QLabel("Overlay Y",self)
+        self.ui.gridLayout.addWidget(self.overlay_label,6,0,1,1)
+        self.overlay_box=QListWidget(self)
+        self.overlay_box.setSelectionMode(QAbstractItemView.MultiSelection)
+        self.overlay_box.setMaximumHeight(60)
+        self.overlay_box.itemSelectionChanged.connect(self.update_overlay)
+        self.ui.gridLayout.addWidget(self.overlay_box,6,1,1,3)
         
         self.parent=parent
         self.measdata=measdata
+        #incremented each time self.measdata is replaced: identifies the dataset in the
+        #rendered state and the keys of the decimators (the id() of a deleted dataset can be reused)
+        self.data_generation=0
         self.header=header
         self.update_dropdown_boxes(header)
+        #selection of the dataset to display: the live data of the Master dataset
+        #or a dataset reloaded from a previous measurements file
+        self.dataset_label=QLabel("Dataset",self)
+        self.ui.gridLayout.addWidget(self.dataset_label,4,0,1,1)
+        self.dataset_box=QComboBox(self)
+        self.ui.gridLayout.addWidget(self.dataset_box,4,1,1,3)
+        self.dataset_names=[]
+        self.update_dataset_box()
+        #rendering options: min/max decimation to at most 2 points per pixel
+        #and rendering of the visible range only, when zoomed in
+        self.decimate_box=QCheckBox("Min/max decimation",self)
+        self.decimate_box.setChecked(True)
+        self.ui.gridLayout.addWidget(self.decimate_box,5,0,1,2)
+        self.visible_box=QCheckBox("Visible range only",self)
+        self.ui.gridLayout.addWidget(self.visible_box,5,2,1,2)
+        #one decimator per Y column displayed, with the number of rows of
+        #the dataset it has already processed
+        self.decimators={}
+        self.cursors={}
+        #state of the dataset and of the options at the last refresh
+        self.rendered_state=None
         
         self.update_plot_timer = QTimer()
         self.update_plot_timer.setSingleShot(True) #The timer would not wait for the completion of the task otherwise
@@ -63,34 +100,139 @@ class Plot2DDataWidget(QWidget):
             
     def change_symbol_size(self,value):
         self.curve.setSymbolSize(value)
+        for curve in self.extra_curves.values():
+            curve.setSymbolSize(value)
+
+    def update_overlay(self):
+        """create or remove the curves of the Y columns selected in the overlay box"""
+        self.extra_y_indices=sorted([self.overlay_box.row(item) for item in self.overlay_box.selectedItems()])
+        for index in self.extra_curves.keys():
+            if index not in self.extra_y_indices:
+                self.ui.plot_area.removeItem(self.extra_curves.pop(index))
+        for index in self.extra_y_indices:
+            if index not in self.extra_curves:
+                #each overlaid column gets its own color
+                color=pg.intColor(index,hues=max(len(self.header),2))
+                curve=self.ui.plot_area.plot(pen=color)
+                curve.setSymbolBrush(color)
+                curve.setSymbol('o')
+                curve.setSymbolSize(self.curve.opts['symbolSize'])
+                self.extra_curves[index]=curve
 
     def check_connection(self,state=1):
         """check if the pointer to the Master dataset to display (self.measdata in Main.py) has changed"""
         if state and hasattr(self.parent,"measdata"):
-            if self.parent.measdata!=self.measdata:self.measdata=self.parent.measdata
-            if self.parent.current_header!=self.header:self.update_dropdown_boxes(self.parent.current_header)
+            self.update_dataset_box()
+            if self.dataset_box.currentIndex()>0:
+                #a dataset reloaded from a file, with its own header
+                measdata=self.parent.datasets[self.dataset_names[self.dataset_box.currentIndex()-1]]
+                header=measdata.header
+            else:
+                measdata=self.parent.measdata
+                header=self.parent.current_header
+            if measdata is not self.measdata:
+                self.measdata=measdata
+                self.data_generation+=1
+            if header!=self.header:self.update_dropdown_boxes(header)
             #print "Reestablishing connection"
+
+    def update_dataset_box(self):
+        """Update the drop-down box that selects the dataset with the datasets available"""
+        names=sorted(getattr(self.parent,"datasets",{}).keys())
+        if names!=self.dataset_names:
+            current=self.dataset_box.currentText()
+            self.dataset_box.clear()
+            self.dataset_box.addItems(["Live data"]+names)
+            self.dataset_names=names
+            index=self.dataset_box.findText(current)
+            if index>0:self.dataset_box.setCurrentIndex(index)
     
     def autoupdate(self,state=1):
+        #when the main window has a refresh scheduler, the plot is refreshed in the
+        #same frames as the other windows, otherwise it uses its own timer
+        scheduler=getattr(self.parent,"refresh_scheduler",None)
         if state:
             self.update_plot()
-            self.update_plot_timer.start(self.ui.refresh_rate.value()*1000)#The value must be converted to milliseconds
+            if scheduler is not None:
+                self.update_plot_timer.stop()
+                scheduler.subscribe(self.update_plot,lambda:self.ui.refresh_rate.value()*1000,self,"plot - "+unicode(self.windowTitle()))
+            else:
+                self.update_plot_timer.start(self.ui.refresh_rate.value()*1000)#The value must be converted to milliseconds
         else:
             self.update_plot_timer.stop()
+            if scheduler is not None:scheduler.unsubscribe(self.update_plot)
             
     def update_plot(self):
         """plot the data columns selected in the drop-down menu boxes"""
         if self.ui.autoconnect.isChecked():self.check_connection()
-        if self.x_index!=-1 and self.y_index!=-1 and self.measdata[self.x_index]!=[] and self.measdata[self.y_index]!=[]:            
-            self.curve.setData(self.measdata[self.x_index],self.measdata[self.y_index])
+        #the version of the dataset changes each time rows are appended,
+        #if nothing changed since the last refresh there is nothing to do
+        version=getattr(self.measdata,"version",None)
+        state=(self.data_generation,version,self.x_index,self.y_index,tuple(self.extra_y_indices),self.decimate_box.isChecked(),self.visible_box.isChecked(),self.ui.plot_area.width())
+        if self.visible_box.isChecked():state+=(tuple(self.ui.plot_area.getViewBox().viewRange()[0]),)
+        if version is not None and state==self.rendered_state:
+            return
+        if self.x_index==-1 or self.y_index==-1:
+            return
+        curves=[(self.y_index,self.curve)]+[(index,self.extra_curves[index]) for index in self.extra_y_indices if index<len(self.measdata)]
+        #all the curves are drawn from the same snapshot of the dataset:
+        #the same number of rows is taken from every column
+        n=min([len(self.measdata[self.x_index])]+[len(self.measdata[index]) for index,curve in curves])
+        if n>0:
+            #columns of the Master dataset are zero-copy numpy views, no conversion needed
+            x=np.asarray(self.measdata[self.x_index][:n],dtype=float)
+            for index,curve in curves:
+                y=np.asarray(self.measdata[index][:n],dtype=float)
+                if self.decimate_box.isChecked() or self.visible_box.isChecked():
+                    curve.setData(*self.points_to_render(x,y,index))
+                else:
+                    curve.setData(x,y)
+            self.rendered_state=state
+
+    def points_to_render(self,x,y,y_index=None):
+        """reduce the points to render to the visible ones and/or to 2 points per pixel"""
+        if y_index is None:y_index=self.y_index
+        n=min(len(x),len(y))
+        x=x[:n]
+        y=y[:n]
+        nb_pixels=max(self.ui.plot_area.width(),100)
+        decimator=self.decimators.get(y_index)
+        if decimator is None or nb_pixels!=decimator.nb_pixels:
+            decimator=self.decimators[y_index]=Minmax_decimator(nb_pixels)
+            self.cursors[y_index]=0
+        #only the points appended since the last refresh are processed
+        key=(self.data_generation,self.x_index,y_index)
+        if key!=decimator.key or n!=self.cursors[y_index]:
+            decimator.update(x,y,key)
+            self.cursors[y_index]=n
+        view=self.ui.plot_area.getViewBox()
+        if self.visible_box.isChecked() and not(view.autoRangeEnabled()[0]):
+            (xmin,xmax),(ymin,ymax)=view.viewRange()
+            visible=decimator.visible_range(x,xmin,xmax)
+            if visible is None:
+                #x is not sorted, the visible points have to be searched
+                idx=np.nonzero((x>=xmin)&(x<=xmax))[0]
+                if self.decimate_box.isChecked():
+                    return decimate_selection(x,y,idx,nb_pixels)
+                return x[idx],y[idx]
+            start,stop=visible
+            #keep one point on each side so that the curve reaches the edges of the plot
+            start=max(start-1,0)
+            stop=min(stop+1,n)
+            if self.decimate_box.isChecked():
+                return decimator.decimate(x,y,start,stop)
+            return x[start:stop],y[start:stop]
+        return decimator.decimate(x,y)
     
     def update_dropdown_boxes(self,header):
         """Update the drop-down boxes that select the content of the plot"""
+        self.header=header
         self.ui.x_axis_box.clear()
         self.ui.x_axis_box.addItems(header) 
         self.ui.y_axis_box.clear()
         self.ui.y_axis_box.addItems(header)
-        self.header=header
+        self.overlay_box.clear()
+        self.overlay_box.addItems(header)
         
 if __name__ == "__main__":
     import sys
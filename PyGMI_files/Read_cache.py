@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#Readings shared by the threads querying a same instrument
+#A reading is kept with the time it was taken and reused by the next callers
+#as long as it is younger than the age they accept, so that e.g. a panel and
+#the measurement program reading the same temperature share one query:
+#   cache=Cached_reading(max_age=0.1)
+#   T=cache.get(lambda:float(io.query('KRDG? A')))
+#Each instrument has a cache of its last readings (see cache_of), by method of
+#its driver and arguments. The reading methods decorated with @published add
+#their results to it, whichever thread calls them (e.g. the measurements
+#program), and read() gives a reading no older than a given age, only querying
+#the instrument when the cached one is too old (the methods changing the
+#settings of the instrument, decorated with @invalidating, empty the cache).
+#The panels use it to display the readings taken by a running measurements
+#program instead of reserving the bus for their own queries:
+#   T=Read_cache.read(temp_controller,'query_temp',('A',),max_age=1.0,lock=bus_access)
+import time
+import threading
+
+class Cached_reading():
+    def __init__(self,max_age=0.0):
+        """max_age: age (s) of the oldest reading reused by default, 0 to read each time"""
+        self.max_age=max_age
+        self.value=None
+        #time (time.time()) of the last reading, None if there is none
+        self.time=None
+        #the callers waiting during a read get its result instead of reading again
+        self.lock=threading.Lock()
+
+    def get(self,read,max_age=None):
+        """the last reading if it is younger than max_age (s), otherwise a new one, read()"""
+        if max_age is None:
+            max_age=self.max_age
+        with self.lock:
+            if self.time is None or time.time()-self.time>max_age:
+                self.value=read()
+                self.time=time.time()
+            return self.value
+
+    def fresh(self,max_age=None):
+        """(True,last reading) if it is younger than max_age (s), (False,None) otherwise"""
+        if max_age is None:
+            max_age=self.max_age
+        with self.lock:
+            if self.time is None or time.time()-self.time>max_age:
+                return False,None
+            return True,self.value
+
+    def publish(self,value,timestamp=None):
+        """replace the last reading by value, taken at timestamp (time.time(), now by default)"""
+        with self.lock:
+            self.value=value
+            self.time=time.time() if timestamp is None else timestamp
+
+    def clear(self):
+        """forget the last reading, e.g. after changing a setting it depends on"""
+        with self.lock:
+            self.time=None
+
+class Read_cache():
+    """last readings of an instrument, by method of its driver and arguments"""
+    def __init__(self):
+        self.lock=threading.Lock()
+        #(method name,arguments...) -> Cached_reading
+        self.readings={}
+
+    def reading(self,key):
+        with self.lock:
+            if key not in self.readings:
+                self.readings[key]=Cached_reading()
+            return self.readings[key]
+
+    def publish(self,key,value,timestamp=None):
+        self.reading(key).publish(value,timestamp)
+
+    def fresh(self,key,max_age):
+        return self.reading(key).fresh(max_age)
+
+    def clear(self):
+        """forget all the readings, e.g. after a reset of the instrument"""
+        with self.lock:
+            readings=self.readings.values()
+        for reading in readings:
+            reading.clear()
+
+#creates the caches of the instruments
+caches_lock=threading.Lock()
+
+def cache_of(instr):
+    """the Read_cache of an instrument (driver), created at the first use"""
+    with caches_lock:
+        if getattr(instr,'read_cache',None) is None:
+            instr.read_cache=Read_cache()
+        return instr.read_cache
+
+def key_of(method,args):
+    #the arguments given by the interface are QStrings or unicode strings
+    return tuple([method]+[unicode(arg) for arg in args])
+
+def published(method):
+    """decorator of the reading methods of a driver, publishing each of their
+    results in the cache of the instrument"""
+    def publishing_method(self,*args):
+        value=method(self,*args)
+        cache_of(self).publish(key_of(method.__name__,args),value)
+        return value
+    publishing_method.__name__=method.__name__
+    publishing_method.__doc__=method.__doc__
+    return publishing_method
+
+def invalidating(method):
+    """decorator of the methods of a driver changing the state of the instrument,
+    forgetting the readings cached before the change"""
+    def invalidating_method(self,*args,**kwargs):
+        try:
+            return method(self,*args,**kwargs)
+        finally:
+            cache_of(self).clear()
+    invalidating_method.__name__=method.__name__
+    invalidating_method.__doc__=method.__doc__
+    return invalidating_method
+
+def read(instr,method,args=(),max_age=0.0,lock=None):
+    """value of instr.method(*args) no older than max_age (s): the cached one if it
+    is recent enough, otherwise a new reading, made with the bus reserved by lock"""
+    cache=cache_of(instr)
+    key=key_of(method,args)
+    found,value=cache.fresh(key,max_age)
+    if found:
+        return value
+    def new_reading():
+        #another thread may have read it while waiting for the bus
+        found,value=cache.fresh(key,max_age)
+        if not(found):
+            value=getattr(instr,method)(*args)
+            cache.publish(key,value)
+        return value
+    if lock is None:
+        return new_reading()
+    with lock:
+        return new_reading()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+#Central scheduler for the periodic refreshes of the user interface
+#Instead of each plot window, instrument panel and the macro editor running
+#its own QTimer, they subscribe to this scheduler which runs a single timer:
+#all the refreshes that are due are done together in one frame, refreshes of
+#hidden or minimized windows are skipped, and the time spent in each of them
+#is recorded.
+import time
+import traceback
+from PyQt4.QtCore import QTimer
+
+def is_shown(widget):
+    """True if the widget is visible and neither it nor one of its parents is minimized"""
+    if widget is None:
+        return True
+    if not(widget.isVisible()):
+        return False
+    while widget is not None:
+        if widget.isMinimized():
+            return False
+        widget=widget.parentWidget()
+    return True
+
+class Subscriber():
+    def __init__(self,callback,interval,widget=None,name=None):
+        self.callback=callback
+        #interval in milliseconds, or a function returning it (e.g. a refresh rate box of the interface)
+        self.interval=interval
+        self.widget=widget
+        self.name=name if name is not None else getattr(callback,'__name__','callback')
+        self.next_time=0
+        self.calls=0
+        self.skipped=0
+        self.total_cost=0
+        self.last_cost=0
+        self.max_cost=0
+
+    def interval_ms(self):
+        if callable(self.interval):
+            return self.interval()
+        return self.interval
+
+class Refresh_scheduler():
+    def __init__(self,frame_interval=50):
+        """frame_interval: time between two frames in milliseconds"""
+        self.frame_interval=frame_interval
+        self.subscribers=[]
+        self.timer=QTimer()
+        #single shot timer restarted after each frame, so that frames never pile up
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(self.frame_interval)
+
+    def subscribe(self,callback,interval,widget=None,name=None):
+        """call 'callback' every 'interval' milliseconds, as long as 'widget' is shown.
+        If the callback is already subscribed, only its interval is updated."""
+        for sub in self.subscribers:
+            if sub.callback==callback:
+                sub.interval=interval
+                return sub
+        sub=Subscriber(callback,interval,widget,name)
+        #subscribers with the same interval are aligned on the same frames
+        sub.next_time=self.aligned_time(time.time(),sub.interval_ms())
+        self.subscribers.append(sub)
+        if widget is not None:
+            #e.g. a panel closed with its MDI subwindow, which deletes it
+            widget.destroyed.connect(lambda *args:self.unsubscribe(callback))
+        return sub
+
+    def unsubscribe(self,callback):
+        self.subscribers=[sub for sub in self.subscribers if sub.callback!=callback]
+
+    def call_later(self,delay,callback,name=None):
+        """call 'callback' once, at the first frame after 'delay' milliseconds"""
+        self.unsubscribe(callback)
+        sub=Subscriber(callback,None,None,name)
+        sub.next_time=time.time()+delay/1000.0
+        self.subscribers.append(sub)
+        return sub
+
+    def aligned_time(self,now,interval):
+        interval=max(interval/1000.0,self.frame_interval/1000.0)
+        return (int(now/interval)+1)*interval
+
+    def tick(self):
+        try:
+            now=time.time()
+            for sub in [sub for sub in self.subscribers if sub.next_time<=now]:
+                self.refresh(sub,now)
+        finally:
+            #whatever happened, the other refreshes must go on
+            self.timer.start(self.frame_interval)
+
+    def refresh(self,sub,now):
+        t0=time.time()
+        try:
+            if sub.interval is None:
+                #single shot
+                self.unsubscribe(sub.callback)
+            else:
+                #the interval box or the widget may have been deleted with their window
+                sub.next_time=self.aligned_time(now,sub.interval_ms())
+            if not(is_shown(sub.widget)):
+                sub.skipped+=1
+                return
+            t0=time.time()
+            sub.callback()
+        except Exception:
+            #a failing refresh is stopped, as its own timer would have been,
+            #but it must not stop the refreshes of the other windows
+            traceback.print_exc()
+            self.unsubscribe(sub.callback)
+        cost=time.time()-t0
+        sub.calls+=1
+        sub.last_cost=cost
+        sub.total_cost+=cost
+        sub.max_cost=max(cost,sub.max_cost)
+
+    def report(self):
+        """cost of each subscriber: list of (name,calls,skipped,mean cost,max cost) in seconds"""
+        return [(sub.name,sub.calls,sub.skipped,sub.total_cost/sub.calls if sub.calls else 0,sub.max_cost) for sub in self.subscribers]
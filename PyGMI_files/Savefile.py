@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+#Savefiles of the measurements data
+#The main thread drains the data queue in batches and hands them to a writer
+#thread, which owns the savefile: complete blocks of rows are formatted all at
+#once and written to the disk with a single call.
+#The format is chosen from the extension of the savefile name: tab-separated
+#text by default, NumPy archive for '.npz', HDF5 for '.h5' or '.hdf5'
+import os
+import time
+import threading
+import Queue
+import io
+import json
+import zipfile
+import itertools
+import numpy as np
+#HDF5 savefiles are optional
+try:
+    import h5py
+except ImportError:
+    h5py=None
+
+def format_rows(rows):
+    """format a block of rows as tab-separated text, one line per row, each value
+    written as str() writes it (e.g. 2.0 as '2.0'). Rows of the same length are
+    formatted in a single operation"""
+    if len(set(map(len,rows)))==1:
+        line='\t'.join(['%s']*len(rows[0]))+'\n'
+        text=(line*len(rows)) % tuple(itertools.chain.from_iterable(rows))
+        #'%s' gives unicode text if a value is unicode, where str() would encode it
+        if not(isinstance(text,unicode)):
+            return text
+    #rows of different lengths, format them one by one
+    return ''.join(['\t'.join(map(str,row))+'\n' for row in rows])
+
+class Text_savefile():
+    def __init__(self,filename,fsync_rows=0,fsync_secs=0,**kwargs):
+        """tab-separated text savefile.
+        fsync_rows: force the data onto the disk every N rows (0 to disable)
+        fsync_secs: force the data onto the disk every T seconds (0 to disable)
+        other options of the binary savefiles are ignored"""
+        #'a' is for 'append', in order to ensure never to erase any file
+        self.file=open(filename,'a')
+        self.filename=filename
+        self.fsync_rows=fsync_rows
+        self.fsync_secs=fsync_secs
+        #(header,True) and (rows,False) items received since the last flush
+        self.pending=[]
+        #last header written to the disk, that of the rows received next
+        self.header=None
+        self.rows_since_sync=0
+        self.last_sync=time.time()
+
+    def write_header(self,header):
+        self.pending.append((header,True))
+
+    def write_rows(self,rows):
+        self.pending.append((rows,False))
+        self.rows_since_sync+=len(rows)
+
+    def unwritten(self):
+        """items received but not written yet to the disk, after the header of their rows"""
+        if self.pending and self.pending[0][1]!=True and self.header is not None:
+            return [(self.header,True)]+self.pending
+        return self.pending
+
+    def flush(self):
+        """write everything received since the last flush with a single write"""
+        if self.pending:
+            text=[]
+            header=self.header
+            for data,note in self.pending:
+                if note==True:
+                    header=data
+                    text.append("\t".join(data)+'\n')
+                else:
+                    text.append(format_rows(data))
+            self.file.write(''.join(text))
+            self.pending=[]
+            self.header=header
+            self.file.flush()
+        if (self.fsync_rows and self.rows_since_sync>=self.fsync_rows) or (self.fsync_secs and time.time()-self.last_sync>=self.fsync_secs):
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.rows_since_sync=0
+        self.last_sync=time.time()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+class Binary_savefile():
+    def __init__(self,filename,fsync_rows=0,fsync_secs=0,compression=False,dtypes={},chunk_rows=1000,chunk_secs=10):
+        """common part of the binary savefiles. The rows are accumulated and appended
+        to the file by chunks, as structured arrays with one field per column of the
+        header (named 'c0','c1',...), the header itself being stored as metadata.
+        Each new header starts a new block of data in the same file.
+        compression: compress the chunks
+        dtypes: dictionnary {column name: numpy dtype}, columns not listed are stored
+        as float64, or as strings if their first value is a string
+        chunk_rows,chunk_secs: a chunk is written every N rows or T seconds
+        fsync_rows and fsync_secs have the same meaning as for the text savefiles"""
+        self.filename=filename
+        self.fsync_rows=fsync_rows
+        self.fsync_secs=fsync_secs
+        self.compression=compression
+        self.dtypes=dtypes
+        self.chunk_rows=chunk_rows
+        self.chunk_secs=chunk_secs
+        self.pending=[]
+        self.rows=[]
+        self.header=None
+        self.dtype=None
+        self.block=-1
+        self.rows_since_sync=0
+        self.last_sync=time.time()
+        self.last_chunk=time.time()
+
+    def write_header(self,header):
+        self.pending.append((header,True))
+
+    def write_rows(self,rows):
+        self.pending.append((rows,False))
+
+    def unwritten(self):
+        """items received but not written yet to the disk"""
+        if self.rows:
+            return [(self.header,True),(self.rows,False)]+self.pending
+        return self.pending
+
+    def flush(self):
+        """append a chunk to the file when enough rows were received, or when the last one is too old"""
+        while self.pending:
+            data,note=self.pending[0]
+            if note==True:
+                self.write_chunk()
+                self.start_block(data)
+            else:
+                if self.header is None:
+                    #data was sent without a header
+                    self.start_block(['column '+str(i) for i in range(len(data[0]))])
+                self.rows.extend(data)
+            #an item is removed once consumed, so that if a write fails the
+            #unwritten items (see unwritten) are neither lost nor duplicated
+            self.pending.pop(0)
+        if len(self.rows)>=self.chunk_rows or (self.rows and time.time()-self.last_chunk>=self.chunk_secs):
+            self.write_chunk()
+
+    def start_block(self,header):
+        self.block+=1
+        self.header=list(header)
+        self.dtype=None
+        self.chunk=0
+        self.write_header_metadata()
+
+    def make_dtype(self,first_row):
+        fields=[]
+        for i,name in enumerate(self.header):
+            if name in self.dtypes:
+                fields.append(('c'+str(i),self.dtypes[name]))
+            elif i<len(first_row) and isinstance(first_row[i],basestring):
+                fields.append(('c'+str(i),'S64'))
+            else:
+                fields.append(('c'+str(i),np.float64))
+        return np.dtype(fields)
+
+    def rows_as_array(self,rows):
+        """convert a list of rows to a structured array of the current block"""
+        if self.dtype is None:
+            self.dtype=self.make_dtype(rows[0])
+        nb_col=len(self.header)
+        try:
+            return np.array([tuple(row) for row in rows],dtype=self.dtype)
+        except (ValueError,TypeError):
+            #rows of the wrong length or values of the wrong type,
+            #store what can be converted and NaN for the rest
+            array=np.zeros(len(rows),dtype=self.dtype)
+            for name in self.dtype.names:
+                if self.dtype[name].kind=='f':
+                    array[name]=np.nan
+            for j,row in enumerate(rows):
+                for i in range(min(len(row),nb_col)):
+                    try:
+                        array['c'+str(i)][j]=row[i]
+                    except (ValueError,TypeError):
+                        pass
+            return array
+
+    def write_chunk(self):
+        if self.rows:
+            self.append_chunk(self.rows_as_array(self.rows))
+            self.rows_since_sync+=len(self.rows)
+            self.rows=[]
+            self.chunk+=1
+            if (self.fsync_rows and self.rows_since_sync>=self.fsync_rows) or (self.fsync_secs and time.time()-self.last_sync>=self.fsync_secs):
+                self.sync()
+        self.last_chunk=time.time()
+
+    def close(self):
+        self.flush()
+        self.write_chunk()
+        self.close_file()
+
+class Npz_savefile(Binary_savefile):
+    """NumPy .npz savefile (a zip archive of .npy arrays, readable with numpy.load).
+    New chunks are appended to the archive as new members:
+        blockNNN_header  : the header of the block, as an array of strings
+        blockNNN_chunkNNNNNN : a structured array with the rows of the chunk"""
+    def __init__(self,filename,**kwargs):
+        Binary_savefile.__init__(self,filename,**kwargs)
+        #append to an existing archive rather than erasing it
+        if os.path.isfile(filename):
+            with zipfile.ZipFile(filename,'r') as archive:
+                blocks=[name for name in archive.namelist() if name.endswith('_header.npy')]
+            self.block=len(blocks)-1
+        else:
+            #make sure the file can be created
+            zipfile.ZipFile(filename,'w').close()
+
+    def add_member(self,name,array):
+        buf=io.BytesIO()
+        np.lib.format.write_array(buf,array)
+        compression=zipfile.ZIP_DEFLATED if self.compression else zipfile.ZIP_STORED
+        #the archive is closed after each chunk, so that the file is always readable
+        with zipfile.ZipFile(self.filename,'a',compression,allowZip64=True) as archive:
+            archive.writestr(name+'.npy',buf.getvalue())
+
+    def write_header_metadata(self):
+        self.add_member('block%03d_header' % self.block,np.array([unicode(name).encode('utf8') for name in self.header]))
+
+    def append_chunk(self,array):
+        self.add_member('block%03d_chunk%06d' % (self.block,self.chunk),array)
+
+    def sync(self):
+        #the archive is closed after each chunk, there is nothing to do but to wait for the disk
+        with open(self.filename,'rb') as f:
+            os.fsync(f.fileno())
+        self.rows_since_sync=0
+        self.last_sync=time.time()
+
+    def close_file(self):
+        pass
+
+class Hdf5_savefile(Binary_savefile):
+    """HDF5 savefile (requires h5py), each block of data is a group named blockNNN
+    with the header in its attributes and a resizable, chunked dataset named 'data'"""
+    def __init__(self,filename,**kwargs):
+        Binary_savefile.__init__(self,filename,**kwargs)
+        #'a' is for 'append', in order to ensure never to erase any file
+        self.file=h5py.File(filename,'a')
+        self.block=len([name for name in self.file.keys() if name.startswith('block')])-1
+
+    def write_header_metadata(self):
+        group=self.file.create_group('block%03d' % self.block)
+        group.attrs['header']=json.dumps([unicode(name) for name in self.header])
+        self.file.flush()
+
+    def append_chunk(self,array):
+        group=self.file['block%03d' % self.block]
+        if 'data' not in group:
+            group.create_dataset('data',shape=(0,),maxshape=(None,),dtype=self.dtype,
+                                 chunks=(self.chunk_rows,),compression='gzip' if self.compression else None)
+        dataset=group['data']
+        n=dataset.shape[0]
+        dataset.resize((n+len(array),))
+        dataset[n:]=array
+        self.file.flush()
+
+    def sync(self):
+        self.file.flush()
+        self.rows_since_sync=0
+        self.last_sync=time.time()
+
+    def close_file(self):
+        self.file.close()
+
+def savefile_class(filename):
+    """the format of the savefile is chosen from the extension of its name"""
+    extension=os.path.splitext(unicode(filename))[1].lower()
+    if extension=='.npz':
+        return Npz_savefile
+    elif extension in ['.h5','.hdf5']:
+        if h5py is None:
+            print "h5py is not installed, data will be saved in the .npz format instead"
+            return lambda filename,**kwargs:Npz_savefile(os.path.splitext(unicode(filename))[0]+'.npz',**kwargs)
+        return Hdf5_savefile
+    return Text_savefile
+
+def open_savefile(filename,**kwargs):
+    """open a savefile, falling back on a time-stamped file in the current directory
+    and then on a file of last resort if the requested one cannot be created"""
+    try:
+        if filename is None:
+            raise IOError
+        return savefile_class(filename)(filename,**kwargs)
+    except:
+        try:
+            #save data even if the savefile could not be created (the name of which was provided by the user)
+            return Text_savefile("Unsaved-data-"+time.strftime("%a-%d-%b-%Y-%H-%M-%S-UTC", time.gmtime())+".txt",**kwargs)
+        except:
+            return Text_savefile("Savefile_of_last_resort",**kwargs)
+
+def block_rows(block):
+    """rows of a block of data sent at once by a measurements program,
+    (block,'rows') in the data queue, block being a 2D numpy array
+    (e.g. a buffer read from an instrument) or a list of rows"""
+    if hasattr(block,'tolist'):
+        return block.tolist()
+    return list(block)
+
+class Savefile_writer(threading.Thread):
+    def __init__(self,filename,flush_every_row=False,**kwargs):
+        """thread that owns the savefile, so that a slow disk never freezes the
+        user interface. The main thread sends it the items of the data queue
+        with put(), with the same meaning as in Main.save_data:
+            (header,True) a header for the incoming data
+            (row,False)   a row of data
+            (filename,'newfile') close the savefile and open a new one
+        (the blocks of rows (block,'rows') of the data queue arrive here as rows,
+        see block_rows)
+        kwargs are passed to the savefiles (see Text_savefile and Binary_savefile)"""
+        threading.Thread.__init__(self)
+        self.daemon=True
+        self.filename=filename
+        self.flush_every_row=flush_every_row
+        self.savefile_kwargs=kwargs
+        self.queue=Queue.Queue()
+        #statistics reported to the user interface
+        self.stats_lock=threading.Lock()
+        self.backlog_rows=0
+        self.last_write_latency=0
+        self.max_write_latency=0
+        self.rows_written=0
+
+    def put(self,items):
+        """send a list of (data,note) items to be written to the savefile"""
+        nb_rows=len([note for data,note in items if note==False])
+        with self.stats_lock:
+            self.backlog_rows+=nb_rows
+        self.queue.put(items)
+
+    def close(self):
+        """write everything still in the queue, close the savefile and stop the thread"""
+        self.queue.put(None)
+        self.join()
+
+    def backlog(self):
+        """number of rows received but not yet written to the disk"""
+        with self.stats_lock:
+            return self.backlog_rows
+
+    def run(self):
+        self.savefile=open_savefile(self.filename,**self.savefile_kwargs)
+        running=True
+        while running:
+            #wait for some data, then take everything available in the queue
+            batches=[self.queue.get()]
+            while True:
+                try:
+                    batches.append(self.queue.get(block=False))
+                except Queue.Empty:
+                    break
+            if None in batches:
+                running=False
+                batches=batches[:batches.index(None)]
+            rows=[]
+            for items in batches:
+                for data,note in items:
+                    if note=='newfile' or note==True:
+                        self.write_rows(rows)
+                        rows=[]
+                    if note=='newfile':
+                        #close previous file and open a new one
+                        self.write(self.savefile.close)
+                        self.savefile=open_savefile(data,**self.savefile_kwargs)
+                    elif note==True:
+                        self.savefile.write_header(data)
+                    else:
+                        rows.append(data)
+                        if self.flush_every_row:
+                            self.write_rows(rows)
+                            rows=[]
+            self.write_rows(rows)
+        self.write(self.savefile.close)
+
+    def write_rows(self,rows):
+        if rows:
+            self.savefile.write_rows(rows)
+            self.write(self.savefile.flush)
+            with self.stats_lock:
+                self.backlog_rows-=len(rows)
+                self.rows_written+=len(rows)
+
+    def write(self,operation):
+        """time a write operation to the disk"""
+        t0=time.time()
+        try:
+            operation()
+        except (IOError,OSError):
+            #the disk is not available anymore, keep the data that could not be written
+            #and save it in a fallback file, as when a new savefile cannot be created
+            unwritten=self.savefile.unwritten()
+            self.savefile=open_savefile(None,**self.savefile_kwargs)
+            self.savefile.pending=list(unwritten)
+            self.savefile.flush()
+        latency=time.time()-t0
+        with self.stats_lock:
+            self.last_write_latency=latency
+            self.max_write_latency=max(latency,self.max_write_latency)
@@ -0,0 +1,1500 @@
+# -*- coding: utf-8 -*-
+#Simulated instruments, to run the drivers and the measurements programs
+#without the instruments, e.g. to benchmark them or to test a modification
+#away from the cryostat.
+#A VISA address starting with SIM opens a simulated instrument instead of a
+#VISA session (see Visa_pool.py), e.g. 'SIM::Keithley2182A::7' is a simulated
+#Keithley2182A. It answers the commands sent by the driver of the same name,
+#after a configurable latency, with a configurable noise on the values
+#measured, and times out at a configurable rate:
+#   Simulated_instruments.configure('Keithley2182A',latency=5e-3,noise=1e-5,error_rate=0.01)
+#The simulated instruments of a same board (SIM, SIM1...) are on the same bus,
+#like the instruments of a GPIB board, and measure the same simulated sample:
+#the current sourced by the Keithley6221 or the Keithley2420 gives the voltage
+#read by the Keithley2182A, the temperature set with the Lakeshore340 is the one
+#read by the CryoCon, the field ramped by the AMI420 changes the resistance...
+import re
+import math
+import time
+import struct
+import random
+import threading
+
+#settings of all the simulated instruments, unless configured otherwise
+#latency: time in seconds taken to answer a query (a write takes a tenth of it)
+#noise: relative noise of the values measured
+#error_rate: probability that a read or a write times out
+DEFAULT_SETTINGS={'latency':2e-3,'noise':1e-4,'error_rate':0.0}
+#power line frequency in Hz, giving the integration time of the voltmeters
+LINE_FREQUENCY=50.0
+#time constant in seconds of the temperature going to its setpoint, when not ramping
+THERMAL_TIME_CONSTANT=10.0
+#time in seconds to heat the persistent switch of the magnet
+PS_HEATING_TIME=10.0
+
+class Simulated_timeout(Exception):
+    """raised when an error is injected, like a VISA timeout"""
+    pass
+
+class Simulated_sample():
+    """the sample, the cryostat and the magnet, shared by the simulated instruments of a board"""
+    def __init__(self):
+        self.lock=threading.RLock()
+        #current in A sourced through the sample
+        self.current=0.0
+        #resistance in Ohm at 300 K and zero field
+        self.R300=10.0
+        self.temperature=300.0
+        self.setpoint=300.0
+        #ramp rate of the temperature in K/min, 0 if not ramping
+        self.ramp_rate=0.0
+        #field in T seen by the sample
+        self.field=0.0
+        #liquid helium level in %, and how fast it boils off in %/hour
+        self.helium_level=80.0
+        self.boil_off=0.5
+        self.last_update=time.time()
+
+    def update(self):
+        with self.lock:
+            now=time.time()
+            dt=now-self.last_update
+            self.last_update=now
+            if self.ramp_rate>0:
+                step=self.ramp_rate/60.0*dt
+                self.temperature+=max(-step,min(step,self.setpoint-self.temperature))
+            else:
+                self.temperature+=(self.setpoint-self.temperature)*(1-math.exp(-dt/THERMAL_TIME_CONSTANT))
+            self.helium_level=max(0.0,self.helium_level-self.boil_off*dt/3600.0)
+
+    def resistance(self):
+        """a metal with some residual resistance and magnetoresistance"""
+        self.update()
+        with self.lock:
+            return self.R300*(0.1+0.9*self.temperature/300.0)*(1+0.05*self.field**2)
+
+    def voltage(self):
+        with self.lock:
+            return self.current*self.resistance()
+
+#the sample of each board, e.g. 'SIM' -> Simulated_sample
+samples={}
+
+class Simulated_instrument():
+    """Simulated VISA session, answering the commands listed in COMMANDS.
+    COMMANDS: list of (regular expression,name of the method called with the
+    groups of the expression). The method returns the answer of a query, or
+    None for a write. The writes that do not match any command are accepted
+    and do nothing (configuration that is not simulated), the queries that do
+    not match any command get no answer (and so time out when read), as with
+    the instruments."""
+    IDN='PyGMI,SIMULATED INSTRUMENT,0,1.0'
+    COMMANDS=[]
+    #commands understood by all the instruments
+    COMMON_COMMANDS=[(r'\*IDN\?','query_idn'),
+                     (r'\*RST','reset'),
+                     (r'\*CLS','clear_status'),
+                     (r'\*OPC\?','query_opc'),
+                     (r':?SYST\w*:ERR\w*\?','query_error')]
+    #data format of the SCPI instruments, ASCII or binary blocks (see format_values)
+    FORMAT_COMMANDS=[(r':?FORM\w*(?::DATA)? (\w+(?:, ?\d+)?)','set_data_format'),
+                     (r':?FORM\w*:BORD\w* (\w+)','set_byte_order')]
+    def __init__(self,address,model,sample):
+        self.resource_name=address
+        self.model=model
+        self.sample=sample
+        #in ms, like a VISA session
+        self.timeout=2000
+        #answers waiting to be read
+        self.output=[]
+        #error queue, read with SYST:ERR?
+        self.errors=[]
+        self.lock=threading.RLock()
+        #ASCII, REAL,32 or REAL,64, and byte order of the binary blocks
+        self.data_format='ASC'
+        self.big_endian=True
+        self.commands=[(re.compile(pattern+'$',re.IGNORECASE),method) for pattern,method in self.COMMANDS+Simulated_instrument.COMMON_COMMANDS]
+        self.session=id(self)
+        self.reset()
+
+    def reset(self):
+        """state of the instrument after *RST"""
+        pass
+
+    def query_idn(self):
+        #no answer (None) if the instrument does not implement *IDN?
+        return self.IDN
+
+    def clear_status(self):
+        self.errors=[]
+
+    def query_opc(self):
+        return '1'
+
+    def query_error(self):
+        if self.errors:
+            return self.errors.pop(0)
+        return '0,"No error"'
+
+    def set_data_format(self,data_format):
+        data_format=data_format.upper().replace(' ','')
+        if data_format.startswith('ASC'):
+            self.data_format='ASC'
+        elif data_format.startswith('DRE') or data_format=='REAL,64':
+            self.data_format='REAL,64'
+        else:
+            self.data_format='REAL,32'
+
+    def set_byte_order(self,order):
+        self.big_endian=order.upper().startswith('NORM')
+
+    def format_values(self,values,ascii_formats=None):
+        """answer of a bulk read: the values in ASCII separated by commas
+        (ascii_formats: format of each value), or an IEEE 488.2 binary block"""
+        if self.data_format=='ASC':
+            if ascii_formats is None:
+                ascii_formats=['%+.9E']*len(values)
+            return ','.join([ascii_format % value for value,ascii_format in zip(values,ascii_formats)])
+        datatype='d' if self.data_format=='REAL,64' else 'f'
+        data=struct.pack(('>' if self.big_endian else '<')+str(len(values))+datatype,*values)
+        length=str(len(data))
+        return '#'+str(len(length))+length+data
+
+    ##########
+    #settings#
+    ##########
+    def setting(self,name):
+        return get_setting(self.resource_name,self.model,name)
+
+    def noisy(self,value,floor=0.0):
+        """value with a gaussian noise of relative amplitude 'noise' (at least noise*floor)"""
+        return value+random.gauss(0,self.setting('noise')*max(abs(value),floor))
+
+    def inject_error(self):
+        if random.random()<self.setting('error_rate'):
+            time.sleep(self.timeout/1000.0)
+            raise Simulated_timeout("VI_ERROR_TMO (-1073807339): Timeout expired before operation completed.")
+
+    #################
+    #VISA session API#
+    #################
+    def check_open(self):
+        if not(hasattr(self,'session')):
+            raise Simulated_timeout("VI_ERROR_INV_OBJECT (-1073807346): Invalid session handle.")
+
+    def write(self,message,*args,**kwargs):
+        with self.lock:
+            self.check_open()
+            time.sleep(self.setting('latency')/10.0)
+            self.inject_error()
+            answers=[]
+            for command in split_commands(message):
+                answer=self.execute(command)
+                if answer is not None:
+                    answers.append(answer)
+            if answers:
+                #the answers to chained queries come back in one message
+                self.output.append(';'.join(answers))
+
+    write_raw=write
+
+    def execute(self,command):
+        for pattern,method in self.commands:
+            match=pattern.match(command)
+            if match is not None:
+                return getattr(self,method)(*match.groups())
+        if command.endswith('?'):
+            self.errors.append('-113,"Undefined header"')
+        return None
+
+    def read(self,*args,**kwargs):
+        with self.lock:
+            self.check_open()
+            time.sleep(self.setting('latency'))
+            if not(self.output):
+                time.sleep(self.timeout/1000.0)
+                raise Simulated_timeout("VI_ERROR_TMO (-1073807339): Timeout expired before operation completed.")
+            answer=self.output.pop(0)
+            self.inject_error()
+            return answer
+
+    def read_raw(self,*args,**kwargs):
+        return self.read()+'\n'
+
+    def query(self,message,delay=None):
+        with self.lock:
+            self.write(message)
+            if delay:
+                time.sleep(delay)
+            return self.read()
+
+    ask=query
+
+    def query_ascii_values(self,message,converter='f',separator=',',container=list,delay=None):
+        return container([float(value) for value in self.query(message,delay).split(separator) if value.strip()!=''])
+
+    def ask_for_values(self,message,*args,**kwargs):
+        return self.query_ascii_values(message)
+
+    def wait_for_srq(self,timeout=25000):
+        with self.lock:
+            self.check_open()
+            time.sleep(self.setting('latency'))
+            if not(self.output):
+                time.sleep(timeout/1000.0)
+                raise Simulated_timeout("VI_ERROR_TMO (-1073807339): Timeout expired before operation completed.")
+
+    def clear(self):
+        with self.lock:
+            self.output=[]
+
+    def close(self):
+        with self.lock:
+            if hasattr(self,'session'):
+                del self.session
+
+    def reopen(self):
+        with self.lock:
+            self.session=id(self)
+
+def heater_output(sample,gain=50.0):
+    """output (%) of a heater regulating the temperature of the sample: the power
+    holding it at its setpoint, and a proportional correction"""
+    sample.update()
+    with sample.lock:
+        output=100.0*sample.setpoint/300.0+gain*(sample.setpoint-sample.temperature)
+    return max(0.0,min(100.0,output))
+
+def split_commands(message):
+    """the commands chained with ';' in a message"""
+    message=message.strip()
+    if '"' in message:
+        #e.g. SYST:COMM:SER:SEND ":SENS:CHAN 1" is one command
+        return [message]
+    return [command.strip() for command in message.split(';') if command.strip()!='']
+
+def number(value):
+    """number sent in a command, including INF, ON and OFF"""
+    value=value.strip().upper()
+    if value in ['ON','INF']:
+        return 1.0 if value=='ON' else float('inf')
+    if value=='OFF':
+        return 0.0
+    return float(value)
+
+#################################################
+#the instruments, named as their PyGMI drivers#
+#################################################
+class Keithley2182A(Simulated_instrument):
+    IDN='KEITHLEY INSTRUMENTS INC.,MODEL 2182A,SIM2182,C02 /A02'
+    COMMANDS=[(r':?MEAS\w*(?::VOLT\w*)?\?','query_reading'),
+              (r':?READ\?','query_reading'),
+              (r':?FETC\w*\?','query_last_reading'),
+              (r':?INIT\w*(?::IMM\w*)?','trigger_reading'),
+              (r':?ABOR\w*','abort_reading'),
+              (r':?SENS\w*:DATA:(?:FRES|LAT)\w*\?','query_reading'),
+              (r':?SENS\w*:CHAN\w* (\d)','set_channel'),
+              (r':?SENS\w*:VOLT\w*(?::CHAN\w*\d)?:NPLC\w* (\S+)','set_nplc'),
+              (r':?SYST\w*:AZER\w*(?::STAT\w*)? (\w+)','set_autozero'),
+              (r':?SYST\w*:PRES\w*','reset'),
+              (r':?TRIG\w*:COUN\w* (\w+)','set_trigger_count'),
+              (r':?TRAC\w*:POIN\w* (\d+)','set_trace_size'),
+              (r':?TRAC\w*:POIN\w*:ACT\w*\?','query_trace_points'),
+              (r':?TRAC\w*:DATA\?','query_trace'),
+              (r':?TRAC\w*:CLE\w*','clear_trace'),
+              (r':?TRAC\w*:FEED:CONT\w* (\w+)','set_trace_feed'),
+              (r':?FORM\w*:ELEM\w* (.+)','set_elements')]+Simulated_instrument.FORMAT_COMMANDS
+
+    def reset(self):
+        self.channel=1
+        self.nplc=5.0
+        self.autozero=True
+        self.last_reading=0.0
+        #end of the integration of the reading triggered by :INIT, if any
+        self.reading_ready_at=None
+        #trace buffer: with a trigger count above 1, :INIT starts readings one
+        #after the other (from 'running_since'), stored while the feed is on
+        self.trigger_count=1
+        self.running_since=None
+        self.trace=[]
+        self.trace_size=1024
+        self.trace_since=None
+        self.elements=['READ']
+
+    def set_channel(self,channel):
+        self.channel=int(channel)
+
+    def set_nplc(self,nplc):
+        self.nplc=number(nplc)
+
+    def set_autozero(self,state):
+        self.autozero=bool(number(state))
+
+    def integration_time(self):
+        #twice the integration time with the autozero
+        return self.nplc/LINE_FREQUENCY*(2 if self.autozero else 1)
+
+    def new_reading(self):
+        if self.channel==1:
+            return self.noisy(self.sample.voltage(),floor=1e-6)
+        #e.g. a thermocouple on channel 2
+        return self.noisy(1e-5,floor=1e-6)
+
+    def query_reading(self):
+        self.abort_reading()
+        time.sleep(self.integration_time())
+        self.last_reading=self.new_reading()
+        return '%+.9E' % self.last_reading
+
+    def trigger_reading(self):
+        #the reading integrates in the background, the bus is free meanwhile:
+        #the voltage is the one during the integration (the source has been set before)
+        self.last_reading=self.new_reading()
+        self.reading_ready_at=time.time()+self.integration_time()
+        if self.trigger_count>1:
+            #continuous readings (the external triggers come as fast as the readings)
+            self.update_trace()
+            self.running_since=time.time()
+
+    def abort_reading(self):
+        self.update_trace()
+        self.reading_ready_at=None
+        self.running_since=None
+
+    def set_trigger_count(self,count):
+        self.trigger_count=number(count)
+
+    def set_trace_size(self,size):
+        self.trace_size=int(size)
+
+    def set_trace_feed(self,mode):
+        self.update_trace()
+        self.trace_since=time.time() if mode.upper().startswith('NEXT') else None
+
+    def clear_trace(self):
+        self.trace=[]
+        if self.trace_since is not None:
+            self.trace_since=time.time()
+
+    def set_elements(self,elements):
+        self.elements=[element.strip().upper()[:4] for element in elements.split(',')]
+
+    def update_trace(self):
+        """store the readings taken since the last call"""
+        if self.trace_since is None or self.running_since is None:
+            return
+        start=max(self.trace_since,self.running_since)
+        period=self.integration_time()
+        nb=min(int((time.time()-start)/period),self.trace_size)
+        while len(self.trace)<nb:
+            #timestamp relative to the first reading of the buffer
+            self.trace.append((self.new_reading(),len(self.trace)*period))
+        if len(self.trace)>=self.trace_size:
+            #the buffer stops storing once full (feed control back to NEVer)
+            self.trace_since=None
+
+    def query_trace_points(self):
+        self.update_trace()
+        return str(len(self.trace))
+
+    def query_trace(self):
+        self.update_trace()
+        values=[]
+        ascii_formats=[]
+        for reading,timestamp in self.trace:
+            if 'READ' in self.elements:
+                values.append(reading)
+                ascii_formats.append('%+.9E')
+            if 'TST' in self.elements:
+                values.append(timestamp)
+                ascii_formats.append('%+.3E')
+        return self.format_values(values,ascii_formats)
+
+    def wait_for_reading(self):
+        if self.reading_ready_at is not None:
+            time.sleep(max(0,self.reading_ready_at-time.time()))
+            self.reading_ready_at=None
+
+    def query_opc(self):
+        #*OPC? answers once the triggered reading is complete
+        self.wait_for_reading()
+        return '1'
+
+    def query_last_reading(self):
+        self.wait_for_reading()
+        return '%+.9E' % self.last_reading
+
+class Keithley6221(Simulated_instrument):
+    IDN='KEITHLEY INSTRUMENTS INC.,MODEL 6221,SIM6221,A03  Jun  1 2010 10:46:28/A02  /D/B'
+    COMMANDS=[(r'OUTP\w*(?::STAT\w*)? (\w+)','set_output'),
+              (r'OUTP\w*(?::STAT\w*)?\?','query_output'),
+              (r'(?:SOUR\w*:)?CURR\w*(?::LEV\w*)?(?::IMM\w*)?(?::AMPL\w*)? (\S+)','set_current'),
+              (r'(?:SOUR\w*:)?CURR\w*\?','query_current'),
+              (r'(?:SOUR\w*:)?CURR\w*:COMP\w* (\S+)','set_compliance'),
+              (r'(?:SOUR\w*:)?CURR\w*:COMP\w*\?','query_compliance'),
+              (r'(?:SOUR\w*:)?CURR\w*:RANG\w* (\S+)','set_range'),
+              (r'(?:SOUR\w*:)?CURR\w*:RANG\w*\?','query_range'),
+              (r'SOUR\w*:DELT\w*:HIGH? (\S+)','set_delta_high'),
+              (r'SOUR\w*:DELT\w*:COUN\w* (\S+)','set_delta_count'),
+              (r'SOUR\w*:DELT\w*:DEL\w* (\S+)','set_delta_delay'),
+              (r'SOUR\w*:DELT\w*:ARM','arm_delta'),
+              (r'SOUR\w*:DELT\w*:ARM\?','query_delta_armed'),
+              (r'SOUR\w*:DELT\w*:CAB (\w+)','set_compliance_abort'),
+              (r'SOUR\w*:SWE\w*:ABOR\w*','abort_delta'),
+              (r'INIT\w*(?::IMM\w*)?','start_delta'),
+              (r'TRAC\w*:POIN\w* (\d+)','set_buffer_size'),
+              (r'TRAC\w*:POIN\w*:ACT\w*\?','query_buffer_points'),
+              (r'TRAC\w*:DATA\?','query_buffer'),
+              (r'TRAC\w*:DATA:SEL\w*\? (\d+),\s*(\d+)','query_buffer_selection'),
+              (r'TRAC\w*:CLE\w*','clear_buffer'),
+              (r'FORM\w*:ELEM\w* (.+)','set_elements'),
+              (r':?SENS\w*:DATA:FRES\w*\?','query_fresh_reading'),
+              (r':?SENS\w*:DATA:LAT\w*\?','query_latest_reading'),
+              (r'SYST\w*:COMM\w*:SER\w*:SEND "(.*)"','send_to_voltmeter')]+Simulated_instrument.FORMAT_COMMANDS
+
+    def reset(self):
+        self.output_on=False
+        self.amplitude=0.0
+        self.compliance=10.0
+        self.range=0.1
+        self.delta_high=1e-3
+        self.delta_count=float('inf')
+        self.delta_delay=2e-3
+        self.delta_armed=False
+        self.delta_start=None
+        self.compliance_abort=False
+        self.buffer_size=100
+        self.clear_buffer()
+        self.elements=['READ','TST']
+        #integration time of the Keithley2182A connected by RS-232,
+        #which keeps its settings when the 6221 is reset
+        self.voltmeter_nplc=getattr(self,'voltmeter_nplc',5.0)
+        self.apply_current()
+
+    def apply_current(self):
+        with self.sample.lock:
+            self.sample.current=self.amplitude if self.output_on else 0.0
+
+    def set_output(self,state):
+        self.output_on=bool(number(state))
+        self.apply_current()
+
+    def query_output(self):
+        return '1' if self.output_on else '0'
+
+    def set_current(self,amplitude):
+        self.amplitude=number(amplitude)
+        self.apply_current()
+
+    def query_current(self):
+        return '%+.6E' % self.amplitude
+
+    def set_compliance(self,voltage):
+        self.compliance=number(voltage)
+
+    def query_compliance(self):
+        return '%+.6E' % self.compliance
+
+    def set_range(self,value):
+        self.range=number(value)
+
+    def query_range(self):
+        return '%+.6E' % self.range
+
+    #delta mode: the current alternates between +high and -high, and the
+    #Keithley2182A measures the voltage at each step
+    def set_delta_high(self,amplitude):
+        self.delta_high=number(amplitude)
+
+    def set_delta_count(self,count):
+        self.delta_count=number(count)
+
+    def set_delta_delay(self,delay):
+        self.delta_delay=number(delay)
+
+    def send_to_voltmeter(self,command):
+        match=re.search(r'NPLC\w* (\S+)',command,re.IGNORECASE)
+        if match is not None:
+            self.voltmeter_nplc=number(match.group(1))
+
+    def set_compliance_abort(self,state):
+        self.compliance_abort=bool(number(state))
+
+    def arm_delta(self):
+        self.delta_armed=True
+
+    def query_delta_armed(self):
+        self.update_buffer()
+        return '1' if self.delta_armed else '0'
+
+    def start_delta(self):
+        if self.delta_armed:
+            self.clear_buffer()
+            self.delta_start=time.time()
+
+    def abort_delta(self):
+        self.update_buffer()
+        self.delta_armed=False
+        self.delta_start=None
+
+    def delta_period(self):
+        """time between two delta readings: two voltage measurements, each after the delay"""
+        return 2*(self.delta_delay+self.voltmeter_nplc/LINE_FREQUENCY)
+
+    def update_buffer(self):
+        """take the readings due since the last call, the buffer keeping the first ones"""
+        if self.delta_start is None:
+            return
+        nb=min(int((time.time()-self.delta_start)/self.delta_period()),self.delta_count)
+        if nb>self.nb_readings:
+            with self.sample.lock:
+                voltage=self.delta_high*self.sample.resistance()
+            if self.compliance_abort and abs(voltage)>self.compliance:
+                #the delta mode is aborted at the first reading in compliance
+                self.delta_armed=False
+                self.delta_start=None
+                return
+            self.nb_readings=nb
+            while len(self.buffer)<min(nb,self.buffer_size):
+                self.buffer.append((self.noisy(voltage,floor=1e-6),(len(self.buffer)+1)*self.delta_period()))
+            self.latest=(self.noisy(voltage,floor=1e-6),nb*self.delta_period())
+
+    def set_buffer_size(self,size):
+        self.buffer_size=int(size)
+
+    def clear_buffer(self):
+        self.buffer=[]
+        #number of readings taken, the last one, and the last one returned by SENS:DATA:FRES?
+        self.nb_readings=0
+        self.latest=None
+        self.last_returned=0
+
+    def set_elements(self,elements):
+        self.elements=[element.strip().upper()[:4] for element in elements.split(',')]
+
+    def format_readings(self,readings):
+        values=[]
+        ascii_formats=[]
+        for reading,timestamp in readings:
+            if 'READ' in self.elements:
+                values.append(reading)
+                ascii_formats.append('%+.9E')
+            if 'TST' in self.elements:
+                values.append(timestamp)
+                ascii_formats.append('%+.3E')
+        return self.format_values(values,ascii_formats)
+
+    def query_buffer_points(self):
+        self.update_buffer()
+        return str(len(self.buffer))
+
+    def query_buffer(self):
+        self.update_buffer()
+        return self.format_readings(self.buffer)
+
+    def query_buffer_selection(self,start,count):
+        self.update_buffer()
+        start=int(start)
+        count=int(count)
+        if start+count>len(self.buffer):
+            self.errors.append('-222,"Data out of range"')
+            return None
+        return self.format_readings(self.buffer[start:start+count])
+
+    def query_latest_reading(self):
+        self.update_buffer()
+        if self.latest is None:
+            self.errors.append('-230,"Data corrupt or stale"')
+            return '%+.9E' % 9.9e37
+        return self.format_readings([self.latest])
+
+    def query_fresh_reading(self):
+        self.update_buffer()
+        if self.last_returned>=self.nb_readings:
+            #no answer, as the instrument
+            self.errors.append('-230,"Data corrupt or stale"')
+            return None
+        self.last_returned=self.nb_readings
+        return self.format_readings([self.latest])
+
+class Keithley2420(Simulated_instrument):
+    IDN='KEITHLEY INSTRUMENTS INC.,MODEL 2420,SIM2420,C34 Sep 21 2016 15:30:00/A02  /L/M'
+    COMMANDS=[(r':?SOUR\w*:FUNC\w*(?::MODE)? (\w+)','set_function'),
+              (r':?SOUR\w*:CURR\w*(?::LEV\w*)?(?::IMM\w*)?(?::AMPL\w*)? (\S+)','set_current'),
+              (r':?SOUR\w*:VOLT\w*(?::LEV\w*)?(?::IMM\w*)?(?::AMPL\w*)? (\S+)','set_voltage'),
+              (r':?SENS\w*:VOLT\w*:PROT\w*(?::LEV\w*)? (\S+)','set_voltage_compliance'),
+              (r':?SENS\w*:CURR\w*:PROT\w*(?::LEV\w*)? (\S+)','set_current_compliance'),
+              (r':?SENS\w*:(?:VOLT|CURR)\w*:NPLC\w* (\S+)','set_nplc'),
+              (r':?OUTP\w*(?::STAT\w*)? (\w+)','set_output'),
+              (r':?OUTP\w*(?::STAT\w*)?\?','query_output'),
+              (r':?FORM\w*:ELEM\w*(?::SENS\w*)? (.+)','set_elements'),
+              (r':?FORM\w*:ELEM\w*(?::SENS\w*)?\?','query_elements'),
+              (r':?READ\?','query_reading'),
+              (r':?MEAS\w*(?::VOLT\w*)?\?','query_reading'),
+              (r':?SOUR\w*:CURR\w*:MODE (\w+)','set_current_mode'),
+              (r':?SOUR\w*:LIST:CURR\w* (.+)','set_current_list'),
+              (r':?SOUR\w*:CURR\w*:STAR\w* (\S+)','set_sweep_start'),
+              (r':?SOUR\w*:CURR\w*:STOP (\S+)','set_sweep_stop'),
+              (r':?SOUR\w*:SWE\w*:POIN\w* (\S+)','set_sweep_points'),
+              (r':?SOUR\w*:DEL\w* (\S+)','set_source_delay'),
+              (r':?TRIG\w*:COUN\w* (\S+)','set_trigger_count'),
+              (r':?INIT\w*$','run_sweep'),
+              (r'\*OPC\?','query_opc'),
+              (r':?FETC\w*\?','query_fetch')]+Simulated_instrument.FORMAT_COMMANDS
+
+    def reset(self):
+        self.function='CURR'
+        self.current=0.0
+        self.voltage=0.0
+        self.voltage_compliance=21.0
+        self.current_compliance=105e-6
+        self.nplc=1.0
+        self.output_on=False
+        self.elements=['VOLT','CURR','RES','TIME','STAT']
+        self.start=time.time()
+        #sweeps: fixed current, list or linear sweep, one point per trigger
+        self.current_mode='FIX'
+        self.current_list=[0.0]
+        self.sweep=[0.0,0.0,2]
+        self.source_delay=0.0
+        self.trigger_count=1
+        #readings of the last sweep (or single reading), sent by :FETC?
+        self.readings=[]
+        self.apply_current()
+
+    def apply_current(self):
+        with self.sample.lock:
+            if not(self.output_on):
+                self.sample.current=0.0
+            elif self.function=='CURR':
+                self.sample.current=self.current
+            else:
+                self.sample.current=max(-self.current_compliance,min(self.current_compliance,self.voltage/self.sample.resistance()))
+
+    def set_function(self,function):
+        self.function=function.upper()[:4]
+        self.apply_current()
+
+    def set_current(self,amplitude):
+        self.current=number(amplitude)
+        self.apply_current()
+
+    def set_voltage(self,amplitude):
+        self.voltage=number(amplitude)
+        self.apply_current()
+
+    def set_voltage_compliance(self,voltage):
+        self.voltage_compliance=number(voltage)
+
+    def set_current_compliance(self,current):
+        self.current_compliance=number(current)
+
+    def set_nplc(self,nplc):
+        self.nplc=number(nplc)
+
+    def set_output(self,state):
+        self.output_on=bool(number(state))
+        self.apply_current()
+
+    def query_output(self):
+        return '1' if self.output_on else '0'
+
+    def set_elements(self,elements):
+        self.elements=[element.strip().upper()[:4] for element in elements.split(',')]
+
+    def query_elements(self):
+        return ','.join(self.elements)
+
+    def set_current_mode(self,mode):
+        self.current_mode=mode.upper()[:3]
+
+    def set_current_list(self,currents):
+        self.current_list=[number(current) for current in currents.split(',')]
+
+    def set_sweep_start(self,current):
+        self.sweep[0]=number(current)
+
+    def set_sweep_stop(self,current):
+        self.sweep[1]=number(current)
+
+    def set_sweep_points(self,points):
+        self.sweep[2]=int(number(points))
+
+    def set_source_delay(self,delay):
+        self.source_delay=number(delay)
+
+    def set_trigger_count(self,count):
+        self.trigger_count=int(number(count))
+
+    def sweep_currents(self):
+        """current of each point of the sweep (one point per trigger), None for a fixed current"""
+        if self.current_mode=='LIS':
+            return [self.current_list[i%len(self.current_list)] for i in range(self.trigger_count)]
+        if self.current_mode=='SWE':
+            start,stop,points=self.sweep
+            step=(stop-start)/(points-1) if points>1 else 0.0
+            return [start+step*(i%points) for i in range(self.trigger_count)]
+        return [None]*self.trigger_count
+
+    def measure(self):
+        #source-delay-measure
+        time.sleep(self.source_delay+self.nplc/LINE_FREQUENCY)
+        self.apply_current()
+        with self.sample.lock:
+            current=self.sample.current
+            resistance=self.sample.resistance()
+        voltage=self.noisy(current*resistance,floor=1e-6)
+        voltage=max(-self.voltage_compliance,min(self.voltage_compliance,voltage))
+        values={'VOLT':voltage,
+                'CURR':current,
+                'RES':voltage/current if current else 9.91e37,
+                'TIME':time.time()-self.start,
+                'STAT':0}
+        return [values[element] for element in self.elements if element in values]
+
+    def query_reading(self):
+        #:READ? is :INIT followed by :FETC?
+        self.run_sweep()
+        return self.query_fetch()
+
+    def run_sweep(self):
+        #all the readings of the sweep are stored, then come back in one answer
+        self.readings=[]
+        fixed=self.current
+        for current in self.sweep_currents():
+            if current is not None:
+                self.current=current
+            self.readings+=self.measure()
+        if self.current_mode!='FIX':
+            #the source goes back to its fixed level after a sweep
+            self.current=fixed
+            self.apply_current()
+
+    def query_opc(self):
+        #the sweep runs within :INIT
+        return '1'
+
+    def query_fetch(self):
+        return self.format_values(self.readings,['%+.6E']*len(self.readings))
+
+class SR830(Simulated_instrument):
+    IDN='Stanford_Research_Systems,SR830,s/n00000,ver1.07 '
+    #resistance in Ohm in series with the sample, giving the current from the sine output
+    BALLAST=1e3
+    COMMANDS=[(r'OUTX ?(\d)','set_interface'),
+              (r'(FMOD|FREQ|SLVL|PHAS|HARM|SENS|OFLT|OFSL) ?([-+.\deE]+)','set_parameter'),
+              (r'(FMOD|FREQ|SLVL|PHAS|HARM|SENS|OFLT|OFSL) ?\?','query_parameter'),
+              (r'AUXV ?(\d) ?, ?(\S+)','set_aux_output'),
+              (r'AUXV ?\? ?(\d)','query_aux_output'),
+              (r'DDEF ?(\d) ?, ?(\d) ?, ?(\d)','set_display'),
+              (r'DDEF ?\? ?(\d)','query_display'),
+              (r'OUTP ?\? ?(\d+)','query_output'),
+              (r'SNAP ?\? ?([\d ,]+)','query_snap'),
+              (r'SRAT ?(\d+)','set_sample_rate'),
+              (r'SRAT ?\?','query_sample_rate'),
+              (r'SEND ?(\d)','set_buffer_mode'),
+              (r'STRT','start_buffer'),
+              (r'PAUS','pause_buffer'),
+              (r'REST','reset_buffer'),
+              (r'SPTS ?\?','query_buffer_points'),
+              (r'TRCA ?\? ?(\d) ?, ?(\d+) ?, ?(\d+)','query_buffer_ascii'),
+              (r'TRCB ?\? ?(\d) ?, ?(\d+) ?, ?(\d+)','query_buffer_binary'),
+              (r'TRCL ?\? ?(\d) ?, ?(\d+) ?, ?(\d+)','query_buffer_nonnormalized')]
+    #points of the data buffer
+    BUFFER_SIZE=16383
+
+    def reset(self):
+        self.parameters={'FMOD':1,'FREQ':1000.0,'SLVL':1.0,'PHAS':0.0,'HARM':1,'SENS':26,'OFLT':8,'OFSL':1}
+        self.aux_outputs=[0.0]*4
+        self.displays={1:(0,0),2:(0,0)}
+        #data buffer: sample rate 62.5 mHz*2**i (14: trigger, not simulated), single shot or loop
+        self.sample_rate=4
+        self.buffer_loop=True
+        self.reset_buffer()
+
+    def set_interface(self,interface):
+        pass
+
+    def set_parameter(self,name,value):
+        value=float(value)
+        self.parameters[name.upper()]=int(value) if name.upper() in ['FMOD','HARM','SENS','OFLT','OFSL'] else value
+
+    def query_parameter(self,name):
+        return '%g' % self.parameters[name.upper()]
+
+    def set_aux_output(self,i,value):
+        self.aux_outputs[int(i)-1]=float(value)
+
+    def query_aux_output(self,i):
+        return '%.3f' % self.aux_outputs[int(i)-1]
+
+    def set_display(self,channel,display,ratio):
+        self.displays[int(channel)]=(int(display),int(ratio))
+
+    def query_display(self,channel):
+        return '%d,%d' % self.displays[int(channel)]
+
+    def outputs(self):
+        """X,Y,R,theta,aux inputs 1 to 4,reference frequency,CH1 and CH2 displays"""
+        amplitude=self.parameters['SLVL']/self.BALLAST*self.sample.resistance()
+        if self.parameters['HARM']!=1:
+            amplitude=0.0
+        theta=-self.parameters['PHAS']
+        x=self.noisy(amplitude*math.cos(math.radians(theta)),floor=1e-7)
+        y=self.noisy(amplitude*math.sin(math.radians(theta)),floor=1e-7)
+        r=math.hypot(x,y)
+        theta=math.degrees(math.atan2(y,x))
+        values=[x,y,r,theta,0.0,0.0,0.0,0.0,self.parameters['FREQ']]
+        #the displays show X or R (CH1) and Y or theta (CH2)
+        values+=[[x,r][min(self.displays[1][0],1)],[y,theta][min(self.displays[2][0],1)]]
+        return values
+
+    def query_output(self,i):
+        return '%g' % self.outputs()[int(i)-1]
+
+    def query_snap(self,indices):
+        values=self.outputs()
+        return ','.join(['%g' % values[int(i)-1] for i in indices.split(',')])
+
+    #data buffer: CH1 and CH2 displays stored at the sample rate, from STRT
+    def set_sample_rate(self,i):
+        self.sample_rate=int(i)
+
+    def query_sample_rate(self):
+        return str(self.sample_rate)
+
+    def set_buffer_mode(self,mode):
+        self.buffer_loop=bool(int(mode))
+
+    def reset_buffer(self):
+        self.buffer=[]
+        #points taken (in loop mode the buffer keeps the last BUFFER_SIZE ones)
+        self.nb_points=0
+        self.buffer_start=None
+
+    def start_buffer(self):
+        if self.buffer_start is None:
+            self.buffer_start=time.time()-self.nb_points/self.rate()
+
+    def pause_buffer(self):
+        self.update_buffer()
+        self.buffer_start=None
+
+    def rate(self):
+        return 0.0625*2**min(self.sample_rate,13)
+
+    def update_buffer(self):
+        if self.buffer_start is None:
+            return
+        nb=int((time.time()-self.buffer_start)*self.rate())
+        if not(self.buffer_loop):
+            nb=min(nb,self.BUFFER_SIZE)
+        if nb>self.nb_points:
+            #the points not kept in the buffer are not computed
+            first=max(self.nb_points,nb-self.BUFFER_SIZE)
+            for i in range(first,nb):
+                values=self.outputs()
+                self.buffer.append((values[9],values[10]))
+            del self.buffer[:max(0,len(self.buffer)-self.BUFFER_SIZE)]
+            self.nb_points=nb
+
+    def query_buffer_points(self):
+        self.update_buffer()
+        return str(len(self.buffer))
+
+    def buffer_values(self,channel,start,count):
+        self.update_buffer()
+        start=int(start)
+        count=int(count)
+        if start+count>len(self.buffer):
+            #the SR830 gives no answer
+            self.errors.append('-222,"Data out of range"')
+            return None
+        return [point[int(channel)-1] for point in self.buffer[start:start+count]]
+
+    def query_buffer_ascii(self,channel,start,count):
+        values=self.buffer_values(channel,start,count)
+        if values is None:
+            return None
+        #each value is followed by a comma
+        return ''.join(['%+.6E,' % value for value in values])
+
+    def query_buffer_binary(self,channel,start,count):
+        #IEEE floats, little-endian, without header
+        values=self.buffer_values(channel,start,count)
+        if values is None:
+            return None
+        return struct.pack('<'+str(len(values))+'f',*values)
+
+    def query_buffer_nonnormalized(self,channel,start,count):
+        #mantissa and exponent (16 bits each) of each value: value=mantissa*2**(exponent-124)
+        values=self.buffer_values(channel,start,count)
+        if values is None:
+            return None
+        data=[]
+        for value in values:
+            if value==0:
+                mantissa,exponent=0,124
+            else:
+                exponent=int(math.ceil(math.log(abs(value)/32767.0,2)))+124
+                mantissa=int(round(value/2.0**(exponent-124)))
+            data+=[mantissa,exponent]
+        return struct.pack('<'+str(len(data))+'h',*data)
+
+class Lakeshore340(Simulated_instrument):
+    IDN='LSCI,MODEL340,SIM340,061407'
+    #offset of each input, e.g. sensors at different places
+    OFFSETS={'A':0.0,'B':0.02,'C':-0.02,'D':0.05}
+    COMMANDS=[(r'KRDG\? ?(\w)','query_temperature'),
+              (r'SETP (\d) ?, ?(\S+)','set_setpoint'),
+              (r'SETP\? ?(\d)','query_setpoint'),
+              (r'RAMP (\d) ?, ?(\d)(?: ?, ?(\S+))?','set_ramp'),
+              (r'RAMP\? ?(\d)','query_ramp'),
+              (r'RANGE (\d)','set_heater_range'),
+              (r'RANGE\?','query_heater_range'),
+              (r'HTR\?','query_heater_output'),
+              (r'PID (\d) ?, ?(\S+?) ?, ?(\S+?) ?, ?(\S+)','set_pid'),
+              (r'PID\? ?(\d)','query_pid'),
+              (r'MODE (\d)','set_mode'),
+              (r'\*STB\?','query_status_byte'),
+              (r'\*SRE (\d+)','set_service_request'),
+              (r'\*SRE\?','query_service_request')]
+
+    def reset(self):
+        self.ramp_on=False
+        self.ramp_rate=0.0
+        self.heater_range=0
+        self.pid=[50.0,20.0,0.0]
+        self.mode=1
+        self.service_request=0
+
+    def query_temperature(self,channel):
+        self.sample.update()
+        if channel=='0':
+            #all the inputs
+            return ','.join([self.query_temperature(name) for name in sorted(self.OFFSETS)])
+        return '%+.4f' % self.noisy(self.sample.temperature+self.OFFSETS.get(channel.upper(),0.0),floor=1.0)
+
+    def query_heater_output(self):
+        #in % of the heater range
+        if self.heater_range==0:
+            return '+0.0'
+        return '%+.1f' % heater_output(self.sample,self.pid[0])
+
+    def set_setpoint(self,loop,temperature):
+        with self.sample.lock:
+            self.sample.update()
+            self.sample.setpoint=float(temperature)
+
+    def query_setpoint(self,loop):
+        return '%+.3f' % self.sample.setpoint
+
+    def set_ramp(self,loop,on_off,rate):
+        self.ramp_on=(on_off=='1')
+        if rate is not None:
+            self.ramp_rate=float(rate)
+        with self.sample.lock:
+            self.sample.update()
+            self.sample.ramp_rate=self.ramp_rate if self.ramp_on else 0.0
+
+    def query_ramp(self,loop):
+        return '%d,%+.3f' % (self.ramp_on,self.ramp_rate)
+
+    def set_heater_range(self,value):
+        self.heater_range=int(value)
+
+    def query_heater_range(self):
+        return str(self.heater_range)
+
+    def set_pid(self,loop,P,I,D):
+        self.pid=[float(P),float(I),float(D)]
+
+    def query_pid(self,loop):
+        return ','.join(['%+.1f' % value for value in self.pid])
+
+    def set_mode(self,mode):
+        self.mode=int(mode)
+
+    def query_status_byte(self):
+        return '0'
+
+    def set_service_request(self,value):
+        self.service_request=int(value)
+
+    def query_service_request(self):
+        return str(self.service_request)
+
+class CryoCon(Simulated_instrument):
+    IDN='Cryocon,32B,SIM32,1.04A'
+    COMMANDS=[(r'INP\w*\? ?(\w)','query_temperature'),
+              (r'LOOP (\d):SETPT?\?','query_setpoint'),
+              (r'LOOP (\d):HTRR\w*\?','query_heater_output'),
+              (r'INP\w* (\w):SENPR\w*\?','query_sensor_reading'),
+              (r'INP\w* (\w):UNIT\w*\?','query_unit'),
+              (r'INP\w* (\w):UNIT\w* (\w)','set_unit'),
+              (r'CONT\w*','start_control'),
+              (r'\*STOP','stop_control'),
+              (r'CONT\w*\?','query_control'),
+              (r'SYST\w*:LOCK\w* (\w+)','set_lock'),
+              (r'SYST\w*:LOCK\w*\?','query_lock'),
+              (r'SYST\w*:DIST\w* ?(\d+)','set_display_filter'),
+              (r'SYST\w*:DIST\w*\?','query_display_filter'),
+              (r'SYST\w*:AMB\w*\?','query_ambient')]
+
+    def reset(self):
+        self.units={}
+        self.control=False
+        self.locked=False
+        self.display_filter=2
+
+    def query_temperature(self,channel):
+        self.sample.update()
+        temperature=self.noisy(self.sample.temperature,floor=1.0)
+        unit=self.units.get(channel.upper(),'K')
+        if unit=='C':
+            temperature-=273.15
+        elif unit=='F':
+            temperature=(temperature-273.15)*9/5.0+32
+        elif unit=='S':
+            return self.query_sensor_reading(channel)
+        return '%.4f' % temperature
+
+    def query_setpoint(self,loop):
+        return '%.4fK' % self.sample.setpoint
+
+    def query_heater_output(self,loop):
+        if not(self.control):
+            return '0.0%'
+        return '%.1f%%' % heater_output(self.sample)
+
+    def query_sensor_reading(self,channel):
+        #e.g. a resistive thermometer
+        self.sample.update()
+        return '%.4f' % self.noisy(1e4/self.sample.temperature)
+
+    def query_unit(self,channel):
+        return self.units.get(channel.upper(),'K')
+
+    def set_unit(self,channel,unit):
+        self.units[channel.upper()]=unit.upper()
+
+    def start_control(self):
+        self.control=True
+
+    def stop_control(self):
+        self.control=False
+
+    def query_control(self):
+        return 'ON' if self.control else 'OFF'
+
+    def set_lock(self,state):
+        self.locked=bool(number(state))
+
+    def query_lock(self):
+        return 'ON' if self.locked else 'OFF'
+
+    def set_display_filter(self,value):
+        self.display_filter=int(value)
+
+    def query_display_filter(self):
+        return str(self.display_filter)
+
+    def query_ambient(self):
+        return '%.2f' % self.noisy(25.0)
+
+class LR700(Simulated_instrument):
+    #does not implement *IDN?
+    IDN=None
+    #the answers end with a new line, which the driver expects
+    COMMANDS=[(r'get (\d)','query_get'),
+              (r'M (\d)','set_mode'),
+              (r'O =(\w)','set_offset'),
+              (r'E (\d)','set_excitation'),
+              (r'V (\d)','set_variable_excitation'),
+              (r'V =(\d+)','set_excitation_percent'),
+              (r'R (\d)','set_range'),
+              (r'F (\d)','set_filter'),
+              (r'F =(\d+)','set_variable_filter')]
+    RANGES=[2e-3,20e-3,200e-3,2,20,200,2e3,20e3,200e3,2e6]
+    VARIABLE_FILTERS=[0.2,0.4,0.6,0.8,1.0,1.6,2.0,3.0,5.0,7.0,10.0,15.0,20.0,30.0,45.0,
+                      60.0,90.0,120.0,180.0,300.0,420.0,600.0,900.0,1200.0,1800.0]
+
+    def reset(self):
+        self.mode=0
+        self.excitation=4
+        self.percent=100
+        self.variable_excitation=False
+        self.range=4
+        self.filter=0
+        self.variable_filter=10
+        self.RSET=0.0
+        self.XSET=0.0
+
+    def format_resistance(self,value,suffix):
+        #e.g. '12.3456 KOHM R', the multipliers being K, ' ', M (milli) and U (micro)
+        for multiplier,factor in [('K',1e3),(' ',1.0),('M',1e-3)]:
+            if abs(value)>=factor:
+                return '%.4f %sOHM %s\n' % (value/factor,multiplier,suffix)
+        return '%.4f UOHM %s\n' % (value/1e-6,suffix)
+
+    def query_get(self,i):
+        R=self.noisy(self.sample.resistance(),floor=1e-3)
+        X=self.noisy(0.0,floor=1e-3*R)
+        values={'0':(R,'R'),'1':(X,'X'),'2':(R-self.RSET,'/\\R'),'3':(X-self.XSET,'/\\X'),
+                '4':(self.RSET,'RSET'),'5':(self.XSET,'XSET')}
+        if i in values:
+            return self.format_resistance(*values[i])
+        if i=='6':
+            if self.filter==3:
+                duration=self.VARIABLE_FILTERS[self.variable_filter]
+                if duration>=60:
+                    filter_txt='3F(%4.1f M)' % (duration/60.0)
+                else:
+                    filter_txt='3F(%4.1f s)' % duration
+            else:
+                filter_txt='%dF' % self.filter
+            return '%dR,%dE,%d%%,%s,%dM,0L,01S\n' % (self.range,self.excitation,self.percent,filter_txt,self.mode)
+        return None
+
+    def set_mode(self,mode):
+        self.mode=int(mode)
+
+    def set_offset(self,value):
+        if value.upper()=='R':
+            self.RSET=self.sample.resistance()
+            self.XSET=0.0
+        else:
+            self.RSET=0.0
+            self.XSET=0.0
+
+    def set_excitation(self,value):
+        self.excitation=int(value)
+
+    def set_variable_excitation(self,state):
+        self.variable_excitation=(state=='1')
+        if not(self.variable_excitation):
+            self.percent=100
+
+    def set_excitation_percent(self,percent):
+        self.percent=int(percent)
+
+    def set_range(self,value):
+        self.range=int(value)
+
+    def set_filter(self,value):
+        self.filter=int(value)
+
+    def set_variable_filter(self,value):
+        self.variable_filter=min(int(value),len(self.VARIABLE_FILTERS)-1)
+
+class AMI420_9Tmagnet(Simulated_instrument):
+    IDN='AMERICAN MAGNETICS INC.,MODEL 420,SIM420,3.0'
+    #maximum field in T
+    MAX_FIELD=9.0
+    COMMANDS=[(r'PS (\d)','set_persistent_switch'),
+              (r'PS\?','query_persistent_switch'),
+              (r'CONF\w*:FIELD:UNITS (\d)','set_field_unit'),
+              (r'FIELD:UNITS\?','query_field_unit'),
+              (r'CONF\w*:FIELD:PROG (\S+)','set_programmed_field'),
+              (r'FIELD:PROG\?','query_programmed_field'),
+              (r'FIELD:MAG\w*\?','query_field'),
+              (r'CONF\w*:RAMP:RATE:UNITS (\d)','set_ramp_rate_unit'),
+              (r'RAMP:RATE:UNITS\?','query_ramp_rate_unit'),
+              (r'CONF\w*:RAMP:RATE:FIELD (\S+)','set_ramp_rate'),
+              (r'RAMP:RATE:FIELD\?','query_ramp_rate'),
+              (r'RAMP','ramp'),
+              (r'PAUSE','pause'),
+              (r'ZERO','zero'),
+              (r'STATE\?','query_state')]
+
+    def reset(self):
+        #field of the power supply in T, and the field it ramps to
+        self.supply_field=0.0
+        self.programmed_field=0.0
+        #ramp rate in T/s
+        self.ramp_rate=0.01
+        #0: kilogauss, 1: tesla
+        self.field_unit=1
+        #0: per second, 1: per minute
+        self.ramp_rate_unit=0
+        self.switch_heated=False
+        self.switch_heating_end=0
+        #'RAMP','PAUSE' or 'ZERO'
+        self.mode='PAUSE'
+        self.last_update=time.time()
+
+    def update(self):
+        now=time.time()
+        dt=now-self.last_update
+        self.last_update=now
+        if self.mode!='PAUSE':
+            target=self.programmed_field if self.mode=='RAMP' else 0.0
+            step=self.ramp_rate*dt
+            self.supply_field+=max(-step,min(step,target-self.supply_field))
+        if self.switch_heated and now>=self.switch_heating_end:
+            #the magnet follows the power supply, otherwise it stays persistent
+            with self.sample.lock:
+                self.sample.field=self.supply_field
+
+    def field_to_user(self,value):
+        return value if self.field_unit==1 else value*10.0
+
+    def field_from_user(self,value):
+        return value if self.field_unit==1 else value/10.0
+
+    def set_persistent_switch(self,state):
+        self.update()
+        self.switch_heated=(state=='1')
+        if self.switch_heated:
+            self.switch_heating_end=time.time()+PS_HEATING_TIME
+
+    def query_persistent_switch(self):
+        return '1' if self.switch_heated else '0'
+
+    def set_field_unit(self,unit):
+        self.field_unit=int(unit)
+
+    def query_field_unit(self):
+        return str(self.field_unit)
+
+    def set_programmed_field(self,value):
+        field=self.field_from_user(float(value))
+        if abs(field)<=self.MAX_FIELD:
+            self.update()
+            self.programmed_field=field
+        else:
+            self.errors.append('-222,"Data out of range"')
+
+    def query_programmed_field(self):
+        return '%g' % self.field_to_user(self.programmed_field)
+
+    def query_field(self):
+        self.update()
+        return '%g' % self.noisy(self.field_to_user(self.supply_field),floor=1e-3)
+
+    def set_ramp_rate_unit(self,unit):
+        self.ramp_rate_unit=int(unit)
+
+    def query_ramp_rate_unit(self):
+        return str(self.ramp_rate_unit)
+
+    def set_ramp_rate(self,value):
+        self.update()
+        rate=self.field_from_user(float(value))
+        self.ramp_rate=abs(rate/60.0 if self.ramp_rate_unit==1 else rate)
+
+    def query_ramp_rate(self):
+        rate=self.field_to_user(self.ramp_rate)
+        return '%g' % (rate*60.0 if self.ramp_rate_unit==1 else rate)
+
+    def ramp(self):
+        self.update()
+        self.mode='RAMP'
+
+    def pause(self):
+        self.update()
+        self.mode='PAUSE'
+
+    def zero(self):
+        self.update()
+        self.mode='ZERO'
+
+    def query_state(self):
+        """1: ramping, 2: holding, 3: paused, 8: heating the switch, 9: at zero"""
+        self.update()
+        if self.switch_heated and time.time()<self.switch_heating_end:
+            return '8'
+        if self.mode=='PAUSE':
+            return '3'
+        target=self.programmed_field if self.mode=='RAMP' else 0.0
+        if self.supply_field!=target:
+            return '1'
+        if self.mode=='ZERO':
+            return '9'
+        return '2'
+
+class AMI135_LHe_meter(Simulated_instrument):
+    #does not implement *IDN?
+    IDN=None
+    #the answers are read after a service request
+    COMMANDS=[(r'UNIT','query_unit'),
+              (r'(PERCENT|CM|INCH)','set_unit'),
+              (r'LEVEL','query_level')]
+    #length in cm of the level sensor
+    SENSOR_LENGTH=60.0
+
+    def reset(self):
+        self.unit='%'
+
+    def query_unit(self):
+        return self.unit
+
+    def set_unit(self,unit):
+        self.unit={'PERCENT':'%','CM':'C','INCH':'I'}[unit.upper()]
+        return unit.upper()
+
+    def query_level(self):
+        self.sample.update()
+        level=self.sample.helium_level
+        if self.unit=='C':
+            level*=self.SENSOR_LENGTH/100.0
+        elif self.unit=='I':
+            level*=self.SENSOR_LENGTH/100.0/2.54
+        return '%.1f' % self.noisy(level)
+
+class Simulated_ppms():
+    """The PPMS is driven through a DLL, not VISA: this replaces the PPMS driver
+    itself (same functions and answers), with the latency of the simulated
+    instruments (settings of the address SIM::PPMS)"""
+    def __init__(self,sample,address='SIM::PPMS'):
+        self.sample=sample
+        self.address=address
+        #field in Oe, the field it ramps to and the rate in Oe/s
+        self.field_target=0.0
+        self.field_rate=100.0
+        self.persistent=True
+        self.last_update=time.time()
+
+    def initialize(self):
+        pass
+
+    def call(self):
+        """the time taken by a call to the DLL"""
+        time.sleep(get_setting(self.address,'PPMS','latency'))
+        now=time.time()
+        dt=now-self.last_update
+        self.last_update=now
+        with self.sample.lock:
+            field=self.sample.field*1e4
+            step=self.field_rate*dt
+            field+=max(-step,min(step,self.field_target-field))
+            self.sample.field=field*1e-4
+        return field
+
+    def noisy(self,value,floor=0.0):
+        return value+random.gauss(0,get_setting(self.address,'PPMS','noise')*max(abs(value),floor))
+
+    def get_field(self):
+        field=self.call()
+        if field!=self.field_target:
+            status='Charging'
+        else:
+            status='StablePersistent' if self.persistent else 'StableDriven'
+        return (False,self.noisy(field,floor=1.0),status)
+
+    def get_temperature(self):
+        self.call()
+        self.sample.update()
+        with self.sample.lock:
+            temperature=self.sample.temperature
+            setpoint=self.sample.setpoint
+        status='Stable' if abs(temperature-setpoint)<0.01*setpoint else 'Chasing'
+        return (False,self.noisy(temperature,floor=1.0),status)
+
+    def set_field(self,H,rate,approach='Linear',mode='Persistent'):
+        self.call()
+        self.field_target=float(H)
+        self.field_rate=abs(float(rate))
+        self.persistent=(mode=='Persistent')
+        return (False,)
+
+    def set_temperature(self,T,rate,approach='FastSettle'):
+        self.call()
+        with self.sample.lock:
+            self.sample.update()
+            self.sample.setpoint=float(T)
+            self.sample.ramp_rate=abs(float(rate))
+        return (False,)
+
+    def wait_for(self,Temperature=False,Field=False,Chamber=False,Position=False):
+        while (Temperature and self.get_temperature()[2]!='Stable') or (Field and self.get_field()[2]=='Charging'):
+            time.sleep(0.1)
+        return (False,)
+
+#name of the driver -> simulated instrument
+MODELS=dict([(model.__name__.lower(),model) for model in [Keithley2182A,Keithley6221,Keithley2420,SR830,Lakeshore340,CryoCon,LR700,AMI420_9Tmagnet,AMI135_LHe_meter]])
+
+##########################################
+#addresses of the simulated instruments#
+##########################################
+#the instruments opened, by address, so that they keep their state when their session is opened again
+instruments={}
+instruments_lock=threading.Lock()
+#None (all instruments), model or address -> settings
+settings={None:dict(DEFAULT_SETTINGS)}
+#list the simulated instruments with the VISA resources
+listed=False
+
+def is_simulated(address):
+    return str(address).upper().startswith('SIM')
+
+def parse_address(address):
+    """'SIM::Keithley2182A::7' -> ('SIM','Keithley2182A','7')"""
+    parts=str(address).split('::')
+    if len(parts)<2 or parts[1].lower() not in MODELS:
+        raise ValueError("no simulated instrument at "+str(address)+", the simulated instruments are "+', '.join(sorted([model.__name__ for model in MODELS.values()])))
+    board=parts[0].upper()
+    number='1' if len(parts)<3 or parts[2].upper()=='INSTR' else parts[2]
+    return board,MODELS[parts[1].lower()].__name__,number
+
+def open_resource(address):
+    board,model,number=parse_address(address)
+    key='::'.join([board,model,number])
+    with instruments_lock:
+        instrument=instruments.get(key)
+        if instrument is None:
+            if board not in samples:
+                samples[board]=Simulated_sample()
+            instrument=instruments[key]=MODELS[model.lower()](str(address),model,samples[board])
+        instrument.reopen()
+        return instrument
+
+def open_ppms(board='SIM'):
+    """simulated PPMS measuring the sample of a board"""
+    with instruments_lock:
+        if board not in samples:
+            samples[board]=Simulated_sample()
+        return Simulated_ppms(samples[board],board+'::PPMS')
+
+def list_resources():
+    """one address per simulated instrument"""
+    return ['SIM::'+model.__name__+'::1' for model in sorted(MODELS.values(),key=lambda model:model.__name__)]
+
+def target_key(target):
+    """None, an address, or the name of a model e.g. 'sr830' -> 'SR830'"""
+    if target is None or is_simulated(target):
+        return target
+    return parse_address('SIM::'+target)[1]
+
+def configure(target=None,latency=None,noise=None,error_rate=None):
+    """change the settings of all the simulated instruments (target=None), of
+    a model (e.g. target='SR830') or of an address (e.g. target='SIM::SR830::8')"""
+    target=target_key(target)
+    with instruments_lock:
+        target_settings=settings.setdefault(target,{})
+        for name,value in [('latency',latency),('noise',noise),('error_rate',error_rate)]:
+            if value is not None:
+                target_settings[name]=value
+
+def get_setting(address,model,name):
+    for target in [address,model,None]:
+        if name in settings.get(target,{}):
+            return settings[target][name]
+    return DEFAULT_SETTINGS[name]
+
+def get_settings(target=None):
+    """settings of all the simulated instruments (target=None), of a model or of an address"""
+    target=target_key(target)
+    if target is not None and is_simulated(target):
+        model=parse_address(target)[1]
+    else:
+        model=target
+    return dict([(name,get_setting(target,model,name)) for name in DEFAULT_SETTINGS])
+
+def reset():
+    """forget the simulated instruments and samples, and their settings"""
+    with instruments_lock:
+        instruments.clear()
+        samples.clear()
+        settings.clear()
+        settings[None]=dict(DEFAULT_SETTINGS)
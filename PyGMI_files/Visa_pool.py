@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#Process-wide VISA resource manager and pool of VISA sessions
+#Creating a ResourceManager and opening a session is slow, and sessions that
+#are never closed leak GPIB handles. All the drivers and the Instruments
+#connector get their sessions from here: a session is opened once per VISA
+#address and reused afterwards (e.g. when the instruments are initialized
+#again, or by the test console), sessions nobody uses any more are closed
+#after IDLE_TIME seconds.
+#The sessions are wrapped in an Instrumented_io, which records the statistics
+#of the communications (see Io_statistics.py).
+#The addresses starting with SIM (e.g. 'SIM::Keithley2182A::7') are simulated
+#instruments (see Simulated_instruments.py), which need neither VISA nor the
+#instruments.
+import time
+import threading
+from contextlib import contextmanager
+from Io_statistics import Instrumented_io
+import Simulated_instruments
+
+#time in seconds after which an unused session is closed
+IDLE_TIME=60
+
+def bus_key(address):
+    """interface (bus) of a VISA address: instruments on the same bus can not
+    be talked to at the same time, those on different buses can.
+    e.g. 'GPIB0::17::INSTR' -> 'GPIB0', 'TCPIP0::192.168.0.2::inst0::INSTR' -> 'TCPIP0::192.168.0.2'"""
+    parts=str(address).upper().split('::')
+    interface=parts[0]
+    if interface=='GPIB':
+        #'GPIB::17' is on board 0
+        interface='GPIB0'
+    if interface.startswith('TCPIP'):
+        #each network instrument has its own link
+        return '::'.join(parts[:2])
+    if interface.startswith('USB'):
+        #so does each USB instrument (vendor::product::serial number)
+        return '::'.join([part for part in parts if part!='INSTR'])
+    return interface
+
+class Pooled_session():
+    def __init__(self,resource):
+        self.resource=resource
+        #number of drivers or functions currently using the session
+        self.users=0
+        self.last_used=time.time()
+
+    def is_open(self):
+        try:
+            #raises an error if the session was closed
+            self.resource.session
+            return True
+        except Exception:
+            return False
+
+class Visa_pool():
+    def __init__(self,idle_time=IDLE_TIME):
+        self.idle_time=idle_time
+        self.manager=None
+        self.sessions={}
+        self.lock=threading.RLock()
+
+    def resource_manager(self):
+        """the ResourceManager shared by the whole program"""
+        with self.lock:
+            if self.manager is None:
+                #imported here so that the simulated instruments (and the
+                #benchmark) work without pyvisa installed
+                import visa
+                self.manager=visa.ResourceManager()
+            return self.manager
+
+    def list_resources(self,query='?*::INSTR'):
+        if not(Simulated_instruments.listed):
+            return self.resource_manager().list_resources(query)
+        try:
+            resources=list(self.resource_manager().list_resources(query))
+        except Exception:
+            #e.g. no VISA library on this computer, only the simulated instruments
+            resources=[]
+        return resources+Simulated_instruments.list_resources()
+
+    def open_new_resource(self,address):
+        if Simulated_instruments.is_simulated(address):
+            return Simulated_instruments.open_resource(address)
+        return self.resource_manager().open_resource(address)
+
+    def open_resource(self,address):
+        """session to the instrument at a VISA address, opened only if there is
+        no open session to that address yet. Call release(address) when done."""
+        address=str(address)
+        with self.lock:
+            self.close_idle()
+            pooled=self.sessions.get(address)
+            if pooled is None or not(pooled.is_open()):
+                pooled=Pooled_session(Instrumented_io(self.open_new_resource(address),address))
+                self.sessions[address]=pooled
+            pooled.users+=1
+            pooled.last_used=time.time()
+            return pooled.resource
+
+    def release(self,address):
+        """the session to that address is no longer used by the caller"""
+        with self.lock:
+            pooled=self.sessions.get(str(address))
+            if pooled is not None:
+                pooled.users=max(pooled.users-1,0)
+                pooled.last_used=time.time()
+            self.close_idle()
+
+    @contextmanager
+    def session(self,address):
+        """temporary use of a session, e.g. with Visa_pool.session(address) as io: io.query('*IDN?')"""
+        io=self.open_resource(address)
+        try:
+            yield io
+        finally:
+            self.release(address)
+
+    def close_idle(self,idle_time=None):
+        """close the sessions unused for more than idle_time seconds"""
+        if idle_time is None:
+            idle_time=self.idle_time
+        now=time.time()
+        with self.lock:
+            for address,pooled in self.sessions.items():
+                if pooled.users==0 and now-pooled.last_used>=idle_time:
+                    self.close(address)
+
+    def close(self,address):
+        with self.lock:
+            pooled=self.sessions.pop(str(address),None)
+            if pooled is not None:
+                try:
+                    pooled.resource.close()
+                except Exception:
+                    pass
+
+    def close_all(self):
+        with self.lock:
+            for address in self.sessions.keys():
+                self.close(address)
+
+#the pool shared by the whole program, used through the module functions below
+pool=Visa_pool()
+resource_manager=pool.resource_manager
+list_resources=pool.list_resources
+open_resource=pool.open_resource
+release=pool.release
+session=pool.session
+close_idle=pool.close_idle
+close_all=pool.close_all